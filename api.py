@@ -3,17 +3,41 @@
 This API provides endpoints to upload PDFs and ask questions about them.
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Request, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional, Dict, List
+from typing import Optional, List, Union
+import asyncio
+import functools
+import json
+import math
+import httpx
 import uuid
 import os
-import tempfile
 from datetime import datetime
 
-from utils.pdf_processor import load_pdf, get_text_chunks, create_vector_store
-from utils.chat_handler import create_conversation_chain, get_response
+from utils.pdf_processor import shutdown_page_executor
+from utils.admission import AdmissionMiddleware, AdmissionScheduler, Lane, RateLimiter
+from utils.chat_handler import (
+    create_conversation_chain, aget_response, aget_batch_responses, astream_response, format_sources,
+    close_llm_clients
+)
+from utils.embedding_cache import get_embedding_cache
+from utils.embeddings import check_backend, get_embeddings, warmup_embeddings, get_embedding_stats
+from utils.answer_cache import SemanticAnswerCache
+from utils.corpus import CorpusIndex, CorpusRetriever
+from utils.ingestion import IngestionPool, IngestionJob, QueueFullError
+from utils.ingestion_cache import IngestionCache, ingestion_cache_key
+from utils.index_store import IndexStore
+from utils.metrics import (
+    CONTENT_TYPE, REGISTRY, Counter, Gauge, MetricsMiddleware, current_timings, span
+)
+from utils.session_backend import create_session_backend
+from utils.session_manager import SessionManager, estimate_session_bytes, estimate_vector_store_bytes
+from utils.session_record import SessionRecord
+from utils.uploads import InvalidUploadError, UploadTooLargeError, spool_pdf_upload
 import config
 
 # Initialize FastAPI app
@@ -32,8 +56,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session storage (use Redis or database in production)
-sessions: Dict[str, dict] = {}
+# Set on requests forwarded between workers, so none is forwarded twice
+FORWARDED_HEADER = "X-Forwarded-By-Worker"
+# Carries config.WORKER_SECRET on forwarded requests
+WORKER_SECRET_HEADER = "X-Worker-Secret"
+
+# Questions and ingestion share a global concurrency cap in separate lanes,
+# with per-client token buckets
+admission = AdmissionScheduler(
+    lanes=[
+        Lane(
+            "query",
+            max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+            weight=config.ADMISSION_QUERY_WEIGHT,
+            limiter=RateLimiter(config.RATE_LIMIT_QUERIES_PER_MINUTE, config.RATE_LIMIT_QUERY_BURST)
+        ),
+        Lane(
+            "ingest",
+            max_concurrent=config.ADMISSION_INGEST_MAX_CONCURRENT,
+            limiter=RateLimiter(config.RATE_LIMIT_UPLOADS_PER_MINUTE, config.RATE_LIMIT_UPLOAD_BURST)
+        ),
+    ],
+    max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+    max_queue=config.ADMISSION_MAX_QUEUE,
+    max_wait_seconds=config.ADMISSION_MAX_WAIT_SECONDS
+)
+if config.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        scheduler=admission,
+        routes=[
+            ("POST", r"/ask(/batch|/stream)?", "query"),
+            ("POST", r"/upload", "ingest"),
+            ("POST", r"/corpus/documents", "ingest"),
+            ("PUT", r"/sessions/[^/]+/document", "ingest"),
+        ],
+        key_header=config.RATE_LIMIT_KEY_HEADER,
+        api_keys=config.API_KEYS,
+        forwarded_header=FORWARDED_HEADER,
+        secret_header=WORKER_SECRET_HEADER,
+        worker_secret=config.WORKER_SECRET
+    )
+
+# Per-request stage timings and latency, exported on /metrics
+app.add_middleware(MetricsMiddleware, server_timing=config.SERVER_TIMING_ENABLED)
+
+# Answers to earlier questions, shared by all sessions on the same document
+answer_cache = SemanticAnswerCache(
+    threshold=config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ttl_seconds=config.ANSWER_CACHE_TTL_SECONDS,
+    max_documents=config.ANSWER_CACHE_MAX_DOCUMENTS,
+    max_entries_per_document=config.ANSWER_CACHE_MAX_ENTRIES_PER_DOCUMENT
+)
+
+# Shared index of many documents; corpus sessions search a subset of it
+corpus = CorpusIndex(config.CORPUS_DIR)
+
+# Every session's index and metadata is persisted here
+index_store = IndexStore(config.INDEX_STORE_DIR)
+
+# Session registry with TTL and LRU spilling to index_store, over a backend
+# that other workers may share. Spilled sessions, and sessions loaded by
+# other workers, have conversation_chain=None until used here.
+sessions = SessionManager(
+    index_store,
+    ttl_seconds=config.SESSION_TTL_SECONDS,
+    max_loaded=config.SESSION_MAX_LOADED,
+    memory_budget_bytes=config.SESSION_MEMORY_BUDGET_MB * 1024 * 1024,
+    backend=create_session_backend(index_store)
+)
+
+# Workers without a heartbeat for this long are not forwarded to
+WORKER_LIVENESS_SECONDS = 3 * config.SESSION_SWEEP_INTERVAL_SECONDS
+
+# PDF ingestion runs here, never on the event loop
+ingestion_pool = IngestionPool(
+    max_workers=config.INGESTION_WORKERS,
+    max_queue=config.INGESTION_QUEUE_SIZE,
+    executor=config.INGESTION_EXECUTOR
+)
+
+# Finished ingestions keyed by PDF content and chunking/embedding settings
+ingestion_cache = IngestionCache(
+    max_entries=config.INGESTION_CACHE_MAX_ENTRIES,
+    cache_dir=config.INGESTION_CACHE_DIR,
+    max_disk_entries=config.INGESTION_CACHE_DISK_MAX_ENTRIES
+)
+
+
+def _session_counts():
+    stats = sessions.stats()
+    return {("loaded",): stats["loaded_sessions"], ("unloaded",): stats["sessions"] - stats["loaded_sessions"]}
+
+
+def _session_evictions():
+    stats = sessions.stats()
+    return {("expired",): stats["expired_total"], ("spilled",): stats["spilled_total"]}
+
+
+def _cache_lookups():
+    ingestion = ingestion_cache.stats()
+    answers = answer_cache.stats()
+    lookups = {
+        ("ingestion", "memory_hit"): ingestion["memory_hits"],
+        ("ingestion", "disk_hit"): ingestion["disk_hits"],
+        ("ingestion", "miss"): ingestion["misses"],
+        ("answer", "hit"): answers["hits"],
+        ("answer", "miss"): answers["misses"],
+    }
+    embedding_cache = get_embedding_cache()
+    if embedding_cache is not None:
+        lookups[("embedding", "hit")] = embedding_cache.hits
+        lookups[("embedding", "miss")] = embedding_cache.misses
+    return lookups
+
+
+def _admission_requests():
+    lanes = admission.stats()["lanes"]
+    return {
+        (lane, state): stats[state] for lane, stats in lanes.items() for state in ("running", "waiting")
+    }
+
+
+def _admission_rejections():
+    lanes = admission.stats()["lanes"]
+    return {
+        (lane, reason): count for lane, stats in lanes.items() for reason, count in stats["rejected"].items()
+    }
+
+
+# Counts kept by the components above are read when /metrics is scraped
+SESSIONS_CREATED = REGISTRY.register(Counter(
+    "pdf_chat_sessions_created_total", "Sessions created, by kind", ("kind",)
+))
+REGISTRY.register(Gauge(
+    "pdf_chat_sessions", "Registered sessions, by whether their index is in memory", ("state",),
+    callback=_session_counts
+))
+REGISTRY.register(Counter(
+    "pdf_chat_sessions_evicted_total", "Sessions expired or spilled to disk", ("reason",),
+    callback=_session_evictions
+))
+REGISTRY.register(Counter(
+    "pdf_chat_cache_lookups_total", "Ingestion and answer cache lookups, by result", ("cache", "result"),
+    callback=_cache_lookups
+))
+REGISTRY.register(Gauge(
+    "pdf_chat_ingestion_queue_depth", "Ingestion jobs running or waiting for a worker",
+    callback=ingestion_pool.queue_depth
+))
+REGISTRY.register(Gauge(
+    "pdf_chat_corpus_documents", "Documents in the shared corpus",
+    callback=lambda: corpus.stats()["documents"]
+))
+REGISTRY.register(Gauge(
+    "pdf_chat_admission_requests", "Requests admitted or waiting for a slot, by lane", ("lane", "state"),
+    callback=_admission_requests
+))
+REGISTRY.register(Counter(
+    "pdf_chat_admission_rejected_total", "Requests rejected with 429, by lane and reason", ("lane", "reason"),
+    callback=_admission_rejections
+))
 
 
 # Pydantic models
@@ -46,6 +229,28 @@ class QuestionResponse(BaseModel):
     answer: str
     session_id: str
     timestamp: str
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
+
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    session_id: str
+
+
+class BatchAnswer(BaseModel):
+    index: int
+    question: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
+
+
+class BatchQuestionResponse(BaseModel):
+    session_id: str
+    timestamp: str
+    results: List[BatchAnswer]
 
 
 class SessionInfo(BaseModel):
@@ -53,6 +258,9 @@ class SessionInfo(BaseModel):
     created_at: str
     pdf_name: str
     num_chunks: int
+    loaded: bool
+    memory_bytes: int
+    last_accessed: str
 
 
 class UploadResponse(BaseModel):
@@ -62,16 +270,113 @@ class UploadResponse(BaseModel):
     num_chunks: int
 
 
+class DocumentUpdateResponse(BaseModel):
+    session_id: str
+    message: str
+    pdf_name: str
+    num_chunks: int
+    pages: Optional[int] = None
+    pages_changed: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
+
+
+class CorpusSessionRequest(BaseModel):
+    doc_ids: List[str]
+
+
+class CorpusDocumentResponse(BaseModel):
+    doc_id: str
+    message: str
+    pdf_name: str
+    num_chunks: int
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    status: str
+    message: str
+    pdf_name: str
+
+
 class HealthResponse(BaseModel):
     status: str
     api_configured: bool
 
 
 # Background task to clean up old sessions
-def cleanup_old_sessions():
-    """Remove sessions older than 1 hour (customize as needed)."""
-    # This is a placeholder - implement based on your requirements
-    pass
+async def cleanup_old_sessions():
+    """Periodically expire idle sessions, spill LRU sessions over budget and announce this worker."""
+    while True:
+        await asyncio.sleep(config.SESSION_SWEEP_INTERVAL_SECONDS)
+        await asyncio.to_thread(sessions.sweep)
+        await asyncio.to_thread(sessions.heartbeat, config.WORKER_URL or None)
+
+
+async def flush_corpus():
+    """Periodically save changes to the shared corpus."""
+    while True:
+        await asyncio.sleep(max(config.CORPUS_SAVE_INTERVAL_SECONDS, 1))
+        await asyncio.to_thread(corpus.flush)
+
+
+@app.on_event("startup")
+async def check_embedding_backend():
+    """Refuse to start when the configured embedding backend can't be loaded."""
+    check_backend()
+
+
+@app.on_event("startup")
+async def warmup_models():
+    """Load the shared embedding model before the first upload arrives."""
+    if config.EMBEDDING_WARMUP:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, warmup_embeddings)
+
+
+@app.on_event("startup")
+async def restore_sessions():
+    """Register persisted sessions; their indexes load on first use."""
+    def restore():
+        for session_id in index_store.list_session_ids():
+            metadata = index_store.load_metadata(session_id)
+            if metadata is not None:
+                sessions.register(session_id, metadata)
+        sessions.heartbeat(config.WORKER_URL or None)
+    
+    await asyncio.to_thread(restore)
+
+
+@app.on_event("startup")
+async def load_corpus():
+    """Load the shared corpus index from disk and start saving its changes."""
+    await asyncio.to_thread(corpus.load)
+    app.state.corpus_flusher = asyncio.create_task(flush_corpus())
+
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    """Start the background session sweeper."""
+    app.state.session_sweeper = asyncio.create_task(cleanup_old_sessions())
+
+
+@app.on_event("startup")
+async def open_worker_client():
+    """HTTP client for forwarding requests to the worker with a session loaded."""
+    app.state.worker_client = httpx.AsyncClient(timeout=config.LLM_TIMEOUT_SECONDS)
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Stop background work, persist chat history and the corpus, and close LLM connections."""
+    app.state.session_sweeper.cancel()
+    app.state.corpus_flusher.cancel()
+    ingestion_pool.shutdown()
+    shutdown_page_executor()
+    await asyncio.to_thread(sessions.persist_all)
+    await asyncio.to_thread(corpus.flush)
+    await close_llm_clients()
+    await app.state.worker_client.aclose()
 
 
 @app.get("/", response_model=dict)
@@ -82,8 +387,13 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "stats": "/stats",
+            "metrics": "/metrics",
             "upload": "/upload",
+            "job": "/jobs/{job_id}",
+            "corpus_documents": "/corpus/documents",
             "ask": "/ask",
+            "ask_stream": "/ask/stream",
             "sessions": "/sessions",
             "session_detail": "/sessions/{session_id}"
         }
@@ -104,19 +414,208 @@ async def health_check():
     )
 
 
-@app.post("/upload", response_model=UploadResponse)
+@app.get("/stats", response_model=dict)
+async def get_stats():
+    """Report resource usage of shared components such as embedding models."""
+    embedding_cache = get_embedding_cache()
+    return {
+        "embeddings": get_embedding_stats(),
+        "ingestion": ingestion_pool.stats(),
+        "admission": admission.stats() if config.ADMISSION_ENABLED else None,
+        "ingestion_cache": ingestion_cache.stats(),
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        "answer_cache": answer_cache.stats(),
+        "corpus": corpus.stats(),
+        "sessions": sessions.stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Export metrics in the Prometheus text format.
+    
+    Includes per-stage and per-route latency histograms, LLM token counts,
+    session counts, cache hits and misses, and the ingestion queue depth.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def create_session(
+    pdf_name: str, doc_hash: str, num_chunks: int, vector_store, page_hashes: Optional[List[str]] = None
+) -> dict:
+    """
+    Build a conversation chain over a vector store and register a new session.
+    
+    Args:
+        pdf_name: Original file name
+        doc_hash: Hash of the PDF content
+        num_chunks: Number of chunks in the document
+        vector_store: FAISS store built from the chunks
+        page_hashes: Hashes of the document's pages, for incremental updates
+    
+    Returns:
+        Session ID, PDF name and number of chunks
+    """
+    with span("chain_build"):
+        conversation_chain = create_conversation_chain(vector_store)
+    
+    session_id = str(uuid.uuid4())
+    metadata = {
+        "pdf_name": pdf_name,
+        "document_hash": doc_hash,
+        "num_chunks": num_chunks,
+        "created_at": datetime.now().isoformat()
+    }
+    with span("index_save"):
+        index_store.save(session_id, vector_store, metadata, page_hashes)
+    
+    sessions.create(
+        session_id, metadata, conversation_chain, index_bytes=estimate_vector_store_bytes(vector_store)
+    )
+    sessions.sweep()
+    SESSIONS_CREATED.inc(kind="document")
+    
+    return {
+        "session_id": session_id,
+        "pdf_name": pdf_name,
+        "num_chunks": num_chunks
+    }
+
+
+def process_pdf(job: IngestionJob, temp_file_path: str, pdf_name: str, doc_hash: str) -> dict:
+    """
+    Run the ingestion pipeline for an uploaded PDF and create a session.
+    
+    Executed on an ingestion worker; removes the temporary file when done.
+    
+    Args:
+        job: Job receiving stage and progress updates
+        temp_file_path: Path of the uploaded PDF on disk
+        pdf_name: Original file name
+        doc_hash: Hash of the PDF content
+    
+    Returns:
+        Session ID, PDF name and number of chunks
+    """
+    try:
+        page_hashes = []
+        vector_store, stats = ingestion_pool.ingest(temp_file_path, job, page_hashes=page_hashes)
+        num_chunks = stats["chunks"]
+        
+        if config.INGESTION_CACHE_ENABLED:
+            job.update(stage="caching")
+            with span("cache_store"):
+                ingestion_cache.put(ingestion_cache_key(doc_hash), num_chunks, vector_store, page_hashes)
+        
+        job.update(stage="building_chain")
+        return create_session(pdf_name, doc_hash, num_chunks, vector_store, page_hashes)
+    
+    finally:
+        # Clean up temporary file
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+# The upload endpoints read their multipart body themselves, so describe it here
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+
+async def spool_upload(request: Request):
+    """
+    Stream an uploaded PDF to a temporary file, hashing its content on the way.
+    
+    Args:
+        request: multipart/form-data request with the PDF in its "file" field
+    
+    Returns:
+        Tuple of (file name, temporary file path, document hash)
+    """
+    try:
+        with span("spool"):
+            return await spool_pdf_upload(request)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+
+
+async def submit_ingestion(process, temp_file_path: str, pdf_name: str, doc_hash: str, async_mode: bool):
+    """
+    Queue an ingestion on the worker pool and wait for it unless async_mode.
+    
+    Args:
+        process: Callable(job, temp_file_path, pdf_name, doc_hash) returning a dict
+        temp_file_path: Path of the uploaded PDF, removed by process
+        pdf_name: Original file name
+        doc_hash: Hash of the PDF content
+        async_mode: Return a JobResponse immediately instead of waiting
+    
+    Returns:
+        The dict returned by process, or a JobResponse in async mode
+    """
+    # A waiting request reports the job's stages as its own
+    job = IngestionJob(pdf_name, timings=None if async_mode else current_timings())
+    try:
+        future = ingestion_pool.submit(process, job, temp_file_path, pdf_name, doc_hash)
+    except QueueFullError as e:
+        os.remove(temp_file_path)
+        retry_after = max(1, math.ceil(admission.lanes["ingest"].hold_seconds))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(retry_after)})
+    
+    # Let other workers answer /jobs/{job_id} too
+    await asyncio.to_thread(publish_job, job)
+    future.add_done_callback(lambda _: publish_job(job))
+    
+    if async_mode:
+        return JobResponse(
+            job_id=job.job_id,
+            status=job.status,
+            message="PDF queued for processing",
+            pdf_name=pdf_name
+        )
+    
+    try:
+        return await asyncio.wrap_future(future)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+
+
+@app.post("/upload", response_model=Union[UploadResponse, JobResponse], openapi_extra=UPLOAD_REQUEST_BODY)
 async def upload_pdf(
-    file: UploadFile = File(...),
+    request: Request,
+    async_mode: bool = Query(False, alias="async"),
     background_tasks: BackgroundTasks = None
 ):
     """
     Upload a PDF file and create a new chat session.
     
+    Processing runs on the ingestion worker pool. With ?async=true the
+    request returns a job ID immediately; poll /jobs/{job_id} for progress.
+    The PDF is streamed to disk as it arrives; files over
+    config.UPLOAD_MAX_MB are rejected with 413.
+    
     Args:
-        file: PDF file to upload
-        
+        request: multipart/form-data request with the PDF in its "file" field
+        async_mode: Return a job ID instead of waiting for processing
+    
     Returns:
-        Session ID and processing information
+        Session ID and processing information, or a job ID in async mode
     """
     # Validate API configuration
     if not config.OPENROUTER_API_KEY or config.OPENROUTER_API_KEY == "your_openrouter_api_key_here":
@@ -125,113 +624,702 @@ async def upload_pdf(
             detail="OpenRouter API key not configured. Please set OPENROUTER_API_KEY in .env file"
         )
     
-    # Validate file type
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    # Validates the file type and size while streaming it to disk
+    pdf_name, temp_file_path, doc_hash = await spool_upload(request)
+    
+    # Same PDF and settings as an earlier upload: reuse its chunks and index
+    if config.INGESTION_CACHE_ENABLED:
+        with span("cache_lookup"):
+            cached = await asyncio.to_thread(ingestion_cache.get, ingestion_cache_key(doc_hash))
+        if cached is not None:
+            os.remove(temp_file_path)
+            result = await asyncio.to_thread(
+                create_session, pdf_name, doc_hash, cached.num_chunks, cached.vector_store, cached.page_hashes
+            )
+            return UploadResponse(message="PDF loaded from cache", **result)
+    
+    result = await submit_ingestion(process_pdf, temp_file_path, pdf_name, doc_hash, async_mode)
+    if isinstance(result, JobResponse):
+        return result
+    
+    return UploadResponse(message="PDF processed successfully", **result)
+
+
+def process_document_update(
+    job: IngestionJob, temp_file_path: str, pdf_name: str, doc_hash: str, session_id: str
+) -> dict:
+    """
+    Apply a new version of a session's PDF to its index, re-embedding only changed pages.
+    
+    Executed on an ingestion worker; removes the temporary file when done.
+    The session keeps answering from its current index until the updated
+    one is saved and swapped in. Concurrent updates of the same session
+    are applied one after the other.
     
+    Args:
+        job: Job receiving stage and progress updates
+        temp_file_path: Path of the new version on disk
+        pdf_name: Original file name
+        doc_hash: Hash of the new version's content
+        session_id: Session whose document is updated
+    
+    Returns:
+        Session ID, PDF name, number of chunks and what was re-embedded
+    """
     try:
-        # Create temporary file to save uploaded PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Process PDF
-        try:
-            # Open the temporary file for reading
-            with open(temp_file_path, 'rb') as pdf_file:
-                raw_text = load_pdf(pdf_file)
-            
-            text_chunks = get_text_chunks(raw_text)
-            vector_store = create_vector_store(text_chunks)
-            conversation_chain = create_conversation_chain(vector_store)
+        # Updates of one session run one at a time, in any worker
+        with index_store.update_lock(session_id):
+            # A private copy to modify, as searches may be running on the loaded one
+            with span("index_load"):
+                vector_store = index_store.load_vector_store(session_id, mmap=False)
+            page_hashes, stats = ingestion_pool.update(
+                temp_file_path, job, vector_store, index_store.load_page_hashes(session_id)
+            )
             
-            # Create session
-            session_id = str(uuid.uuid4())
-            sessions[session_id] = {
-                "conversation_chain": conversation_chain,
-                "pdf_name": file.filename,
-                "num_chunks": len(text_chunks),
-                "created_at": datetime.now().isoformat(),
-                "chat_history": [],
-                "raw_text": raw_text  # Store for debugging
+            session = sessions.get(session_id)
+            if session is None:
+                raise ValueError("Session was deleted during the update")
+            metadata = {
+                **session.metadata(),
+                "pdf_name": pdf_name,
+                "document_hash": doc_hash,
+                "num_chunks": stats["chunks"]
             }
+            job.update(stage="building_chain")
+            with span("chain_build"):
+                conversation_chain = create_conversation_chain(vector_store)
+            with span("index_save"):
+                index_store.save(session_id, vector_store, metadata, page_hashes)
+            sessions.update(session_id, metadata, conversation_chain, estimate_vector_store_bytes(vector_store))
+            sessions.sweep()
             
-            return UploadResponse(
-                session_id=session_id,
-                message="PDF processed successfully",
-                pdf_name=file.filename,
-                num_chunks=len(text_chunks)
-            )
+            if config.INGESTION_CACHE_ENABLED:
+                with span("cache_store"):
+                    ingestion_cache.put(ingestion_cache_key(doc_hash), stats["chunks"], vector_store, page_hashes)
             
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                
+            return {
+                "session_id": session_id,
+                "pdf_name": pdf_name,
+                "num_chunks": stats["chunks"],
+                "pages": stats["pages"],
+                "pages_changed": stats["pages_changed"],
+                "chunks_added": stats["chunks_added"],
+                "chunks_removed": stats["chunks_removed"]
+            }
+    
+    finally:
+        # Clean up temporary file
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+@app.put(
+    "/sessions/{session_id}/document",
+    response_model=Union[DocumentUpdateResponse, JobResponse],
+    openapi_extra=UPLOAD_REQUEST_BODY
+)
+async def update_session_document(
+    session_id: str,
+    request: Request,
+    async_mode: bool = Query(False, alias="async")
+):
+    """
+    Replace a session's PDF with a new version of it.
+    
+    Pages are compared with the previous version by the hash of their text,
+    and only changed pages are chunked and embedded again; chunks of
+    changed or removed pages are dropped from the index. The session keeps
+    its id and chat history.
+    
+    Args:
+        session_id: Session identifier
+        request: multipart/form-data request with the PDF in its "file" field
+        async_mode: Return a job ID instead of waiting for processing
+    
+    Returns:
+        Session ID and update statistics, or a job ID in async mode
+    """
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if session.doc_ids is not None:
+        raise HTTPException(
+            status_code=400, detail="Corpus sessions have no document of their own to update"
+        )
+    
+    pdf_name, temp_file_path, doc_hash = await spool_upload(request)
+    if doc_hash == session.document_hash:
+        os.remove(temp_file_path)
+        return DocumentUpdateResponse(
+            session_id=session_id,
+            message="Document unchanged",
+            pdf_name=session.pdf_name,
+            num_chunks=session.num_chunks
+        )
+    
+    result = await submit_ingestion(
+        functools.partial(process_document_update, session_id=session_id),
+        temp_file_path, pdf_name, doc_hash, async_mode
+    )
+    if isinstance(result, JobResponse):
+        return result
+    
+    return DocumentUpdateResponse(message="Document updated", **result)
+
+
+def process_corpus_pdf(job: IngestionJob, temp_file_path: str, pdf_name: str, doc_hash: str) -> dict:
+    """
+    Run the ingestion pipeline for a PDF and add it to the shared corpus.
+    
+    Executed on an ingestion worker; removes the temporary file when done.
+    
+    Args:
+        job: Job receiving stage and progress updates
+        temp_file_path: Path of the uploaded PDF on disk
+        pdf_name: Original file name
+        doc_hash: Hash of the PDF content
+    
+    Returns:
+        Document ID, PDF name and number of chunks
+    """
+    try:
+        doc_id, stats = ingestion_pool.ingest(
+            temp_file_path, job,
+            build=lambda chunks, progress: corpus.add_document(pdf_name, doc_hash, chunks, progress)
+        )
+        return {
+            "doc_id": doc_id,
+            "pdf_name": pdf_name,
+            "num_chunks": stats["chunks"]
+        }
+    
+    finally:
+        # Clean up temporary file
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+@app.post(
+    "/corpus/documents",
+    response_model=Union[CorpusDocumentResponse, JobResponse],
+    openapi_extra=UPLOAD_REQUEST_BODY
+)
+async def add_corpus_document(
+    request: Request,
+    async_mode: bool = Query(False, alias="async")
+):
+    """
+    Add a PDF to the shared corpus index.
+    
+    Args:
+        request: multipart/form-data request with the PDF in its "file" field
+        async_mode: Return a job ID instead of waiting for processing
+    
+    Returns:
+        Document ID and processing information, or a job ID in async mode
+    """
+    pdf_name, temp_file_path, doc_hash = await spool_upload(request)
+    result = await submit_ingestion(process_corpus_pdf, temp_file_path, pdf_name, doc_hash, async_mode)
+    if isinstance(result, JobResponse):
+        return result
+    
+    return CorpusDocumentResponse(message="PDF added to corpus", **result)
+
+
+@app.get("/corpus/documents", response_model=List[dict])
+async def list_corpus_documents():
+    """
+    List the documents in the shared corpus.
+    
+    Returns:
+        Document ID, PDF name, number of chunks and creation time per document
+    """
+    return corpus.list_documents()
+
+
+@app.delete("/corpus/documents/{doc_id}", response_model=dict)
+async def delete_corpus_document(doc_id: str):
+    """
+    Remove a document and its chunks from the shared corpus.
+    
+    Args:
+        doc_id: Document identifier
+    
+    Returns:
+        Confirmation message
+    """
+    try:
+        deleted = await asyncio.to_thread(corpus.delete_document, doc_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return {
+        "message": f"Document {doc_id} deleted successfully"
+    }
+
+
+@app.post("/sessions", response_model=UploadResponse)
+async def create_corpus_session(request: CorpusSessionRequest):
+    """
+    Create a chat session over one or more documents of the shared corpus.
+    
+    Args:
+        request: IDs of the corpus documents to answer from
+    
+    Returns:
+        Session ID and processing information
+    """
+    documents = {document["doc_id"]: document for document in corpus.list_documents()}
+    missing = [doc_id for doc_id in request.doc_ids if doc_id not in documents]
+    if not request.doc_ids or missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Documents not found in corpus: {', '.join(missing) or 'none given'}"
+        )
+    
+    session_id = str(uuid.uuid4())
+    metadata = {
+        "pdf_name": ", ".join(documents[doc_id]["pdf_name"] for doc_id in request.doc_ids),
+        "doc_ids": request.doc_ids,
+        "num_chunks": sum(documents[doc_id]["num_chunks"] for doc_id in request.doc_ids),
+        "created_at": datetime.now().isoformat()
+    }
+    await asyncio.to_thread(index_store.save_metadata, session_id, metadata)
+    
+    # The corpus index is shared, so the session itself holds no index memory
+    await asyncio.to_thread(sessions.create, session_id, metadata, create_corpus_chain(request.doc_ids))
+    SESSIONS_CREATED.inc(kind="corpus")
+    
+    return UploadResponse(
+        session_id=session_id,
+        message="Corpus session created",
+        pdf_name=metadata["pdf_name"],
+        num_chunks=metadata["num_chunks"]
+    )
+
+
+def publish_job(job: IngestionJob):
+    """Store a snapshot of a job in the session backend."""
+    sessions.backend.save_job(job.job_id, sessions.worker_id, job.to_dict())
+
+
+@app.get("/jobs/{job_id}", response_model=dict)
+async def get_job(job_id: str, http_request: Request):
+    """
+    Get the status and per-stage progress of an ingestion job.
+    
+    Jobs run by another worker are read from the shared session backend,
+    or from that worker while it is still running them.
+    
+    Args:
+        job_id: Job identifier returned by /upload?async=true
+    
+    Returns:
+        Job status, current stage, progress counters and result
+    """
+    job = ingestion_pool.get_job(job_id)
+    if job is not None:
+        return job.to_dict()
+    
+    snapshot = await asyncio.to_thread(sessions.backend.get_job, job_id, WORKER_LIVENESS_SECONDS)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    state, worker_url = snapshot
+    if state["status"] in ("queued", "running") and worker_url:
+        response = await forward_to_worker(http_request, worker_url)
+        if response is not None:
+            return response
+    return state
+
+
+async def forward_to_worker(http_request: Request, worker_url: str, payload=None, stream: bool = False):
+    """
+    Send a request on to another worker and relay its response.
+    
+    Args:
+        http_request: Incoming request
+        worker_url: Base URL of the other worker
+        payload: JSON body to send, for POST requests
+        stream: Relay the response body as it arrives
+    
+    Returns:
+        The other worker's response, or None to handle the request here
+        (forwarding is off, the request was already forwarded, or the
+        worker can't be reached)
+    """
+    if not config.WORKER_URL or worker_url == config.WORKER_URL or http_request.headers.get(FORWARDED_HEADER):
+        return None
+    client = app.state.worker_client
+    forward_headers = {FORWARDED_HEADER: sessions.worker_id}
+    if config.WORKER_SECRET:
+        forward_headers[WORKER_SECRET_HEADER] = config.WORKER_SECRET
+    upstream_request = client.build_request(
+        http_request.method,
+        worker_url.rstrip("/") + http_request.url.path,
+        params=http_request.query_params,
+        json=payload,
+        headers=forward_headers
+    )
+    try:
+        upstream = await client.send(upstream_request, stream=stream)
+    except httpx.TransportError:
+        return None
+    
+    headers = {
+        name: value for name, value in upstream.headers.items()
+        if name.lower() in ("content-type", "cache-control", "x-accel-buffering")
+    }
+    if stream:
+        return StreamingResponse(
+            upstream.aiter_raw(),
+            status_code=upstream.status_code,
+            headers=headers,
+            background=BackgroundTask(upstream.aclose)
+        )
+    return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+
+async def forward_to_warm_worker(http_request: Request, session_id: str, payload: dict, stream: bool = False):
+    """
+    Send a session request to the worker that has the session's index loaded.
+    
+    Only takes effect for workers started with a WORKER_URL over a shared
+    session backend; loading the index a second time here would cost far
+    more than the extra hop.
+    
+    Returns:
+        The warm worker's response, or None to handle the request here
+    """
+    if not config.WORKER_URL or http_request.headers.get(FORWARDED_HEADER):
+        return None
+    worker_url = await asyncio.to_thread(sessions.warm_worker_url, session_id, WORKER_LIVENESS_SECONDS)
+    if worker_url is None:
+        return None
+    return await forward_to_worker(http_request, worker_url, payload, stream)
+
+
+def create_corpus_chain(doc_ids: List[str]):
+    """Conversation chain retrieving from a subset of the shared corpus."""
+    return create_conversation_chain(
+        None, retriever=CorpusRetriever(corpus=corpus, doc_ids=doc_ids, k=config.CONTEXT_MAX_CHUNKS)
+    )
+
+
+def load_session(session_id: str) -> Optional[SessionRecord]:
+    """
+    Get a session, loading its index from disk if it is not in memory.
+    
+    Args:
+        session_id: Session identifier
+    
+    Returns:
+        Session with a ready conversation chain, or None if it doesn't exist
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return None
+    
+    sessions.touch(session_id)
+    if not session.loaded and session.doc_ids is not None:
+        sessions.set_loaded(session_id, create_corpus_chain(session.doc_ids), index_bytes=0)
+    elif not session.loaded:
+        with span("index_load"):
+            vector_store = index_store.load_vector_store(session_id)
+        with span("chain_build"):
+            conversation_chain = create_conversation_chain(vector_store)
+        sessions.set_loaded(session_id, conversation_chain, estimate_vector_store_bytes(vector_store))
+        sessions.sweep()
+    
+    return session
+
+
+def answer_cache_key(session: SessionRecord) -> Optional[str]:
+    """Answer cache key for a session's document, or None if caching is off."""
+    doc_hash = session.document_hash
+    if not config.ANSWER_CACHE_ENABLED or not doc_hash:
+        return None
+    # Answers depend on the model as well as the document
+    return f"{doc_hash}:{config.OPENROUTER_MODEL}"
+
+
+async def lookup_answer(session: SessionRecord, question: str):
+    """
+    Look up a cached answer to a similar question about the session's document.
+    
+    The question vector is returned so that retrieval on a miss can reuse it
+    instead of embedding the question again.
+    
+    Args:
+        session: Session entry
+        question: Question text
+    
+    Returns:
+        Tuple of (question vector or None, cached entry or None)
+    """
+    cache_key = answer_cache_key(session)
+    if cache_key is None:
+        return None, None
+    with span("query_embed"):
+        question_vector = await asyncio.to_thread(get_embeddings().embed_query, question)
+    with span("answer_cache_lookup"):
+        return question_vector, answer_cache.lookup(cache_key, question_vector)
 
 
 @app.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, http_request: Request):
     """
     Ask a question about an uploaded PDF.
     
     Args:
         request: Question and session ID
-        
+    
     Returns:
         AI-generated answer based on PDF content
     """
-    # Validate session
-    if request.session_id not in sessions:
+    forwarded = await forward_to_warm_worker(http_request, request.session_id, request.model_dump())
+    if forwarded is not None:
+        return forwarded
+    
+    # Validate session, loading its index from disk if needed
+    session = await asyncio.to_thread(load_session, request.session_id)
+    if session is None:
         raise HTTPException(
             status_code=404,
             detail="Session not found. Please upload a PDF first."
         )
     
     try:
-        session = sessions[request.session_id]
-        conversation_chain = session["conversation_chain"]
+        conversation_chain = session.conversation_chain
         
-        # Get response
-        response = get_response(conversation_chain, request.question)
+        # Answer near-duplicate questions from the cache
+        question_vector, cached = await lookup_answer(session, request.question)
+        prompt_tokens = None
+        if cached is not None:
+            answer = cached["answer"]
+        else:
+            # Get response
+            response = await aget_response(conversation_chain, request.question, question_vector)
+            answer = response["answer"]
+            prompt_tokens = response["prompt_tokens"]
+            if question_vector is not None:
+                answer_cache.store(
+                    answer_cache_key(session), request.question, question_vector, answer,
+                    format_sources(response.get("source_documents", []))
+                )
         
         # Store in chat history
         chat_entry = {
             "question": request.question,
-            "answer": response["answer"],
+            "answer": answer,
             "timestamp": datetime.now().isoformat()
         }
-        session["chat_history"].append(chat_entry)
+        await asyncio.to_thread(sessions.append_history, request.session_id, [chat_entry])
         
         return QuestionResponse(
-            answer=response["answer"],
+            answer=answer,
             session_id=request.session_id,
-            timestamp=chat_entry["timestamp"]
+            timestamp=chat_entry["timestamp"],
+            cached=cached is not None,
+            prompt_tokens=prompt_tokens
         )
-        
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
 
+@app.post("/ask/batch", response_model=BatchQuestionResponse)
+async def ask_questions_batch(request: BatchQuestionRequest, http_request: Request):
+    """
+    Ask many questions about an uploaded PDF in one request.
+    
+    All questions are embedded in one encoder call and retrieved with one
+    index search; LLM calls then run concurrently, at most
+    config.BATCH_LLM_CONCURRENCY at a time. A failed question gets an error
+    in its result instead of failing the batch.
+    
+    Args:
+        request: Questions and session ID
+    
+    Returns:
+        One result per question, in request order
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(request.questions) > config.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.BATCH_MAX_QUESTIONS} questions are allowed per batch"
+        )
+    
+    forwarded = await forward_to_warm_worker(http_request, request.session_id, request.model_dump())
+    if forwarded is not None:
+        return forwarded
+    
+    # Validate session, loading its index from disk if needed
+    session = await asyncio.to_thread(load_session, request.session_id)
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Session not found. Please upload a PDF first."
+        )
+    
+    try:
+        with span("query_embed"):
+            question_vectors = await asyncio.to_thread(get_embeddings().embed_documents, request.questions)
+        
+        # Answer near-duplicate questions from the cache, the rest from the LLM
+        cache_key = answer_cache_key(session)
+        results = [None] * len(request.questions)
+        pending = []
+        with span("answer_cache_lookup"):
+            for i, (question, question_vector) in enumerate(zip(request.questions, question_vectors)):
+                cached = answer_cache.lookup(cache_key, question_vector) if cache_key else None
+                if cached is not None:
+                    results[i] = BatchAnswer(index=i, question=question, answer=cached["answer"], cached=True)
+                else:
+                    pending.append(i)
+        
+        responses = await aget_batch_responses(
+            session.conversation_chain,
+            [request.questions[i] for i in pending],
+            [question_vectors[i] for i in pending]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing questions: {str(e)}")
+    
+    for i, response in zip(pending, responses):
+        question = request.questions[i]
+        if isinstance(response, Exception):
+            results[i] = BatchAnswer(index=i, question=question, error=f"Error processing question: {str(response)}")
+            continue
+        if cache_key:
+            answer_cache.store(
+                cache_key, question, question_vectors[i], response["answer"],
+                format_sources(response["source_documents"])
+            )
+        results[i] = BatchAnswer(
+            index=i, question=question, answer=response["answer"], prompt_tokens=response["prompt_tokens"]
+        )
+    
+    # Store answered questions in chat history, in request order
+    timestamp = datetime.now().isoformat()
+    await asyncio.to_thread(sessions.append_history, request.session_id, [
+        {"question": result.question, "answer": result.answer, "timestamp": timestamp}
+        for result in results if result.answer is not None
+    ])
+    
+    return BatchQuestionResponse(session_id=request.session_id, timestamp=timestamp, results=results)
+
+
+def format_sse(event: str, data) -> str:
+    """Format a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest, http_request: Request):
+    """
+    Ask a question and stream the answer as Server-Sent Events.
+    
+    Emits a "sources" event with the retrieved chunks, a "usage" event with
+    the prompt token count, one "token" event per answer token, and a final
+    "done" event (or "error" if the LLM fails). Cached answers have no
+    "usage" event.
+    
+    Args:
+        request: Question and session ID
+    
+    Returns:
+        text/event-stream response
+    """
+    forwarded = await forward_to_warm_worker(http_request, request.session_id, request.model_dump(), stream=True)
+    if forwarded is not None:
+        return forwarded
+    
+    # Validate session, loading its index from disk if needed
+    session = await asyncio.to_thread(load_session, request.session_id)
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Session not found. Please upload a PDF first."
+        )
+    
+    conversation_chain = session.conversation_chain
+    
+    async def event_stream():
+        answer_parts = []
+        sources = []
+        prompt_tokens = None
+        try:
+            question_vector, cached = await lookup_answer(session, request.question)
+            if cached is not None:
+                # Replay the cached answer as a single token
+                yield format_sse("sources", cached["sources"])
+                answer_parts.append(cached["answer"])
+                yield format_sse("token", cached["answer"])
+            else:
+                async for event, data in astream_response(conversation_chain, request.question, question_vector):
+                    if event == "sources":
+                        sources = data
+                    elif event == "usage":
+                        prompt_tokens = data["prompt_tokens"]
+                    elif event == "token":
+                        answer_parts.append(data)
+                    yield format_sse(event, data)
+                if question_vector is not None:
+                    answer_cache.store(
+                        answer_cache_key(session), request.question, question_vector,
+                        "".join(answer_parts), sources
+                    )
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Error processing question: {str(e)}"})
+            return
+        
+        # Store the complete answer in chat history
+        chat_entry = {
+            "question": request.question,
+            "answer": "".join(answer_parts),
+            "timestamp": datetime.now().isoformat()
+        }
+        await asyncio.to_thread(sessions.append_history, request.session_id, [chat_entry])
+        
+        yield format_sse("done", {
+            "session_id": request.session_id,
+            "timestamp": chat_entry["timestamp"],
+            "cached": cached is not None,
+            "prompt_tokens": prompt_tokens
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/sessions", response_model=List[SessionInfo])
 async def list_sessions():
     """
     List all active sessions.
     
     Returns:
-        List of session information
+        List of session information, including whether each session is
+        loaded in this worker's memory and its estimated memory use
     """
+    session_items = await asyncio.to_thread(sessions.items)
     return [
         SessionInfo(
             session_id=session_id,
-            created_at=session_data["created_at"],
-            pdf_name=session_data["pdf_name"],
-            num_chunks=session_data["num_chunks"]
+            created_at=session_data.created_at,
+            pdf_name=session_data.pdf_name,
+            num_chunks=session_data.num_chunks,
+            loaded=session_data.loaded,
+            memory_bytes=estimate_session_bytes(session_data),
+            last_accessed=datetime.fromtimestamp(session_data.last_accessed).isoformat()
         )
-        for session_id, session_data in sessions.items()
+        for session_id, session_data in session_items
     ]
 
 
@@ -242,26 +1330,27 @@ async def get_session(session_id: str):
     
     Args:
         session_id: Session identifier
-        
+    
     Returns:
         Session details including chat history
     """
-    if session_id not in sessions:
+    session = await asyncio.to_thread(sessions.get, session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
+    chat_history = await asyncio.to_thread(sessions.history, session_id)
     
-    session = sessions[session_id]
-    
-    # Get sample text from first few chunks for debugging
+    # Sample text from the start of the document for debugging, read back
+    # from its saved chunks rather than kept in memory
     sample_text = ""
-    if "raw_text" in session:
-        sample_text = session["raw_text"][:500] + "..." if len(session.get("raw_text", "")) > 500 else session.get("raw_text", "")
+    if session.doc_ids is None:
+        sample_text = await asyncio.to_thread(index_store.load_sample_text, session_id)
     
     return {
         "session_id": session_id,
-        "pdf_name": session["pdf_name"],
-        "num_chunks": session["num_chunks"],
-        "created_at": session["created_at"],
-        "chat_history": session["chat_history"],
+        "pdf_name": session.pdf_name,
+        "num_chunks": session.num_chunks,
+        "created_at": session.created_at,
+        "chat_history": chat_history,
         "sample_text": sample_text  # For debugging - first 500 chars
     }
 
@@ -273,14 +1362,14 @@ async def delete_session(session_id: str):
     
     Args:
         session_id: Session identifier
-        
+    
     Returns:
         Confirmation message
     """
-    if session_id not in sessions:
+    if not await asyncio.to_thread(sessions.delete, session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
-    del sessions[session_id]
+    await asyncio.to_thread(index_store.delete, session_id)
     
     return {
         "message": f"Session {session_id} deleted successfully"
@@ -0,0 +1,170 @@
+"""Compare FAISS index types on recall@k against exact search and query latency.
+
+Uses synthetic clustered vectors with the MiniLM embedding dimension by default,
+so it runs without the embedding model:
+
+    python -m benchmarks.ann_benchmark --vectors 200000 --queries 500 --k 4
+
+Vector storage formats and PCA reductions are compared the same way; with
+--source document the vectors are the embedded chunks of a synthetic PDF
+(see benchmarks.synthetic_pdf) and the queries its fixed question set:
+
+    python -m benchmarks.ann_benchmark --types flat --storage float32 float16 int8 --pca-dims 0 128
+    python -m benchmarks.ann_benchmark --source document --pages 500 --types flat hnsw
+
+Prints one JSON object with build time, query latency, recall@k and index size
+per index type, storage and PCA dimension, plus the memory saved, speedup and
+recall lost relative to exact float32 search. Combinations that can't be built
+for the vectors (PCA to as many dimensions as they have, or too few vectors to
+train) are listed as skipped.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from utils.vector_index import INDEX_TYPES, STORAGE_TYPES, build_index, min_training_vectors
+
+
+def synthetic_vectors(num_vectors, dim, num_clusters, seed):
+    """Unit-norm vectors drawn around random centroids, like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+    assignments = rng.integers(0, num_clusters, size=num_vectors)
+    vectors = centroids[assignments] + 0.1 * rng.normal(size=(num_vectors, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def synthetic_queries(vectors, num_queries, seed):
+    """Queries near stored vectors, as questions land near relevant chunks."""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.integers(0, len(vectors), size=num_queries)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth):
+    """Fraction of the exact top-k neighbours found, averaged over queries."""
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def document_vectors(pages, words_per_page, num_queries, seed):
+    """Embedded chunks of a synthetic PDF and its questions, as ingestion embeds them."""
+    from benchmarks.synthetic_pdf import make_document, make_questions
+    from utils.embeddings import get_embeddings
+    from utils.pdf_processor import get_text_chunks
+    
+    document_pages, identifiers = make_document(pages, words_per_page, seed)
+    questions = make_questions(document_pages, identifiers, num_queries, seed + 1)
+    chunks = get_text_chunks("\n".join(document_pages))
+    embeddings = get_embeddings()
+    vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    queries = np.asarray(embeddings.embed_documents(questions), dtype=np.float32)
+    return vectors, queries
+
+
+def benchmark_index(index_type, vectors, queries, k, storage="float32", pca_dim=0):
+    start = time.perf_counter()
+    index = build_index(vectors, index_type, storage, pca_dim)
+    build_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query[np.newaxis, :], k)
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    
+    _, found = index.search(queries, k)
+    return index, {
+        "index_type": index_type,
+        "storage": storage,
+        "pca_dim": pca_dim,
+        "build_seconds": round(build_seconds, 3),
+        "query_latency_ms": round(latency_ms, 4),
+        "index_bytes": int(faiss.serialize_index(index).size),
+    }, found
+
+
+def invalid_configuration(index_type, storage, pca_dim, vectors):
+    """Why an index can't be built for the vectors, or None if it can."""
+    num_vectors, dim = vectors.shape
+    if pca_dim >= dim:
+        return f"PCA dimension {pca_dim} is not below the vector dimension {dim}"
+    needed = min_training_vectors(index_type, storage, pca_dim, dim)
+    if num_vectors < needed:
+        return f"needs at least {needed} vectors to train, got {num_vectors}"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--storage", nargs="+", default=["float32"], choices=STORAGE_TYPES)
+    parser.add_argument("--pca-dims", nargs="+", type=int, default=[0], help="0 for no PCA")
+    parser.add_argument("--source", choices=("synthetic", "document"), default="synthetic")
+    parser.add_argument("--pages", type=int, default=200, help="Document pages for --source document")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    if args.source == "document":
+        vectors, queries = document_vectors(args.pages, args.words_per_page, args.queries, args.seed)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, args.clusters, args.seed)
+        queries = synthetic_queries(vectors, args.queries, args.seed + 1)
+    
+    # Exact float32 search is the reference for every other configuration
+    configurations = [("flat", "float32", 0)] + [
+        (index_type, storage, pca_dim)
+        for index_type in args.types
+        for storage in (["float32"] if index_type == "ivf_pq" else args.storage)
+        for pca_dim in args.pca_dims
+        if (index_type, storage, pca_dim) != ("flat", "float32", 0)
+    ]
+    reference = None
+    results = []
+    skipped = []
+    for index_type, storage, pca_dim in configurations:
+        reason = invalid_configuration(index_type, storage, pca_dim, vectors)
+        if reason is None:
+            try:
+                _, result, found = benchmark_index(index_type, vectors, queries, args.k, storage, pca_dim)
+            except (RuntimeError, ValueError) as e:
+                reason = str(e).strip().splitlines()[0]
+        if reason is not None:
+            print(f"Skipping {index_type}/{storage}/pca {pca_dim}: {reason}", file=sys.stderr)
+            skipped.append({"index_type": index_type, "storage": storage, "pca_dim": pca_dim, "reason": reason})
+            continue
+        if reference is None:
+            reference = (found, result["index_bytes"], result["query_latency_ms"])
+        recall = recall_at_k(found, reference[0])
+        result[f"recall@{args.k}"] = round(recall, 4)
+        result["recall_loss"] = round(1 - recall, 4)
+        result["memory_saved"] = round(1 - result["index_bytes"] / reference[1], 4)
+        result["speedup"] = round(reference[2] / result["query_latency_ms"], 2) if result["query_latency_ms"] else None
+        results.append(result)
+    
+    json.dump({
+        "source": args.source,
+        "vectors": len(vectors),
+        "queries": len(queries),
+        "dim": vectors.shape[1],
+        "k": args.k,
+        "results": results,
+        "skipped": skipped,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Compare embedding backends on throughput and agreement with PyTorch.
+
+Chunks a synthetic PDF's text (see benchmarks.synthetic_pdf) as ingestion
+does and embeds it with each backend (utils.embeddings.BACKENDS), then
+compares every backend's vectors with those of the "torch" backend: cosine
+similarity per chunk, and how many of the top-k chunks retrieved for each
+question are the same.
+
+    python -m benchmarks.embedding_benchmark --pages 100 --questions 50
+    python -m benchmarks.embedding_benchmark --backends torch onnx_int8 --repeat 3
+
+Prints one JSON object. ONNX backends export (and quantize) the model on
+first use, which is reported as their load time.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import config
+from benchmarks.pipeline_benchmark import git_commit, percentiles
+from benchmarks.synthetic_pdf import make_document, make_questions
+from utils.embeddings import BACKENDS, get_embeddings
+from utils.pdf_processor import get_text_chunks
+
+REFERENCE_BACKEND = "torch"
+
+
+def embed_all(embeddings, chunks):
+    """Embed chunks in ingestion-sized batches; returns (vectors, seconds)."""
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(chunks), config.EMBEDDING_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(chunks[i:i + config.EMBEDDING_BATCH_SIZE]))
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - start
+
+
+def top_k(chunk_vectors, query_vectors, k):
+    """Indexes of the k most similar chunks for each query."""
+    scores = query_vectors @ chunk_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def benchmark_backend(backend, chunks, questions, repeat):
+    """Load time, throughput and query latency of one backend."""
+    start = time.perf_counter()
+    embeddings = get_embeddings(backend=backend)
+    load_seconds = time.perf_counter() - start
+    embeddings.embed_query("warmup")
+    
+    # Best of several runs, as ingestion throughput is what we compare
+    runs = [embed_all(embeddings, chunks) for _ in range(repeat)]
+    vectors = runs[0][0]
+    seconds = min(run_seconds for _, run_seconds in runs)
+    
+    query_vectors = []
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        query_vectors.append(embeddings.embed_query(question))
+        latencies.append(time.perf_counter() - start)
+    
+    return vectors, np.asarray(query_vectors, dtype=np.float32), {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "embed_seconds": round(seconds, 4),
+        "chunks_per_second": round(len(chunks) / seconds, 1) if seconds > 0 else 0.0,
+        "query_embedding": percentiles(latencies),
+    }
+
+
+def agreement(vectors, query_vectors, reference_vectors, reference_queries, k):
+    """Cosine similarity to the reference vectors and top-k retrieval overlap."""
+    # Every backend returns unit vectors, so the dot product is the cosine
+    cosines = np.sum(vectors * reference_vectors, axis=1)
+    found = top_k(vectors, query_vectors, k)
+    expected = top_k(reference_vectors, reference_queries, k)
+    overlap = sum(len(set(f) & set(e)) for f, e in zip(found, expected)) / expected.size
+    return {
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "cosine_min": round(float(cosines.min()), 5),
+        "cosine_p5": round(float(np.percentile(cosines, 5)), 5),
+        f"top{k}_overlap": round(overlap, 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1, help="Embedding runs per backend, best is kept")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args(argv)
+    
+    pages, identifiers = make_document(args.pages, args.words_per_page, args.seed)
+    questions = make_questions(pages, identifiers, args.questions, args.seed + 1)
+    chunks = get_text_chunks("\n".join(pages))
+    
+    # Agreement is measured against the current PyTorch model
+    backends = [REFERENCE_BACKEND] + [backend for backend in args.backends if backend != REFERENCE_BACKEND]
+    results = []
+    reference = None
+    for backend in backends:
+        vectors, query_vectors, result = benchmark_backend(backend, chunks, questions, args.repeat)
+        if reference is None:
+            reference = (vectors, query_vectors, result["chunks_per_second"])
+        result["speedup"] = round(result["chunks_per_second"] / reference[2], 2) if reference[2] else None
+        result["agreement"] = agreement(vectors, query_vectors, reference[0], reference[1], args.k)
+        if backend in args.backends:
+            results.append(result)
+    
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {
+            "pages": args.pages,
+            "chunks": len(chunks),
+            "questions": args.questions,
+            "embedding_model": config.EMBEDDING_MODEL,
+            "batch_size": config.EMBEDDING_BATCH_SIZE,
+            "max_batch_tokens": config.EMBEDDING_MAX_BATCH_TOKENS,
+            "onnx_threads": config.EMBEDDING_ONNX_THREADS,
+        },
+        "backends": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    json.dump(output, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Benchmark the ingestion and query hot paths stage by stage.
+
+Generates a synthetic PDF (see benchmarks.synthetic_pdf) and times each
+stage in-process: PDF extraction, chunking, embedding, FAISS and BM25 index
+builds, and retrieval. Then, unless --no-e2e is given, it runs /upload,
+/ask and /ask/batch end to end against the fake OpenAI-compatible server
+(examples.fake_openai_server), started on a local port, so no API key is
+needed. The embedding model is the configured one (config.EMBEDDING_MODEL).
+
+    python -m benchmarks.pipeline_benchmark --pages 100 --questions 20 --output run.json
+    python -m benchmarks.pipeline_benchmark --pages 100 --compare run.json
+
+Prints one JSON object. With --compare, timings are compared against an
+earlier run and the exit status is 1 if any got slower by more than
+--threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import config
+from benchmarks.synthetic_pdf import make_document, make_questions, render_pdf
+
+# Slowdowns smaller than this are timer noise, whatever their ratio
+MIN_REGRESSION_MS = 1.0
+
+
+def percentiles(samples_seconds):
+    """p50/p95/mean of latency samples, in milliseconds."""
+    samples = np.asarray(samples_seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "mean_ms": round(float(samples.mean()), 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Call fn and return (result, seconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def git_commit():
+    """Commit of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_stages(pdf_path, questions):
+    """Time each ingestion and retrieval stage in-process."""
+    from langchain_community.vectorstores import FAISS
+    from utils.bm25 import BM25Index, HybridRetriever, attach_lexical_index
+    from utils.embeddings import get_embeddings
+    from utils.pdf_processor import load_pdf, get_text_chunks
+    from utils.vector_index import maybe_upgrade_index, search_batch, describe_index
+    
+    stages = {}
+    text, seconds = timed(load_pdf, pdf_path)
+    stages["load_pdf"] = {"seconds": round(seconds, 4), "characters": len(text)}
+    
+    chunks, seconds = timed(get_text_chunks, text)
+    stages["get_text_chunks"] = {"seconds": round(seconds, 4), "chunks": len(chunks)}
+    
+    embeddings, seconds = timed(get_embeddings)
+    stages["embedding_model_load"] = {"seconds": round(seconds, 4)}
+    embeddings.embed_query("warmup")
+    
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(chunks), config.EMBEDDING_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(chunks[i:i + config.EMBEDDING_BATCH_SIZE]))
+    seconds = time.perf_counter() - start
+    stages["embedding"] = {
+        "seconds": round(seconds, 4),
+        "chunks_per_second": round(len(chunks) / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+    def build_faiss():
+        store = FAISS.from_embeddings(list(zip(chunks, vectors)), embeddings)
+        maybe_upgrade_index(store)
+        return store
+    
+    vector_store, seconds = timed(build_faiss)
+    stages["faiss_build"] = {"seconds": round(seconds, 4), "index": describe_index(vector_store.index)}
+
+    def build_bm25():
+        lexical_index = BM25Index()
+        lexical_index.add(list(vector_store.index_to_docstore_id.values()), chunks)
+        lexical_index.flush()
+        return lexical_index
+    
+    lexical_index, seconds = timed(build_bm25)
+    attach_lexical_index(vector_store, lexical_index)
+    stages["bm25_build"] = {"seconds": round(seconds, 4)}
+    
+    query_latencies = []
+    query_vectors = []
+    for question in questions:
+        vector, seconds = timed(embeddings.embed_query, question)
+        query_vectors.append(vector)
+        query_latencies.append(seconds)
+    stages["query_embedding"] = percentiles(query_latencies)
+    
+    k = config.CONTEXT_MAX_CHUNKS
+    stages["vector_search"] = percentiles([
+        timed(search_batch, vector_store, [vector], k)[1] for vector in query_vectors
+    ])
+    stages["bm25_search"] = percentiles([
+        timed(lexical_index.search, question, config.HYBRID_FETCH_K)[1] for question in questions
+    ])
+    retriever = HybridRetriever(vector_store=vector_store, k=k)
+    stages["hybrid_retrieval"] = percentiles([
+        timed(retriever.retrieve_batch, [question], [vector])[1]
+        for question, vector in zip(questions, query_vectors)
+    ])
+    _, seconds = timed(retriever.retrieve_batch, questions, query_vectors)
+    stages["hybrid_retrieval_batch"] = {"seconds": round(seconds, 4), "queries": len(questions)}
+    return stages
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_llm(latency_ms):
+    """Run the fake OpenAI-compatible server on a background thread."""
+    import uvicorn
+    from examples import fake_openai_server
+    
+    fake_openai_server.LATENCY_SECONDS = latency_ms / 1000
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        fake_openai_server.app, host="127.0.0.1", port=port, log_level="warning"
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}/v1"
+
+
+def benchmark_end_to_end(pdf_bytes, questions, latency_ms):
+    """Time /upload, /ask and /ask/batch through the API against the fake LLM."""
+    server, thread, api_base = start_fake_llm(latency_ms)
+    work_dir = tempfile.mkdtemp(prefix="pipeline-benchmark-")
+    # Point the app at the fake LLM and at empty caches before it is imported
+    config.OPENROUTER_API_BASE = api_base
+    config.OPENROUTER_API_KEY = config.OPENROUTER_API_KEY or "benchmark"
+    config.INGESTION_CACHE_ENABLED = False
+    config.ANSWER_CACHE_ENABLED = False
+    config.INDEX_STORE_DIR = os.path.join(work_dir, "sessions")
+    config.CORPUS_DIR = os.path.join(work_dir, "corpus")
+    
+    from fastapi.testclient import TestClient
+    import api
+    
+    results = {"llm_latency_ms": latency_ms}
+    try:
+        with TestClient(api.app) as client:
+            response, seconds = timed(
+                client.post, "/upload", files={"file": ("benchmark.pdf", pdf_bytes, "application/pdf")}
+            )
+            response.raise_for_status()
+            session_id = response.json()["session_id"]
+            results["upload"] = {"seconds": round(seconds, 4), "num_chunks": response.json()["num_chunks"]}
+            
+            latencies = []
+            for question in questions:
+                response, seconds = timed(
+                    client.post, "/ask", json={"question": question, "session_id": session_id}
+                )
+                response.raise_for_status()
+                latencies.append(seconds)
+            results["ask"] = percentiles(latencies)
+            results["ask"]["total_seconds"] = round(sum(latencies), 4)
+            
+            response, seconds = timed(
+                client.post, "/ask/batch", json={"questions": questions, "session_id": session_id}
+            )
+            response.raise_for_status()
+            results["ask_batch"] = {
+                "seconds": round(seconds, 4),
+                "errors": sum(1 for result in response.json()["results"] if result["error"]),
+            }
+    finally:
+        server.should_exit = True
+        thread.join()
+    return results
+
+
+def _timings(results, prefix=""):
+    """Flatten the numeric timing fields of a results dict."""
+    timings = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            timings.update(_timings(value, f"{name}."))
+        elif key.endswith(("seconds", "_ms")) and isinstance(value, (int, float)) and key != "llm_latency_ms":
+            timings[name] = value
+    return timings
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare timings against an earlier run.
+    
+    Returns:
+        dict: Per timing the baseline, current value and ratio, plus the
+            names of timings slower than threshold times the baseline (and
+            by at least MIN_REGRESSION_MS)
+    """
+    current_timings = _timings({"stages": current["stages"], "end_to_end": current.get("end_to_end") or {}})
+    baseline_timings = _timings({"stages": baseline["stages"], "end_to_end": baseline.get("end_to_end") or {}})
+    timings = {}
+    regressions = []
+    for name, value in current_timings.items():
+        if name not in baseline_timings:
+            continue
+        base = baseline_timings[name]
+        ratio = round(value / base, 3) if base else None
+        timings[name] = {"baseline": base, "current": value, "ratio": ratio}
+        slowdown_ms = (value - base) * (1 if name.endswith("_ms") else 1000)
+        if ratio is not None and ratio > threshold and slowdown_ms >= MIN_REGRESSION_MS:
+            regressions.append(name)
+    return {
+        "baseline_commit": baseline.get("meta", {}).get("commit"),
+        "threshold": threshold,
+        "timings": timings,
+        "regressions": regressions,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency-ms", type=int, default=50)
+    parser.add_argument("--no-e2e", action="store_true", help="Skip the /upload and /ask runs")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Slowdown ratio reported as a regression (default 1.2)")
+    args = parser.parse_args(argv)
+    
+    pages, identifiers = make_document(args.pages, args.words_per_page, args.seed)
+    questions = make_questions(pages, identifiers, args.questions, args.seed + 1)
+    pdf_bytes = render_pdf(pages)
+    
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        pdf_file.write(pdf_bytes)
+        pdf_file.flush()
+        stages = benchmark_stages(pdf_file.name, questions)
+    
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {
+            "pages": args.pages,
+            "words_per_page": args.words_per_page,
+            "pdf_bytes": len(pdf_bytes),
+            "questions": args.questions,
+            "seed": args.seed,
+            "embedding_model": config.EMBEDDING_MODEL,
+            "chunk_size": config.CHUNK_SIZE,
+            "chunk_overlap": config.CHUNK_OVERLAP,
+            "vector_index_type": config.VECTOR_INDEX_TYPE,
+            "vector_storage": config.VECTOR_STORAGE,
+            "vector_pca_dim": config.VECTOR_PCA_DIM,
+            "retrieval_mode": config.RETRIEVAL_MODE,
+        },
+        "stages": stages,
+        "end_to_end": None if args.no_e2e else benchmark_end_to_end(pdf_bytes, questions, args.llm_latency_ms),
+    }
+    
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            results["comparison"] = compare(results, json.load(f), args.threshold)
+        exit_code = 1 if results["comparison"]["regressions"] else 0
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
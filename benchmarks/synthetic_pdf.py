@@ -0,0 +1,153 @@
+"""Synthetic PDFs of configurable size for benchmarks.
+
+Pages are filled with seeded pseudo-English sentences, some of which mention
+part numbers and error codes, and written as a plain PDF with one Helvetica
+text stream per page, so no PDF library is needed to produce them:
+
+    python -m benchmarks.synthetic_pdf --pages 200 --output /tmp/manual.pdf
+"""
+
+import argparse
+import random
+
+WORDS = (
+    "system pump valve pressure sensor controller filter motor cable panel housing "
+    "assembly bracket seal gasket bearing shaft coupling relay switch circuit board "
+    "display firmware update reset calibration inspection maintenance replacement "
+    "temperature flow rate voltage current signal warning alarm operator manual "
+    "procedure step check verify install remove tighten loosen clean lubricate "
+    "ensure before after during every monthly weekly daily the a an of to and in "
+    "on with for from by is are must should can may will not only each all any"
+).split()
+
+LINE_CHARS = 95
+
+
+def _sentence(rng, identifiers):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.15:
+        words.insert(rng.randrange(len(words)), rng.choice(identifiers))
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def make_document(num_pages, words_per_page=400, seed=0):
+    """
+    Generate page texts for a synthetic technical manual.
+    
+    Args:
+        num_pages (int): Number of pages
+        words_per_page (int): Approximate words per page
+        seed (int): Random seed, so the same arguments give the same document
+    
+    Returns:
+        tuple: (list of page texts, list of part numbers and error codes used)
+    """
+    rng = random.Random(seed)
+    identifiers = (
+        [f"PN-{rng.randint(10000, 99999)}" for _ in range(max(4, num_pages))]
+        + [f"E-{rng.randint(1000, 9999)}" for _ in range(max(4, num_pages // 2))]
+    )
+    pages = []
+    for _ in range(num_pages):
+        sentences = []
+        words = 0
+        while words < words_per_page:
+            sentence = _sentence(rng, identifiers)
+            sentences.append(sentence)
+            words += sentence.count(" ") + 1
+        pages.append(" ".join(sentences))
+    return pages, identifiers
+
+
+def _wrap(text, width):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(pages):
+    """
+    Write page texts as a PDF.
+    
+    Text is wrapped to a fixed line width; lines beyond one page's worth are
+    still written to that page (off the bottom), so no text is lost.
+    
+    Args:
+        pages (list): Text of each page
+    
+    Returns:
+        bytes: PDF file content
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(len(pages)))}] "
+            f"/Count {len(pages)} >>"
+        ).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        lines = " ".join(f"({_escape(line)}) '" for line in _wrap(text, LINE_CHARS))
+        stream = f"BT /F1 10 Tf 40 770 Td 12 TL {lines} ET".encode("latin-1", "replace")
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(pdf)
+
+
+def make_questions(pages, identifiers, num_questions, seed=0):
+    """
+    Questions about a synthetic document: half about identifiers, half
+    paraphrasing sentences from its pages.
+    """
+    rng = random.Random(seed)
+    questions = []
+    for i in range(num_questions):
+        if i % 2 == 0:
+            questions.append(f"What does the manual say about {rng.choice(identifiers)}?")
+        else:
+            sentence = rng.choice(rng.choice(pages).split(". "))
+            questions.append(f"Explain: {' '.join(sentence.split()[:10])}?")
+    return questions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args(argv)
+    
+    pages, _ = make_document(args.pages, args.words_per_page, args.seed)
+    with open(args.output, "wb") as f:
+        f.write(render_pdf(pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,10 +15,185 @@ OPENROUTER_APP_URL = os.getenv("OPENROUTER_APP_URL", "http://localhost:8501")
 # Document Processing Configuration
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
+# PDFs with at least this many pages are extracted on a process pool
+PDF_PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "50"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+# Text buffered (in chunks) while chunking a document page by page
+CHUNK_STREAM_WINDOW_CHUNKS = 8
+
+# Upload Configuration
+# Uploads are streamed to disk (UPLOAD_DIR, or the system temp directory) in
+# chunks; larger files are rejected with 413 before the body is read
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "200"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "")
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Embedding Configuration
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+# Load the embedding model at API startup instead of on the first upload
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() == "true"
+EMBEDDING_BATCH_SIZE = 64
+# "torch" (sentence-transformers), "onnx" (ONNX Runtime) or "onnx_int8" (ONNX
+# Runtime with int8 quantized weights); ONNX exports are made on first use
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", ".cache/onnx")
+# ONNX batches are grouped by length up to this many (padded) tokens
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "8192"))
+# ONNX Runtime threads per encoder call; 0 lets it use every core
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+# Embedded batches allowed to wait for the index, bounding ingestion memory
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "2"))
+
+# Vector Index Configuration
+# "flat" (exact), "ivf_flat", "hnsw" or "ivf_pq". Stores start flat and are
+# rebuilt as this type once they hold VECTOR_INDEX_MIN_VECTORS vectors.
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+VECTOR_INDEX_MIN_VECTORS = int(os.getenv("VECTOR_INDEX_MIN_VECTORS", "10000"))
+VECTOR_INDEX_NLIST = int(os.getenv("VECTOR_INDEX_NLIST", "256"))
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "16"))
+# IVF indexes are retrained once the store could use this many times their lists
+VECTOR_INDEX_RETRAIN_GROWTH = float(os.getenv("VECTOR_INDEX_RETRAIN_GROWTH", "2"))
+VECTOR_INDEX_HNSW_M = 32
+VECTOR_INDEX_EF_CONSTRUCTION = 80
+VECTOR_INDEX_EF_SEARCH = int(os.getenv("VECTOR_INDEX_EF_SEARCH", "64"))
+# Sub-quantizers for ivf_pq; lowered to the largest divisor of the embedding
+# dimension (384 for MiniLM), or of VECTOR_PCA_DIM when set, if it doesn't divide it
+VECTOR_INDEX_PQ_M = int(os.getenv("VECTOR_INDEX_PQ_M", "48"))
+# Stored vector format for flat, ivf_flat and hnsw indexes: "float32",
+# "float16" or "int8" (scalar quantized, 2x and 4x smaller)
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32")
+# Reduce vectors to this many dimensions with PCA before storing them; 0 keeps all
+VECTOR_PCA_DIM = int(os.getenv("VECTOR_PCA_DIM", "0"))
+
+# Retrieval Configuration
+# "hybrid" fuses FAISS similarity search with a BM25 index built at ingestion
+# time (reciprocal rank fusion); "vector" uses similarity search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each side before fusing them
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+HYBRID_RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Context Packing Configuration
+# Retrieved chunks are added to the prompt in relevance order until the token
+# budget is spent; chunks below the cosine relevance cutoff are dropped
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "8"))
+CONTEXT_MIN_RELEVANCE = float(os.getenv("CONTEXT_MIN_RELEVANCE", "0.25"))
+# tiktoken encoding used when the model is not known to tiktoken
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+# Batch Question Configuration
+# Maximum questions per /ask/batch request and LLM calls in flight per batch
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "16"))
+
+# Ingestion Worker Pool Configuration
+# "thread" or "process" (process also moves PDF extraction off the GIL)
+INGESTION_EXECUTOR = os.getenv("INGESTION_EXECUTOR", "thread")
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Uploads waiting for a worker before /upload returns 429
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "8"))
+# How long finished jobs stay visible at /jobs/{job_id}
+JOB_RETENTION_SECONDS = 3600
+
+# Admission Control Configuration
+# /ask and ingestion requests (/upload, /corpus/documents, document updates)
+# run in two lanes under a global cap; requests over a cap wait, fairly per
+# client, and get 429 with Retry-After when the queue is full or too slow
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "64"))
+ADMISSION_INGEST_MAX_CONCURRENT = int(os.getenv("ADMISSION_INGEST_MAX_CONCURRENT", "4"))
+# Freed slots given to questions for each one given to ingestion while both wait
+ADMISSION_QUERY_WEIGHT = int(os.getenv("ADMISSION_QUERY_WEIGHT", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+# Token buckets per client; 0 disables. Clients sending one of the comma-separated
+# API_KEYS in RATE_LIMIT_KEY_HEADER get their own bucket, others one per address
+RATE_LIMIT_KEY_HEADER = os.getenv("RATE_LIMIT_KEY_HEADER", "X-API-Key")
+API_KEYS = [key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()]
+RATE_LIMIT_QUERIES_PER_MINUTE = float(os.getenv("RATE_LIMIT_QUERIES_PER_MINUTE", "120"))
+RATE_LIMIT_QUERY_BURST = int(os.getenv("RATE_LIMIT_QUERY_BURST", "20"))
+RATE_LIMIT_UPLOADS_PER_MINUTE = float(os.getenv("RATE_LIMIT_UPLOADS_PER_MINUTE", "6"))
+RATE_LIMIT_UPLOAD_BURST = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "3"))
+
+# Ingestion Cache Configuration
+# Re-uploads of the same PDF reuse chunks and index instead of re-embedding
+INGESTION_CACHE_ENABLED = os.getenv("INGESTION_CACHE_ENABLED", "true").lower() == "true"
+INGESTION_CACHE_MAX_ENTRIES = int(os.getenv("INGESTION_CACHE_MAX_ENTRIES", "32"))
+INGESTION_CACHE_DIR = os.getenv("INGESTION_CACHE_DIR", ".cache/ingestion")
+INGESTION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("INGESTION_CACHE_DISK_MAX_ENTRIES", "256"))
+# Chunk vectors keyed by a hash of the chunk text, shared across documents,
+# so recurring boilerplate is embedded once per model
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")
+# Vectors kept per model before the oldest are dropped (~1.5 KB each at 384 dims)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# Index a chunk whose text repeats an earlier chunk of the same document only once
+CHUNK_DEDUP_ENABLED = os.getenv("CHUNK_DEDUP_ENABLED", "false").lower() == "true"
+
+# Session Persistence Configuration
+# Each session's index is saved here and loaded lazily after a restart
+INDEX_STORE_DIR = os.getenv("INDEX_STORE_DIR", ".cache/sessions")
+# Memory-map indexes on load where FAISS supports it for the index type
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() == "true"
+
+# Corpus Configuration
+# Shared index of many documents that sessions can query a subset of
+CORPUS_DIR = os.getenv("CORPUS_DIR", ".cache/corpus")
+# Changes to the corpus are saved at most this often; 0 saves after every change
+CORPUS_SAVE_INTERVAL_SECONDS = float(os.getenv("CORPUS_SAVE_INTERVAL_SECONDS", "30"))
+
+# Session Lifecycle Configuration
+# Idle sessions are deleted (memory and disk) after this long
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+# Beyond these limits the least recently used sessions are spilled to disk
+SESSION_MAX_LOADED = int(os.getenv("SESSION_MAX_LOADED", "50"))
+SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "1024"))
+SESSION_SWEEP_INTERVAL_SECONDS = 60
+# Chat history entries kept in memory per session; older ones are appended to
+# the session's history.jsonl (or dropped with SESSION_HISTORY_SPILL=false)
+SESSION_HISTORY_MAX_ENTRIES = int(os.getenv("SESSION_HISTORY_MAX_ENTRIES", "10"))
+SESSION_HISTORY_SPILL = os.getenv("SESSION_HISTORY_SPILL", "true").lower() == "true"
+
+# Multi-worker Configuration
+# "memory" keeps session records in this process; "sqlite" shares them between
+# workers through SESSION_DB_PATH, which (like INDEX_STORE_DIR) all workers must share
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", os.path.join(INDEX_STORE_DIR, "sessions.sqlite3"))
+# This worker's own base URL (e.g. http://10.0.0.5:8001) when workers run on
+# separate ports; questions are then forwarded to the worker with the session
+# already loaded instead of loading its index a second time
+WORKER_URL = os.getenv("WORKER_URL", "")
+# Shared by all workers; requests forwarded with it are not rate limited again
+# by the receiving worker. Without it, forwarded requests are limited as usual.
+WORKER_SECRET = os.getenv("WORKER_SECRET", "")
+
+# Metrics Configuration
+# Stage timings and counters are exported in the Prometheus format on /metrics;
+# optionally each response also carries its stage timings in a Server-Timing header
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
 
 # LLM Configuration
 TEMPERATURE = 0.7
 MAX_TOKENS = 1000
 
-# OpenRouter API Base URL
-OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
+# Semantic Answer Cache Configuration
+# Questions this similar (cosine) to an earlier one about the same document
+# are answered from the cache without calling the LLM
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_DOCUMENTS = 256
+ANSWER_CACHE_MAX_ENTRIES_PER_DOCUMENT = 128
+
+# LLM HTTP connection pool, shared by all sessions using the same model
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = 60.0
+LLM_TIMEOUT_SECONDS = 120.0
+
+# OpenRouter API Base URL (point at examples/fake_openai_server.py for local testing)
+OPENROUTER_API_BASE = os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
@@ -0,0 +1,120 @@
+"""Fake OpenAI-compatible chat completions server for local testing.
+
+Answers every request with a canned reply after a configurable delay, with or
+without streaming, so the API can be exercised without an OpenRouter key:
+
+    uvicorn examples.fake_openai_server:app --port 8001
+    OPENROUTER_API_BASE=http://localhost:8001/v1 OPENROUTER_API_KEY=test python api.py
+
+Environment variables:
+    FAKE_LLM_LATENCY_MS: Delay before the first token (default 50)
+    FAKE_LLM_TOKEN_DELAY_MS: Delay between streamed tokens (default 5)
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+LATENCY_SECONDS = int(os.getenv("FAKE_LLM_LATENCY_MS", "50")) / 1000
+TOKEN_DELAY_SECONDS = int(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", "5")) / 1000
+
+app = FastAPI(title="Fake OpenAI-compatible server")
+
+# Totals so load tests can check how many calls reached the "LLM"
+stats = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def fake_answer(messages):
+    """Build a deterministic answer that mentions the start of the question."""
+    prompt = messages[-1]["content"] if messages else ""
+    question = prompt.rsplit("Question:", 1)[-1].split("\n", 1)[0].strip()
+    return f"This is a fake answer to: {question[:80]}"
+
+
+def count_tokens(text):
+    """Rough whitespace token count, good enough for a fake usage block."""
+    return len(text.split())
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "fake-model", "object": "model"}]}
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "fake-model")
+    answer = fake_answer(messages)
+    prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+    completion_tokens = count_tokens(answer)
+    
+    stats["requests"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    await asyncio.sleep(LATENCY_SECONDS)
+    
+    if not body.get("stream"):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+    
+    async def stream():
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if i == 0 else f" {word}"},
+                    "finish_reason": None,
+                }],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(TOKEN_DELAY_SECONDS)
+        final = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("FAKE_LLM_PORT", "8001")))
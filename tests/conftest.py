@@ -0,0 +1,111 @@
+"""Shared fixtures for the API tests.
+
+The API is exercised in-process with FastAPI's TestClient against the fake
+OpenAI-compatible server (examples.fake_openai_server) on a local port.
+Embeddings come from a deterministic hashing model registered in place of
+the HuggingFace one, so the tests need neither an API key nor a model
+download. Every cache and store directory points at a temporary directory.
+"""
+
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import time
+
+# Must be set before config is imported
+_work_dir = tempfile.mkdtemp(prefix="pdf-chat-tests-")
+os.environ.update({
+    "OPENROUTER_API_KEY": "test",
+    "EMBEDDING_WARMUP": "false",
+    "INGESTION_CACHE_DIR": os.path.join(_work_dir, "ingestion"),
+    "EMBEDDING_CACHE_DIR": os.path.join(_work_dir, "embeddings"),
+    "INDEX_STORE_DIR": os.path.join(_work_dir, "sessions"),
+    "CORPUS_DIR": os.path.join(_work_dir, "corpus"),
+    "RATE_LIMIT_UPLOADS_PER_MINUTE": "0",
+    "RATE_LIMIT_QUERIES_PER_MINUTE": "0",
+})
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+import config
+from benchmarks.synthetic_pdf import make_document, render_pdf
+from utils import embeddings as shared_embeddings
+
+EMBEDDING_DIM = 64
+
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words vectors hashed into EMBEDDING_DIM buckets, L2-normalised."""
+
+    def _embed(self, text):
+        vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % EMBEDDING_DIM] += 1
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def fake_embeddings():
+    """Register the hashing model as the configured embedding model."""
+    key = (config.EMBEDDING_MODEL, config.EMBEDDING_BACKEND)
+    shared_embeddings._models[key] = shared_embeddings.SharedEmbeddings(config.EMBEDDING_MODEL, HashingEmbeddings())
+    yield
+    shared_embeddings._models.pop(key, None)
+
+
+@pytest.fixture(scope="session")
+def fake_llm():
+    """Run the fake OpenAI-compatible server and point the API at it."""
+    import uvicorn
+    from examples import fake_openai_server
+    
+    fake_openai_server.LATENCY_SECONDS = 0
+    fake_openai_server.TOKEN_DELAY_SECONDS = 0
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        fake_openai_server.app, host="127.0.0.1", port=port, log_level="warning"
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    config.OPENROUTER_API_BASE = f"http://127.0.0.1:{port}/v1"
+    yield fake_openai_server
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture(scope="session")
+def client(fake_llm):
+    """TestClient of the API, with startup and shutdown events run."""
+    from fastapi.testclient import TestClient
+    import api
+    
+    with TestClient(api.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def make_pdf():
+    """Render a synthetic manual; returns (pdf bytes, page texts)."""
+    def make(num_pages=4, words_per_page=200, seed=0):
+        pages, _ = make_document(num_pages, words_per_page, seed)
+        return render_pdf(pages), pages
+    return make
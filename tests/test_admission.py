@@ -0,0 +1,116 @@
+"""Admission control: per-client rate limits and trusted worker forwarding."""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.admission import AdmissionMiddleware, AdmissionRejected, AdmissionScheduler, Lane, RateLimiter
+
+
+@pytest.fixture
+def limited_client():
+    """App whose POST /work allows each client a burst of 2 and no refill to speak of."""
+    app = FastAPI()
+
+    @app.post("/work")
+    async def work():
+        return {"ok": True}
+
+    scheduler = AdmissionScheduler(
+        lanes=[Lane("ingest", max_concurrent=4, limiter=RateLimiter(per_minute=0.001, burst=2))],
+        max_concurrent=4,
+        max_queue=8,
+        max_wait_seconds=1
+    )
+    app.add_middleware(
+        AdmissionMiddleware,
+        scheduler=scheduler,
+        routes=[("POST", r"/work", "ingest")],
+        key_header="X-API-Key",
+        api_keys=["alpha", "beta"],
+        forwarded_header="X-Forwarded-By-Worker",
+        secret_header="X-Worker-Secret",
+        worker_secret="s3cret"
+    )
+    return TestClient(app)
+
+
+def statuses(client, count, headers=None):
+    return [client.post("/work", headers=headers or {}).status_code for _ in range(count)]
+
+
+def test_rejects_over_burst_with_retry_after(limited_client):
+    assert statuses(limited_client, 2) == [200, 200]
+
+    response = limited_client.post("/work")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+
+def test_known_api_keys_get_their_own_buckets(limited_client):
+    assert statuses(limited_client, 3, {"X-API-Key": "alpha"}) == [200, 200, 429]
+    assert statuses(limited_client, 2, {"X-API-Key": "beta"}) == [200, 200]
+
+
+def test_unknown_api_keys_share_the_address_bucket(limited_client):
+    codes = [limited_client.post("/work", headers={"X-API-Key": f"random-{i}"}).status_code for i in range(4)]
+
+    assert codes == [200, 200, 429, 429]
+
+
+def test_forwarded_header_without_secret_is_rate_limited(limited_client):
+    headers = {"X-Forwarded-By-Worker": "worker-1"}
+
+    assert statuses(limited_client, 4, headers) == [200, 200, 429, 429]
+
+    wrong_secret = {**headers, "X-Worker-Secret": "guess"}
+    assert statuses(limited_client, 1, wrong_secret) == [429]
+
+
+def test_forwarded_header_with_secret_skips_rate_limit(limited_client):
+    headers = {"X-Forwarded-By-Worker": "worker-1", "X-Worker-Secret": "s3cret"}
+
+    assert statuses(limited_client, 5, headers) == [200] * 5
+
+
+def test_queue_full_rejection_keeps_the_clients_tokens():
+    limiter = RateLimiter(per_minute=0.001, burst=3)
+    scheduler = AdmissionScheduler(
+        lanes=[Lane("ingest", max_concurrent=1, limiter=limiter)],
+        max_concurrent=1,
+        max_queue=0,
+        max_wait_seconds=1
+    )
+
+    async def run():
+        async with scheduler.slot("ingest", "addr:a"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with scheduler.slot("ingest", "addr:b"):
+                    pass
+            return rejected.value.reason
+
+    assert asyncio.run(run()) == "queue_full"
+    assert limiter._buckets["addr:a"][0] == pytest.approx(2, abs=0.01)
+    assert "addr:b" not in limiter._buckets
+
+
+def test_timed_out_request_gets_its_token_back():
+    limiter = RateLimiter(per_minute=0.001, burst=3)
+    scheduler = AdmissionScheduler(
+        lanes=[Lane("ingest", max_concurrent=1, limiter=limiter)],
+        max_concurrent=1,
+        max_queue=4,
+        max_wait_seconds=0.05
+    )
+
+    async def run():
+        async with scheduler.slot("ingest", "addr:a"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with scheduler.slot("ingest", "addr:b"):
+                    pass
+            return rejected.value.reason
+
+    assert asyncio.run(run()) == "timeout"
+    assert limiter._buckets["addr:b"][0] == pytest.approx(3, abs=0.01)
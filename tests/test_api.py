@@ -0,0 +1,117 @@
+"""API tests for upload and question answering against the fake LLM server."""
+
+import json
+import time
+
+import pytest
+
+
+def parse_sse(body):
+    """Split a Server-Sent Events body into (event, data) tuples."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields.get("event"), json.loads(fields.get("data", "null"))))
+    return events
+
+
+@pytest.fixture(scope="module")
+def session_id(client):
+    from benchmarks.synthetic_pdf import make_document, render_pdf
+
+    pages, _ = make_document(4, 200, seed=1)
+    response = client.post("/upload", files={"file": ("manual.pdf", render_pdf(pages), "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json()["session_id"]
+
+
+def test_upload_creates_session(client, make_pdf):
+    pdf_bytes, _ = make_pdf(num_pages=3, seed=2)
+    response = client.post("/upload", files={"file": ("upload.pdf", pdf_bytes, "application/pdf")})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["pdf_name"] == "upload.pdf"
+    assert body["num_chunks"] > 0
+
+    details = client.get(f"/sessions/{body['session_id']}")
+    assert details.status_code == 200
+    assert details.json()["pdf_name"] == "upload.pdf"
+
+
+def test_upload_async_reports_job_progress(client, make_pdf):
+    pdf_bytes, pages = make_pdf(num_pages=3, seed=3)
+    response = client.post("/upload?async=true", files={"file": ("async.pdf", pdf_bytes, "application/pdf")})
+
+    assert response.status_code == 200, response.text
+    job_id = response.json()["job_id"]
+    for _ in range(500):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.02)
+    assert job["status"] == "completed", job
+    assert job["progress"]["pages_extracted"] == job["progress"]["pages_total"] == len(pages)
+
+
+def test_upload_rejects_non_pdf(client):
+    response = client.post("/upload", files={"file": ("notes.txt", b"plain text", "text/plain")})
+
+    assert response.status_code == 400
+
+
+def test_ask_answers_with_the_llm(client, session_id):
+    response = client.post("/ask", json={"question": "How is the pump calibrated?", "session_id": session_id})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["session_id"] == session_id
+    assert body["answer"] == "This is a fake answer to: How is the pump calibrated?"
+
+
+def test_ask_unknown_session(client):
+    response = client.post("/ask", json={"question": "Anything?", "session_id": "missing"})
+
+    assert response.status_code == 404
+
+
+def test_ask_batch_answers_in_order(client, session_id):
+    questions = ["What does the relay do?", "When is the filter replaced?", "Which valve is checked weekly?"]
+    response = client.post("/ask/batch", json={"questions": questions, "session_id": session_id})
+
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    for question, result in zip(questions, results):
+        assert result["error"] is None
+        assert result["question"] == question
+        assert result["answer"] == f"This is a fake answer to: {question}"
+
+
+def test_ask_stream_sends_tokens_then_done(client, session_id):
+    question = "How is the sensor installed?"
+    response = client.post("/ask/stream", json={"question": question, "session_id": session_id})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    names = [event for event, _ in events]
+    assert "error" not in names
+    assert names[-1] == "done"
+    answer = "".join(data for event, data in events if event == "token")
+    assert answer == f"This is a fake answer to: {question}"
+
+
+def test_ask_embeds_the_question_once(client, session_id, monkeypatch):
+    from utils.embeddings import get_embeddings
+
+    model = get_embeddings()._model
+    calls = []
+    embed_query = model.embed_query
+    monkeypatch.setattr(model, "embed_query", lambda text: calls.append(text) or embed_query(text))
+    question = "Which gasket is replaced after draining?"
+    response = client.post("/ask", json={"question": question, "session_id": session_id})
+
+    assert response.status_code == 200, response.text
+    assert response.json()["cached"] is False
+    assert calls == [question]
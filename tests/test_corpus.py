@@ -0,0 +1,87 @@
+"""Deleting documents from the shared corpus."""
+
+import pytest
+
+import config
+from benchmarks.synthetic_pdf import make_document
+from utils import corpus as corpus_module
+from utils.corpus import CorpusIndex
+from utils.pdf_processor import iter_page_chunks
+from utils.vector_index import search_batch
+
+
+def add_manual(corpus, seed):
+    pages, _ = make_document(6, 200, seed=seed)
+    doc_id, _ = corpus.add_document(f"manual-{seed}.pdf", f"hash-{seed}", iter_page_chunks(enumerate(pages, start=1)))
+    return doc_id
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_INDEX_MIN_VECTORS", 30)
+    return CorpusIndex(str(tmp_path))
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_delete_document_keeps_other_documents_searchable(corpus, monkeypatch, index_type):
+    monkeypatch.setattr(config, "VECTOR_INDEX_TYPE", index_type)
+    doc_ids = [add_manual(corpus, seed) for seed in range(3)]
+
+    assert corpus.delete_document(doc_ids[1])
+
+    assert [document["doc_id"] for document in corpus.list_documents()] == [doc_ids[0], doc_ids[2]]
+    store = corpus.vector_store
+    assert store.index.ntotal == len(store.index_to_docstore_id)
+    docs = [store.docstore.search(chunk_id) for chunk_id in store.index_to_docstore_id.values()]
+    assert all(doc.metadata["doc_id"] != doc_ids[1] for doc in docs)
+    # Each chunk's own vector still finds it
+    vectors = store.embedding_function.embed_documents([doc.page_content for doc in docs])
+    for doc, results in zip(docs, search_batch(store, vectors, 1)):
+        assert results[0][0].page_content == doc.page_content
+
+
+def test_failed_delete_keeps_document_registered(corpus, monkeypatch):
+    doc_id = add_manual(corpus, 0)
+
+    def fail(vector_store, ids):
+        raise RuntimeError("removal failed")
+
+    monkeypatch.setattr(corpus_module, "remove_vectors", fail)
+    with pytest.raises(RuntimeError):
+        corpus.delete_document(doc_id)
+    assert [document["doc_id"] for document in corpus.list_documents()] == [doc_id]
+
+    monkeypatch.undo()
+    assert corpus.delete_document(doc_id)
+    assert corpus.list_documents() == []
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_search_is_restricted_to_selected_documents(corpus, monkeypatch, index_type):
+    monkeypatch.setattr(config, "VECTOR_INDEX_TYPE", index_type)
+    monkeypatch.setattr(config, "RETRIEVAL_MODE", "vector")
+    doc_ids = [add_manual(corpus, seed) for seed in range(4)]
+    assert corpus.delete_document(doc_ids[0])
+
+    for doc_id in doc_ids[1:]:
+        chunk_id = corpus.documents[doc_id]["chunk_ids"][3]
+        text = corpus.vector_store.docstore.search(chunk_id).page_content
+        found = corpus.search(text, [doc_id], 4)
+        assert len(found) == 4
+        assert {doc.metadata["doc_id"] for doc in found} == {doc_id}
+        assert found[0].page_content == text
+    assert corpus.search("anything", [doc_ids[0]], 4) == []
+
+
+def test_changes_are_saved_on_flush(corpus, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "CORPUS_SAVE_INTERVAL_SECONDS", 30)
+    doc_id = add_manual(corpus, 0)
+    assert not (tmp_path / CorpusIndex.REGISTRY_FILE).exists()
+
+    assert corpus.flush()
+    assert not corpus.flush()
+    reloaded = CorpusIndex(str(tmp_path))
+    reloaded.load()
+    assert [document["doc_id"] for document in reloaded.list_documents()] == [doc_id]
+    text = reloaded.vector_store.docstore.search(f"{doc_id}:0").page_content
+    assert reloaded.search(text, [doc_id], 1)[0].metadata["doc_id"] == doc_id
@@ -0,0 +1,19 @@
+"""Embedding backend checks."""
+
+import pytest
+
+from utils import onnx_embeddings
+from utils.embeddings import check_backend
+
+
+def test_check_backend_reports_missing_onnx_packages(monkeypatch):
+    monkeypatch.setattr(onnx_embeddings, "RUNTIME_PACKAGES", ("tokenizers_missing_for_test",))
+
+    with pytest.raises(ImportError, match="requirements-onnx.txt"):
+        check_backend("onnx")
+    check_backend("torch")
+
+
+def test_check_backend_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        check_backend("tensorrt")
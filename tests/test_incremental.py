@@ -0,0 +1,48 @@
+"""Incremental document updates on every vector index type."""
+
+import pytest
+
+import config
+from benchmarks.synthetic_pdf import make_document
+from utils.incremental import hash_pages, update_vector_store
+from utils.pdf_processor import iter_page_chunks, stream_vector_store
+from utils.vector_index import describe_index, search_batch
+
+
+def build_store(pages):
+    hashes = []
+    numbered = hash_pages(enumerate(pages, start=1), hashes)
+    vector_store, _ = stream_vector_store(iter_page_chunks(numbered))
+    return vector_store, hashes
+
+
+def misplaced_chunks(vector_store):
+    """Chunks whose own text does not find them as the nearest neighbour."""
+    docs = [vector_store.docstore.search(chunk_id) for chunk_id in vector_store.index_to_docstore_id.values()]
+    vectors = vector_store.embedding_function.embed_documents([doc.page_content for doc in docs])
+    results = search_batch(vector_store, vectors, 1)
+    return sum(1 for doc, found in zip(docs, results) if found[0][0].page_content != doc.page_content)
+
+
+@pytest.mark.parametrize("index_type, base_type", [
+    ("flat", "IndexFlatL2"),
+    ("ivf_flat", "IndexIVFFlat"),
+    ("hnsw", "IndexHNSWFlat"),
+])
+def test_update_keeps_chunks_mapped_to_their_vectors(monkeypatch, index_type, base_type):
+    monkeypatch.setattr(config, "VECTOR_INDEX_TYPE", index_type)
+    monkeypatch.setattr(config, "VECTOR_INDEX_MIN_VECTORS", 50)
+    pages, _ = make_document(30, 200, seed=4)
+    vector_store, hashes = build_store(pages)
+    assert describe_index(vector_store.index)["type"] == base_type
+
+    edited = list(pages)
+    edited[10] = make_document(1, 200, seed=5)[0][0]
+    new_hashes, stats = update_vector_store(vector_store, hashes, list(enumerate(edited, start=1)))
+
+    assert stats["pages_changed"] == 1
+    assert stats["chunks_removed"] > 0 and stats["chunks_added"] > 0
+    assert new_hashes != hashes
+    assert vector_store.index.ntotal == len(vector_store.index_to_docstore_id) == stats["chunks"]
+    assert describe_index(vector_store.index)["type"] == base_type
+    assert misplaced_chunks(vector_store) == 0
@@ -0,0 +1,53 @@
+"""Saving session indexes while earlier versions are still loaded."""
+
+import threading
+import time
+
+import config
+from benchmarks.synthetic_pdf import make_document
+from tests.test_incremental import build_store, misplaced_chunks
+from utils.incremental import update_vector_store
+from utils.index_store import IndexStore
+
+
+def test_save_keeps_mapped_versions_searchable(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "VECTOR_INDEX_TYPE", "ivf_flat")
+    monkeypatch.setattr(config, "VECTOR_INDEX_MIN_VECTORS", 50)
+    store = IndexStore(str(tmp_path))
+    pages, _ = make_document(30, 200, seed=4)
+    vector_store, hashes = build_store(pages)
+    store.save("s1", vector_store, {"session_id": "s1"}, hashes)
+    mapped = store.load_vector_store("s1", mmap=True)
+
+    edited = list(pages)
+    edited[10] = make_document(1, 200, seed=5)[0][0]
+    updated = store.load_vector_store("s1", mmap=False)
+    update_vector_store(updated, hashes, list(enumerate(edited, start=1)))
+    store.save("s1", updated, {"session_id": "s1"})
+
+    assert misplaced_chunks(mapped) == 0
+    reloaded = store.load_vector_store("s1", mmap=True)
+    assert reloaded.index.ntotal == updated.index.ntotal
+    assert misplaced_chunks(reloaded) == 0
+    assert len([name for name in (tmp_path / "s1").iterdir() if name.name.startswith("index-")]) == 1
+
+
+def test_update_lock_serialises_updates(tmp_path):
+    store = IndexStore(str(tmp_path))
+    active = []
+    overlaps = []
+
+    def update():
+        with store.update_lock("s1"):
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.05)
+            active.pop()
+
+    threads = [threading.Thread(target=update) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == [1, 1, 1]
@@ -0,0 +1,103 @@
+"""Building, removing vectors from and retraining every vector index type."""
+
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+
+import config
+from utils.embeddings import get_embeddings
+from utils.vector_index import (
+    _base_index, build_index, describe_index, maybe_upgrade_index, pq_subquantizers, remove_vectors
+)
+
+
+def grow_store(vectors, batch_size=100):
+    """Add vectors batch by batch, upgrading the index as ingestion does."""
+    pairs = [(f"chunk {i}", vector) for i, vector in enumerate(vectors)]
+    vector_store = FAISS.from_embeddings(pairs[:batch_size], get_embeddings())
+    for start in range(batch_size, len(pairs), batch_size):
+        vector_store.add_embeddings(pairs[start:start + batch_size])
+        maybe_upgrade_index(vector_store)
+    return vector_store
+
+
+def nearest_texts(vector_store, vectors):
+    _, positions = vector_store.index.search(np.asarray(vectors, dtype=np.float32), 1)
+    return [vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content for i in positions[:, 0]]
+
+
+@pytest.fixture
+def index_settings(monkeypatch):
+    def apply(index_type, storage="float32", pca_dim=0):
+        monkeypatch.setattr(config, "VECTOR_INDEX_TYPE", index_type)
+        monkeypatch.setattr(config, "VECTOR_STORAGE", storage)
+        monkeypatch.setattr(config, "VECTOR_PCA_DIM", pca_dim)
+        monkeypatch.setattr(config, "VECTOR_INDEX_MIN_VECTORS", 300)
+        monkeypatch.setattr(config, "VECTOR_INDEX_NPROBE", 1024)
+        monkeypatch.setattr(config, "VECTOR_INDEX_PQ_M", 8)
+    return apply
+
+
+@pytest.mark.parametrize("index_type, storage, pca_dim", [
+    ("flat", "int8", 0),
+    ("ivf_flat", "float32", 0),
+    ("ivf_flat", "float16", 16),
+    ("hnsw", "float32", 0),
+    ("hnsw", "int8", 16),
+])
+def test_remove_vectors_keeps_mapping(index_settings, index_type, storage, pca_dim):
+    index_settings(index_type, storage, pca_dim)
+    rng = np.random.default_rng(0)
+    vectors = rng.random((1200, 64), dtype=np.float32)
+    vector_store = grow_store(vectors)
+    kind = describe_index(vector_store.index)["type"]
+
+    ids = list(vector_store.index_to_docstore_id.values())
+    removed = set(rng.choice(len(vectors), 200, replace=False).tolist())
+    remove_vectors(vector_store, [ids[i] for i in removed])
+    added = rng.random((50, 64), dtype=np.float32)
+    vector_store.add_embeddings([(f"added {i}", vector) for i, vector in enumerate(added)])
+
+    kept = [i for i in range(len(vectors)) if i not in removed]
+    assert vector_store.index.ntotal == len(vector_store.index_to_docstore_id) == len(kept) + len(added)
+    assert describe_index(vector_store.index)["type"] == kind
+    assert nearest_texts(vector_store, vectors[kept]) == [f"chunk {i}" for i in kept]
+    assert nearest_texts(vector_store, added) == [f"added {i}" for i in range(len(added))]
+
+
+def test_remove_vectors_rejects_unknown_ids(index_settings):
+    index_settings("flat")
+    vector_store = grow_store(np.random.default_rng(1).random((10, 8), dtype=np.float32))
+
+    with pytest.raises(ValueError):
+        remove_vectors(vector_store, ["missing"])
+    assert vector_store.index.ntotal == 10
+
+
+def test_ivf_index_is_retrained_as_the_store_grows(index_settings, monkeypatch):
+    index_settings("ivf_flat")
+    monkeypatch.setattr(config, "VECTOR_INDEX_RETRAIN_GROWTH", 2)
+    vectors = np.random.default_rng(2).random((2400, 32), dtype=np.float32)
+
+    small = grow_store(vectors[:400])
+    large = grow_store(vectors)
+
+    # Trained at VECTOR_INDEX_MIN_VECTORS, with one list per 39 vectors
+    assert _base_index(small.index).nlist == 300 // 39
+    assert _base_index(large.index).nlist >= 2 * (300 // 39)
+    assert nearest_texts(large, vectors[:100]) == [f"chunk {i}" for i in range(100)]
+
+
+@pytest.mark.parametrize("dim, m, expected", [(384, 48, 48), (128, 48, 32), (100, 48, 25), (7, 48, 7), (16, 0, 1)])
+def test_pq_subquantizers_divide_the_dimension(dim, m, expected):
+    assert pq_subquantizers(dim, m) == expected
+
+
+def test_ivf_pq_builds_with_pca_dimension_not_a_multiple_of_m(monkeypatch):
+    monkeypatch.setattr(config, "VECTOR_INDEX_PQ_M", 48)
+    vectors = np.random.default_rng(0).normal(size=(2000, 384)).astype(np.float32)
+
+    index = build_index(vectors, "ivf_pq", pca_dim=128)
+
+    assert _base_index(index).pq.M == 32
+    assert index.ntotal == len(vectors)
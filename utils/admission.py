@@ -0,0 +1,371 @@
+"""Admission control for expensive endpoints.
+
+Requests are sorted into lanes (cheap questions and heavy ingestion) and
+pass three checks before they run:
+
+1. A per-client token bucket for their lane. Clients sending one of the
+   configured API keys are identified by it, all others by their address.
+2. A global cap on admitted requests, and a cap per lane, so ingestion
+   never holds every slot. Requests over a cap wait in their lane's queue.
+3. A bounded queue and wait time; beyond either the request is turned away.
+   Requests turned away because the queue is full, or that time out or are
+   cancelled while waiting, don't count against the client's rate.
+
+Rejected requests get 429 with a Retry-After header. When a slot frees up,
+lanes are served in proportion to their weights (stride scheduling), and
+clients within a lane in round robin, so one client queueing many requests
+does not delay everyone else's. Limits are kept per worker process.
+"""
+
+import asyncio
+import hmac
+import json
+import math
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from utils.metrics import REGISTRY, Histogram, span
+
+# Idle buckets are pruned once this many clients have been seen
+_MAX_BUCKETS = 10000
+
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "pdf_chat_admission_wait_seconds",
+    "Time requests waited for an admission slot, by lane",
+    ("lane",)
+))
+
+
+class AdmissionRejected(Exception):
+    """
+    A request was turned away by admission control.
+    
+    Args:
+        reason (str): "rate_limited", "queue_full" or "timeout"
+        retry_after (int): Seconds the client should wait before retrying
+    """
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Too many requests ({reason.replace('_', ' ')}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Token buckets, one per client.
+    
+    Args:
+        per_minute (float): Tokens added per minute; 0 disables the limit
+        burst (int): Bucket size, the requests a client can make at once
+    """
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        self._buckets = {}
+
+    def acquire(self, client, cost=1.0, now=None):
+        """
+        Take tokens from a client's bucket.
+        
+        Returns:
+            float: 0 if the tokens were taken, otherwise seconds until the
+                bucket holds enough of them
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        if len(self._buckets) >= _MAX_BUCKETS and client not in self._buckets:
+            self._prune(now)
+        tokens, updated = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < cost:
+            self._buckets[client] = (tokens, now)
+            return (cost - tokens) / self.rate
+        self._buckets[client] = (tokens - cost, now)
+        return 0.0
+
+    def refund(self, client, cost=1.0):
+        """Return tokens taken by acquire for a request that did not run."""
+        if self.rate <= 0 or client not in self._buckets:
+            return
+        tokens, updated = self._buckets[client]
+        self._buckets[client] = (min(self.burst, tokens + cost), updated)
+
+    def _prune(self, now):
+        # A bucket that has refilled is the same as no bucket
+        self._buckets = {
+            client: (tokens, updated) for client, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate < self.burst
+        }
+
+
+class Lane:
+    """
+    Queue of one class of requests.
+    
+    Args:
+        name (str): Lane name, used in metrics
+        max_concurrent (int): Admitted requests of this lane at once
+        weight (int): Share of freed slots given to this lane while others wait
+        limiter (RateLimiter): Per-client limits, or None
+    """
+
+    def __init__(self, name, max_concurrent, weight=1, limiter=None):
+        self.name = name
+        self.max_concurrent = max(max_concurrent, 1)
+        self.weight = max(weight, 1)
+        self.limiter = limiter
+        self.running = 0
+        self.waiters = OrderedDict()  # client -> deque of futures, served in round robin
+        self.waiting = 0
+        self.pass_value = 0.0
+        self.hold_seconds = 1.0  # Moving average, for Retry-After estimates
+        self.admitted = 0
+        self.rejected = {"rate_limited": 0, "queue_full": 0, "timeout": 0}
+
+
+class AdmissionScheduler:
+    """
+    Global concurrency cap shared by weighted lanes with per-client fairness.
+    
+    Must be used from a single event loop.
+    
+    Args:
+        lanes (list): Lane objects
+        max_concurrent (int): Admitted requests at once across all lanes
+        max_queue (int): Requests waiting per lane before new ones are rejected
+        max_wait_seconds (float): Longest wait for a slot before rejection
+    """
+
+    def __init__(self, lanes, max_concurrent, max_queue, max_wait_seconds):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.running = 0
+
+    @asynccontextmanager
+    async def slot(self, lane_name, client, rate_limited=True):
+        """
+        Hold an admission slot in a lane for the enclosed block.
+        
+        Args:
+            lane_name (str): Lane of the request
+            client (str): Client identity for rate limiting and fairness
+            rate_limited (bool): Apply the lane's per-client rate limit
+        
+        Raises:
+            AdmissionRejected: If the client is over its rate, the lane's
+                queue is full or no slot freed up in time
+        """
+        lane = self.lanes[lane_name]
+        await self._acquire(lane, client, rate_limited)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            lane.hold_seconds += 0.1 * (time.perf_counter() - start - lane.hold_seconds)
+            self._release(lane)
+
+    async def _acquire(self, lane, client, rate_limited):
+        admit_now = not lane.waiting and self._has_room(lane)
+        # Checked first, so requests turned away here don't use up the client's rate
+        if not admit_now and lane.waiting >= self.max_queue:
+            self._reject(lane, "queue_full", self._estimated_wait(lane))
+        limiter = lane.limiter if rate_limited else None
+        if limiter is not None:
+            retry_after = limiter.acquire(client)
+            if retry_after > 0:
+                self._reject(lane, "rate_limited", retry_after)
+        
+        if admit_now:
+            self._admit(lane)
+            QUEUE_WAIT_SECONDS.observe(0.0, lane=lane.name)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        lane.waiters.setdefault(client, deque()).append(future)
+        lane.waiting += 1
+        start = time.perf_counter()
+        try:
+            with span("queue"):
+                await asyncio.wait_for(asyncio.shield(future), self.max_wait_seconds)
+        except asyncio.TimeoutError:
+            # Unless admitted just as the wait ended
+            if not future.done():
+                future.cancel()
+                self._remove_waiter(lane, client, future)
+                if limiter is not None:
+                    limiter.refund(client)
+                QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, lane=lane.name)
+                self._reject(lane, "timeout", self._estimated_wait(lane))
+        except asyncio.CancelledError:
+            # The client went away; hand the slot on if it was already given
+            if future.done():
+                self._release(lane)
+            else:
+                future.cancel()
+                self._remove_waiter(lane, client, future)
+                if limiter is not None:
+                    limiter.refund(client)
+            raise
+        QUEUE_WAIT_SECONDS.observe(time.perf_counter() - start, lane=lane.name)
+
+    def _has_room(self, lane):
+        return self.running < self.max_concurrent and lane.running < lane.max_concurrent
+
+    def _admit(self, lane):
+        self.running += 1
+        lane.running += 1
+        lane.admitted += 1
+        lane.pass_value += 1 / lane.weight
+
+    def _reject(self, lane, reason, retry_after):
+        lane.rejected[reason] += 1
+        raise AdmissionRejected(reason, max(1, math.ceil(retry_after)))
+
+    def _estimated_wait(self, lane):
+        """Seconds until the lane's current queue is likely to drain."""
+        return lane.hold_seconds * (lane.waiting + 1) / min(lane.max_concurrent, self.max_concurrent)
+
+    def _remove_waiter(self, lane, client, future):
+        queue = lane.waiters.get(client)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        lane.waiting -= 1
+        if not queue:
+            del lane.waiters[client]
+
+    def _release(self, lane):
+        self.running -= 1
+        lane.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests."""
+        while self.running < self.max_concurrent:
+            ready = [lane for lane in self.lanes.values() if lane.waiting and lane.running < lane.max_concurrent]
+            if not ready:
+                return
+            # Lowest pass first; a lane that was idle doesn't get to catch up
+            lane = min(ready, key=lambda lane: lane.pass_value)
+            floor = min(other.pass_value for other in ready)
+            for other in self.lanes.values():
+                if not other.waiting:
+                    other.pass_value = max(other.pass_value, floor)
+            
+            client, queue = next(iter(lane.waiters.items()))
+            future = queue.popleft()
+            lane.waiting -= 1
+            if queue:
+                lane.waiters.move_to_end(client)
+            else:
+                del lane.waiters[client]
+            self._admit(lane)
+            future.set_result(True)
+
+    def stats(self):
+        """Report running and waiting requests and rejections per lane."""
+        return {
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "lanes": {
+                lane.name: {
+                    "running": lane.running,
+                    "max_concurrent": lane.max_concurrent,
+                    "waiting": lane.waiting,
+                    "admitted": lane.admitted,
+                    "rejected": dict(lane.rejected),
+                }
+                for lane in self.lanes.values()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware putting matching requests through an AdmissionScheduler.
+    
+    The slot is held until the response, including a streamed body, is sent.
+    
+    Args:
+        app: ASGI application
+        scheduler (AdmissionScheduler): Scheduler to admit requests through
+        routes (list): (method, path regex, lane name) tuples
+        key_header (str): Header carrying the client's API key, e.g. X-API-Key
+        api_keys: Known API keys; requests with any other key are limited by address
+        forwarded_header (str): Header set on requests forwarded by another
+            worker, which already rate limited them; they still need a slot
+        secret_header (str): Header carrying the workers' shared secret
+        worker_secret (str): Shared secret proving a request came from another
+            worker; without one, forwarded requests are limited like any other
+    """
+
+    def __init__(
+        self, app, scheduler, routes, key_header, api_keys=(),
+        forwarded_header=None, secret_header=None, worker_secret=""
+    ):
+        self.app = app
+        self.scheduler = scheduler
+        self.routes = [(method, re.compile(pattern), lane) for method, pattern, lane in routes]
+        self.key_header = key_header.lower().encode("latin-1")
+        self.api_keys = {key.encode("latin-1") for key in api_keys}
+        self.forwarded_header = forwarded_header.lower().encode("latin-1") if forwarded_header else None
+        self.secret_header = secret_header.lower().encode("latin-1") if secret_header else None
+        self.worker_secret = worker_secret.encode("latin-1")
+
+    def _lane(self, scope):
+        for method, pattern, lane in self.routes:
+            if scope["method"] == method and pattern.fullmatch(scope["path"]):
+                return lane
+        return None
+
+    def _from_worker(self, headers):
+        if self.forwarded_header is None or not headers.get(self.forwarded_header):
+            return False
+        if not self.worker_secret or self.secret_header is None:
+            return False
+        return hmac.compare_digest(headers.get(self.secret_header, b""), self.worker_secret)
+
+    def _client(self, scope, headers):
+        if self._from_worker(headers):
+            return "worker:" + headers[self.forwarded_header].decode("latin-1"), False
+        # Unknown keys would each get a fresh bucket, so they don't identify a client
+        key = headers.get(self.key_header)
+        if key in self.api_keys:
+            return "key:" + key.decode("latin-1"), True
+        client = scope.get("client")
+        return "addr:" + (client[0] if client else "unknown"), True
+
+    async def __call__(self, scope, receive, send):
+        lane = self._lane(scope) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        client, rate_limited = self._client(scope, dict(scope.get("headers", [])))
+        
+        try:
+            slot = self.scheduler.slot(lane, client, rate_limited)
+            await slot.__aenter__()
+        except AdmissionRejected as e:
+            body = json.dumps({"detail": str(e)}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"retry-after", str(e.retry_after).encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await slot.__aexit__(None, None, None)
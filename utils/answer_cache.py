@@ -0,0 +1,152 @@
+"""Semantic cache of answers to previous questions about the same document.
+
+Questions are embedded with the shared embedding model; a new question whose
+cosine similarity to a cached one clears the threshold gets the cached answer
+without calling the LLM.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class _DocumentAnswers:
+    """Cached questions for one document, with vectors stacked for one matmul."""
+
+    def __init__(self, dim):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.entries = []  # dicts aligned with rows of self.vectors
+
+    def remove(self, rows):
+        rows = set(rows)
+        keep = [i for i in range(len(self.entries)) if i not in rows]
+        self.vectors = self.vectors[keep]
+        self.entries = [self.entries[i] for i in keep]
+
+
+class SemanticAnswerCache:
+    """
+    Per-document answer cache with TTL and LRU eviction.
+    
+    Args:
+        threshold (float): Minimum cosine similarity for a hit
+        ttl_seconds (int): Age after which an answer is no longer served
+        max_documents (int): Documents kept, least recently used evicted first
+        max_entries_per_document (int): Answers kept per document, LRU evicted
+    """
+
+    def __init__(self, threshold, ttl_seconds, max_documents, max_entries_per_document):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_documents = max_documents
+        self.max_entries_per_document = max_entries_per_document
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, doc_key, question_vector):
+        """
+        Find a cached answer to a similar question about the same document.
+        
+        Args:
+            doc_key (str): Document cache key
+            question_vector (list): Embedding of the question
+            
+        Returns:
+            dict or None: Cached entry with question, answer, sources and similarity
+        """
+        vector = self._normalize(question_vector)
+        now = time.time()
+        with self._lock:
+            answers = self._documents.get(doc_key)
+            if answers is None or not answers.entries:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(doc_key)
+            
+            expired = [
+                row for row, entry in enumerate(answers.entries)
+                if now - entry["created"] > self.ttl_seconds
+            ]
+            if expired:
+                answers.remove(expired)
+                if not answers.entries:
+                    self.misses += 1
+                    return None
+            
+            similarities = answers.vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            
+            entry = answers.entries[best]
+            entry["last_used"] = now
+            self.hits += 1
+            return {**entry, "similarity": float(similarities[best])}
+
+    def store(self, doc_key, question, question_vector, answer, sources=None):
+        """
+        Cache the answer to a question about a document.
+        
+        Args:
+            doc_key (str): Document cache key
+            question (str): Question text
+            question_vector (list): Embedding of the question
+            answer (str): Answer returned by the LLM
+            sources (list): Optional source metadata returned with the answer
+        """
+        vector = self._normalize(question_vector)
+        now = time.time()
+        with self._lock:
+            answers = self._documents.get(doc_key)
+            if answers is None:
+                answers = _DocumentAnswers(len(vector))
+                self._documents[doc_key] = answers
+            self._documents.move_to_end(doc_key)
+            
+            answers.vectors = np.vstack([answers.vectors, vector[np.newaxis, :]])
+            answers.entries.append({
+                "question": question,
+                "answer": answer,
+                "sources": sources or [],
+                "created": now,
+                "last_used": now,
+            })
+            
+            overflow = len(answers.entries) - self.max_entries_per_document
+            if overflow > 0:
+                by_recency = sorted(
+                    range(len(answers.entries)),
+                    key=lambda row: answers.entries[row]["last_used"]
+                )
+                answers.remove(by_recency[:overflow])
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+    def invalidate(self, doc_key):
+        """Drop every cached answer for a document."""
+        with self._lock:
+            self._documents.pop(doc_key, None)
+
+    def stats(self):
+        """Report cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "documents": len(self._documents),
+                "entries": sum(len(a.entries) for a in self._documents.values()),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,379 @@
+"""BM25 inverted index and hybrid (lexical + vector) retrieval.
+
+Similarity search alone misses exact identifiers such as part numbers and
+error codes. A BM25 index is built alongside the FAISS store at ingestion
+time, saved next to it, and both result lists are fused with reciprocal rank
+fusion at query time.
+"""
+
+import os
+import re
+import threading
+from array import array
+from collections import Counter, defaultdict
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from utils.context_packer import relevance_from_distance, with_relevance
+from utils.vector_index import search_batch
+import config
+
+LEXICAL_INDEX_FILE = "bm25.npz"
+
+# Words, numbers and identifiers joined by separators (E-1234, v2.1, ERR_42)
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:#][a-z0-9]+)*")
+_SEPARATOR_RE = re.compile(r"[-_./:#]")
+
+
+def tokenize(text):
+    """
+    Split text into lowercase BM25 terms.
+    
+    Identifiers containing separators are kept whole and also indexed by
+    their parts and their joined form, so "E-1234" matches queries for
+    "E-1234", "E1234" and "1234".
+    
+    Args:
+        text (str): Text to tokenize
+    
+    Returns:
+        list: Terms in order of appearance
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            parts = _SEPARATOR_RE.split(token)
+            tokens.extend(parts)
+            tokens.append("".join(parts))
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index scoring chunks with Okapi BM25.
+    
+    Each term maps to arrays of the rows containing it and their term
+    frequencies, so a query only touches the postings of its own terms.
+    Added chunks are buffered as flat (term, row, frequency) arrays and merged
+    into the postings by flush or on the next search or save. Removed chunks are masked out rather than compacted.
+    
+    Args:
+        k1 (float): Term frequency saturation, defaults to config.BM25_K1
+        b (float): Length normalisation, defaults to config.BM25_B
+    """
+
+    def __init__(self, k1=None, b=None):
+        self.k1 = config.BM25_K1 if k1 is None else k1
+        self.b = config.BM25_B if b is None else b
+        self.ids = []
+        self._rows = {}
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._term_ids = {}
+        self._postings = []
+        self._pending_terms = array("i")
+        self._pending_rows = array("i")
+        self._pending_tfs = array("f")
+        self._pending_lengths = array("f")
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return int(self._alive.sum()) + len(self._pending_lengths)
+
+    def add(self, ids, texts):
+        """
+        Index chunks.
+        
+        Args:
+            ids (list): Docstore ids of the chunks
+            texts (list): Chunk texts
+        """
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                row = len(self.ids)
+                self.ids.append(chunk_id)
+                self._rows[chunk_id] = row
+                counts = Counter(tokenize(text))
+                for term, count in counts.items():
+                    term_id = self._term_ids.setdefault(term, len(self._term_ids))
+                    self._pending_terms.append(term_id)
+                    self._pending_rows.append(row)
+                    self._pending_tfs.append(count)
+                self._pending_lengths.append(sum(counts.values()))
+
+    def remove(self, ids):
+        """Stop returning these chunks from searches."""
+        with self._lock:
+            self._merge_pending()
+            for chunk_id in ids:
+                row = self._rows.pop(chunk_id, None)
+                if row is not None:
+                    self._alive[row] = False
+
+    def flush(self):
+        """Merge buffered chunks into the postings, so the next search does not pay for it."""
+        with self._lock:
+            self._merge_pending()
+
+    def _merge_pending(self):
+        if not self._pending_lengths:
+            return
+        # Group the buffered entries by term; the stable sort keeps rows ascending
+        term_ids = np.frombuffer(self._pending_terms, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids = term_ids[order]
+        rows = np.frombuffer(self._pending_rows, dtype=np.int32)[order]
+        tfs = np.frombuffer(self._pending_tfs, dtype=np.float32)[order]
+        bounds = np.flatnonzero(np.diff(term_ids)) + 1
+        starts = np.concatenate([[0], bounds])
+        ends = np.concatenate([bounds, [len(term_ids)]])
+        
+        empty = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+        self._postings.extend([empty] * (len(self._term_ids) - len(self._postings)))
+        for term_id, start, end in zip(term_ids[starts].tolist(), starts.tolist(), ends.tolist()):
+            old_rows, old_tfs = self._postings[term_id]
+            if len(old_rows):
+                self._postings[term_id] = (
+                    np.concatenate([old_rows, rows[start:end]]), np.concatenate([old_tfs, tfs[start:end]])
+                )
+            else:
+                self._postings[term_id] = (rows[start:end], tfs[start:end])
+        
+        lengths = np.frombuffer(self._pending_lengths, dtype=np.float32)
+        self._lengths = np.concatenate([self._lengths, lengths])
+        self._alive = np.concatenate([self._alive, np.ones(len(lengths), dtype=bool)])
+        self._pending_terms = array("i")
+        self._pending_rows = array("i")
+        self._pending_tfs = array("f")
+        self._pending_lengths = array("f")
+
+    def search(self, query, k, id_filter=None):
+        """
+        Return the best matching chunks for a query.
+        
+        Args:
+            query (str): Query text
+            k (int): Maximum number of results
+            id_filter: Optional callable(chunk_id) -> bool restricting results
+        
+        Returns:
+            list: (chunk_id, score) tuples, best first, only chunks sharing
+                at least one term with the query
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            self._merge_pending()
+            num_alive = int(self._alive.sum())
+            if not terms or not num_alive:
+                return []
+            avg_length = float(self._lengths[self._alive].mean()) or 1.0
+            length_norm = self.k1 * (1 - self.b + self.b * self._lengths / avg_length)
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            for term in terms:
+                term_id = self._term_ids.get(term)
+                if term_id is None:
+                    continue
+                rows, tfs = self._postings[term_id]
+                idf = np.log1p((num_alive - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + length_norm[rows])
+            scores[~self._alive] = 0
+            candidates = np.flatnonzero(scores)
+            if id_filter is None and len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+            
+            results = []
+            for row in candidates:
+                chunk_id = self.ids[row]
+                if id_filter is None or id_filter(chunk_id):
+                    results.append((chunk_id, float(scores[row])))
+                    if len(results) == k:
+                        break
+            return results
+
+    def memory_bytes(self):
+        """Approximate memory held by the postings and row arrays."""
+        with self._lock:
+            total = self._lengths.nbytes + self._alive.nbytes
+            for rows, tfs in self._postings:
+                total += rows.nbytes + tfs.nbytes
+            total += len(self._pending_terms) * 12
+            total += sum(len(chunk_id) for chunk_id in self.ids)
+            return total
+
+    def save(self, folder_path):
+        """
+        Write the index to folder_path as a single compressed-sparse-row file.
+        
+        Args:
+            folder_path (str): Directory of the vector store it belongs to
+        """
+        with self._lock:
+            self._merge_pending()
+            # Term ids were assigned in insertion order
+            terms = list(self._term_ids)
+            indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum([len(rows) for rows, _ in self._postings], out=indptr[1:])
+            rows = np.concatenate([rows for rows, _ in self._postings]) if terms else np.zeros(0, np.int32)
+            tfs = np.concatenate([tfs for _, tfs in self._postings]) if terms else np.zeros(0, np.float32)
+            arrays = {
+                "ids": np.asarray(self.ids, dtype=str),
+                "lengths": self._lengths,
+                "alive": self._alive,
+                "terms": np.asarray(terms, dtype=str),
+                "indptr": indptr,
+                "rows": rows,
+                "tfs": tfs.astype(np.uint16),
+                "params": np.asarray([self.k1, self.b], dtype=np.float64),
+            }
+        os.makedirs(folder_path, exist_ok=True)
+        tmp_path = os.path.join(folder_path, f"{LEXICAL_INDEX_FILE}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, os.path.join(folder_path, LEXICAL_INDEX_FILE))
+
+    @classmethod
+    def load(cls, folder_path):
+        """
+        Read an index written by save.
+        
+        Returns:
+            BM25Index or None: The index, or None if folder_path has none
+        """
+        path = os.path.join(folder_path, LEXICAL_INDEX_FILE)
+        if not os.path.isfile(path):
+            return None
+        with np.load(path) as data:
+            k1, b = data["params"]
+            index = cls(k1=float(k1), b=float(b))
+            index.ids = data["ids"].tolist()
+            index._lengths = data["lengths"]
+            index._alive = data["alive"]
+            indptr = data["indptr"]
+            rows = data["rows"]
+            tfs = data["tfs"].astype(np.float32)
+            terms = data["terms"].tolist()
+        # Postings are views into the two shared arrays
+        index._term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        index._postings = [
+            (rows[indptr[i]:indptr[i + 1]], tfs[indptr[i]:indptr[i + 1]])
+            for i in range(len(terms))
+        ]
+        index._rows = {chunk_id: row for row, chunk_id in enumerate(index.ids) if index._alive[row]}
+        return index
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        """Build an index over every chunk in a FAISS store's docstore."""
+        index = cls()
+        docstore = vector_store.docstore
+        ids = list(vector_store.index_to_docstore_id.values())
+        index.add(ids, [docstore.search(chunk_id).page_content for chunk_id in ids])
+        return index
+
+
+def get_lexical_index(vector_store):
+    """Return the BM25 index attached to a vector store, or None."""
+    return getattr(vector_store, "lexical_index", None)
+
+
+def attach_lexical_index(vector_store, lexical_index):
+    """Attach a BM25 index so it is cached, saved and loaded with the store."""
+    vector_store.lexical_index = lexical_index
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=None):
+    """
+    Merge ranked lists of ids by reciprocal rank fusion.
+    
+    Args:
+        rankings (list): Lists of ids, each best first
+        rrf_k (int): Rank offset damping the weight of top ranks,
+            defaults to config.HYBRID_RRF_K
+    
+    Returns:
+        list: Ids ordered by fused score
+    """
+    rrf_k = config.HYBRID_RRF_K if rrf_k is None else rrf_k
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] += 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def fuse_documents(vector_docs, lexical_ids, docstore, k):
+    """
+    Fuse vector search results with BM25 results.
+    
+    Args:
+        vector_docs (list): Documents from similarity search, best first, with
+            their relevance in metadata
+        lexical_ids (list): Docstore ids from BM25 search, best first
+        docstore: Docstore resolving ids to documents
+        k (int): Number of documents to return
+    
+    Returns:
+        list: Top k documents by fused rank; lexical-only matches carry
+            no relevance
+    """
+    documents = {doc.id: doc for doc in vector_docs}
+    fused = reciprocal_rank_fusion([[doc.id for doc in vector_docs], lexical_ids])
+    results = []
+    for chunk_id in fused[:k]:
+        doc = documents.get(chunk_id)
+        if doc is None:
+            doc = docstore.search(chunk_id)
+        if isinstance(doc, Document):
+            results.append(doc)
+    return results
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing FAISS similarity search with BM25 over the same chunks.
+    
+    Documents found by similarity search carry their cosine relevance in
+    metadata["relevance"].
+    """
+
+    vector_store: Any
+    k: int = 4
+    fetch_k: int = config.HYBRID_FETCH_K
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.vector_store.embedding_function.embed_query(query)
+        return self.retrieve_batch([query], [query_vector])[0]
+
+    def retrieve_batch(self, queries, query_vectors):
+        """
+        Retrieve for many embedded queries with one index search.
+        
+        Args:
+            queries (list): Query texts, for the BM25 side
+            query_vectors (list): Query embeddings, aligned with queries
+            
+        Returns:
+            list: Fused documents per query
+        """
+        fetch_k = max(self.k, self.fetch_k)
+        lexical_index = get_lexical_index(self.vector_store)
+        results = []
+        for query, vector_results in zip(queries, search_batch(self.vector_store, query_vectors, fetch_k)):
+            vector_docs = [
+                with_relevance(doc, relevance_from_distance(distance)) for doc, distance in vector_results
+            ]
+            if lexical_index is None:
+                results.append(vector_docs[:self.k])
+                continue
+            lexical_ids = [chunk_id for chunk_id, _ in lexical_index.search(query, fetch_k)]
+            results.append(fuse_documents(vector_docs, lexical_ids, self.vector_store.docstore, self.k))
+        return results
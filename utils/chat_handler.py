@@ -1,83 +1,343 @@
 """Chat handler for managing conversations and LLM interactions."""
 
+import asyncio
+import threading
+
+import httpx
 from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
+from langchain.chains.question_answering import load_qa_chain
 from langchain.prompts import PromptTemplate
+from langchain_core.prompts import format_document
+from utils.bm25 import HybridRetriever, get_lexical_index
+from utils.context_packer import PackedRetriever, ScoredVectorRetriever, count_tokens
+from utils.metrics import record_tokens, span
 import config
 
 
-def create_conversation_chain(vector_store):
+_llms: dict = {}
+_answer_chains: dict = {}
+_llm_lock = threading.Lock()
+
+# Custom prompt template to ensure context is used
+PROMPT_TEMPLATE = """Use the following pieces of context from the document to answer the question at the end. 
+If you don't know the answer based on the context, just say that you don't have enough information in the document to answer this question.
+
+Context from the document:
+{context}
+
+Question: {question}
+
+Answer based on the document:"""
+
+
+def get_llm(model_name=None):
+    """
+    Get the shared ChatOpenAI client for a model, creating it on first use.
+    
+    All sessions share one client per model, so HTTP keep-alive connections
+    (and their TLS handshakes) are pooled process-wide instead of per session.
+    
+    Args:
+        model_name (str): OpenRouter model, defaults to config.OPENROUTER_MODEL
+        
+    Returns:
+        ChatOpenAI: Shared LLM client
+    """
+    model_name = model_name or config.OPENROUTER_MODEL
+    llm = _llms.get(model_name)
+    if llm is not None:
+        return llm
+    
+    with _llm_lock:
+        if model_name not in _llms:
+            limits = httpx.Limits(
+                max_connections=config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY_SECONDS
+            )
+            timeout = httpx.Timeout(config.LLM_TIMEOUT_SECONDS)
+            
+            # Initialize ChatOpenAI with OpenRouter configuration
+            _llms[model_name] = ChatOpenAI(
+                openai_api_key=config.OPENROUTER_API_KEY,
+                openai_api_base=config.OPENROUTER_API_BASE,
+                model_name=model_name,
+                temperature=config.TEMPERATURE,
+                max_tokens=config.MAX_TOKENS,
+                http_client=httpx.Client(limits=limits, timeout=timeout),
+                http_async_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+                model_kwargs={
+                    "extra_headers": {
+                        "HTTP-Referer": config.OPENROUTER_APP_URL,
+                        "X-Title": config.OPENROUTER_APP_NAME,
+                    }
+                }
+            )
+        return _llms[model_name]
+
+
+async def close_llm_clients():
+    """Close the pooled HTTP connections of every shared LLM client."""
+    with _llm_lock:
+        llms = list(_llms.values())
+        _llms.clear()
+        _answer_chains.clear()
+    for llm in llms:
+        llm.http_client.close()
+        await llm.http_async_client.aclose()
+
+
+def get_answer_chain(model_name=None):
+    """
+    Get the shared "stuff" chain that answers a question from documents.
+    
+    The chain holds only the prompt and the shared LLM client, and no
+    per-session state, so one per model serves every session.
+    
+    Args:
+        model_name (str): OpenRouter model, defaults to config.OPENROUTER_MODEL
+        
+    Returns:
+        StuffDocumentsChain: Shared answer chain
+    """
+    model_name = model_name or config.OPENROUTER_MODEL
+    chain = _answer_chains.get(model_name)
+    if chain is not None:
+        return chain
+    
+    llm = get_llm(model_name)
+    with _llm_lock:
+        if model_name not in _answer_chains:
+            prompt = PromptTemplate(template=PROMPT_TEMPLATE, input_variables=["context", "question"])
+            _answer_chains[model_name] = load_qa_chain(llm, chain_type="stuff", prompt=prompt)
+        return _answer_chains[model_name]
+
+
+class ConversationChain:
+    """
+    A session's retriever paired with the shared answer chain.
+    
+    Has the retriever and combine_documents_chain attributes of a
+    RetrievalQA chain, which is all the functions below use, without
+    building a chain object graph per session.
+    """
+
+    __slots__ = ("retriever", "combine_documents_chain")
+
+    def __init__(self, retriever, combine_documents_chain):
+        self.retriever = retriever
+        self.combine_documents_chain = combine_documents_chain
+
+
+def create_conversation_chain(vector_store, retriever=None):
     """
     Create a retrieval QA chain with OpenRouter LLM.
     
+    In hybrid retrieval mode, stores with a BM25 index are searched both
+    lexically and by similarity (see utils.bm25.HybridRetriever). Up to
+    config.CONTEXT_MAX_CHUNKS candidates are retrieved and packed into the
+    prompt within config.CONTEXT_TOKEN_BUDGET tokens (see
+    utils.context_packer.pack_documents).
+    
     Args:
         vector_store: FAISS vector store with document embeddings
+        retriever: Optional retriever used instead of one over vector_store;
+            it should return config.CONTEXT_MAX_CHUNKS candidates, best first
         
     Returns:
-        RetrievalQA: Chat chain with retrieval
-    """
-    # Initialize ChatOpenAI with OpenRouter configuration
-    llm = ChatOpenAI(
-        openai_api_key=config.OPENROUTER_API_KEY,
-        openai_api_base=config.OPENROUTER_API_BASE,
-        model_name=config.OPENROUTER_MODEL,
-        temperature=config.TEMPERATURE,
-        max_tokens=config.MAX_TOKENS,
-        model_kwargs={
-            "extra_headers": {
-                "HTTP-Referer": config.OPENROUTER_APP_URL,
-                "X-Title": config.OPENROUTER_APP_NAME,
-            }
-        }
-    )
+        ConversationChain: Session retriever with the shared answer chain
+    """
+    if retriever is None:
+        if config.RETRIEVAL_MODE == "hybrid" and get_lexical_index(vector_store) is not None:
+            retriever = HybridRetriever(vector_store=vector_store, k=config.CONTEXT_MAX_CHUNKS)
+        else:
+            retriever = ScoredVectorRetriever(vector_store=vector_store, k=config.CONTEXT_MAX_CHUNKS)
     
-    # Create a custom prompt template to ensure context is used
-    prompt_template = """Use the following pieces of context from the document to answer the question at the end. 
-If you don't know the answer based on the context, just say that you don't have enough information in the document to answer this question.
+    return ConversationChain(PackedRetriever(retriever=retriever), get_answer_chain())
 
-Context from the document:
-{context}
 
-Question: {question}
+def get_response(qa_chain, user_question):
+    """
+    Get response from the QA chain.
+    
+    Args:
+        qa_chain: Retrieval QA chain
+        user_question (str): User's question
+        
+    Returns:
+        dict: Response containing answer, source documents and prompt tokens
+    """
+    # Retrieve and answer as separate steps so each is timed
+    with span("retrieve"):
+        docs = qa_chain.retriever.invoke(user_question)
+    stuff_chain = qa_chain.combine_documents_chain
+    with span("llm"):
+        output = stuff_chain.invoke({"input_documents": docs, "question": user_question})
+    return _make_response(qa_chain, user_question, docs, output[stuff_chain.output_key])
 
-Answer based on the document:"""
+
+async def aretrieve(qa_chain, user_question, question_vector=None):
+    """
+    Retrieve the documents for a question without blocking the event loop.
     
-    PROMPT = PromptTemplate(
-        template=prompt_template, 
-        input_variables=["context", "question"]
+    Args:
+        qa_chain: Retrieval QA chain
+        user_question (str): User's question
+        question_vector (list): The question's embedding, if already computed,
+            so it isn't embedded again
+        
+    Returns:
+        list: Retrieved documents
+    """
+    if question_vector is None:
+        return await qa_chain.retriever.ainvoke(user_question)
+    docs_per_question = await asyncio.to_thread(
+        qa_chain.retriever.retrieve_batch, [user_question], [question_vector]
     )
+    return docs_per_question[0]
+
+
+async def aget_response(qa_chain, user_question, question_vector=None):
+    """
+    Get response from the QA chain without blocking the event loop.
     
-    # Create retrieval QA chain
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 4}
-        ),
-        return_source_documents=True,
-        chain_type_kwargs={"prompt": PROMPT}
-    )
+    Args:
+        qa_chain: Retrieval QA chain
+        user_question (str): User's question
+        question_vector (list): The question's embedding, if already computed
+        
+    Returns:
+        dict: Response containing answer, source documents and prompt tokens
+    """
+    with span("retrieve"):
+        docs = await aretrieve(qa_chain, user_question, question_vector)
+    stuff_chain = qa_chain.combine_documents_chain
+    with span("llm"):
+        output = await stuff_chain.ainvoke({"input_documents": docs, "question": user_question})
+    return _make_response(qa_chain, user_question, docs, output[stuff_chain.output_key])
+
+
+def _make_response(qa_chain, user_question, docs, answer):
+    """Response dict for an answered question, recording its token counts."""
+    prompt_tokens = count_prompt_tokens(qa_chain, user_question, docs)
+    record_tokens(prompt_tokens, count_tokens(answer))
+    return {
+        "query": user_question,
+        "answer": answer,
+        "source_documents": docs,
+        "prompt_tokens": prompt_tokens,
+    }
+
+
+async def aget_batch_responses(qa_chain, user_questions, question_vectors, max_concurrency=None):
+    """
+    Answer many questions with one batched retrieval and concurrent LLM calls.
+    
+    Retrieval for all questions runs in one index search; the "stuff" chain
+    is then invoked per question with at most max_concurrency calls in flight.
+    
+    Args:
+        qa_chain: Retrieval QA chain from create_conversation_chain
+        user_questions (list): Questions
+        question_vectors (list): Question embeddings, aligned with user_questions
+        max_concurrency (int): LLM calls in flight, defaults to config.BATCH_LLM_CONCURRENCY
+        
+    Returns:
+        list: Per question, in order, a response dict (answer, source documents
+            and prompt tokens) or the exception its LLM call raised
+    """
+    with span("retrieve"):
+        docs_per_question = await asyncio.to_thread(
+            qa_chain.retriever.retrieve_batch, user_questions, question_vectors
+        )
+    semaphore = asyncio.Semaphore(max_concurrency or config.BATCH_LLM_CONCURRENCY)
+    stuff_chain = qa_chain.combine_documents_chain
     
-    return qa_chain
+    async def answer(user_question, docs):
+        async with semaphore:
+            try:
+                output = await stuff_chain.ainvoke({"input_documents": docs, "question": user_question})
+            except Exception as e:
+                return e
+        return _make_response(qa_chain, user_question, docs, output[stuff_chain.output_key])
+    
+    # One span for all calls, as they overlap
+    with span("llm"):
+        return await asyncio.gather(*(
+            answer(user_question, docs) for user_question, docs in zip(user_questions, docs_per_question)
+        ))
 
 
-def get_response(qa_chain, user_question):
+def build_prompt(qa_chain, user_question, docs):
     """
-    Get response from the QA chain.
+    Build the prompt the "stuff" chain sends for a question and documents.
     
     Args:
         qa_chain: Retrieval QA chain
         user_question (str): User's question
+        docs (list): Documents placed in the context
+        
+    Returns:
+        str: Prompt text
+    """
+    stuff_chain = qa_chain.combine_documents_chain
+    context = stuff_chain.document_separator.join(
+        format_document(doc, stuff_chain.document_prompt) for doc in docs
+    )
+    return stuff_chain.llm_chain.prompt.format(context=context, question=user_question)
+
+
+def count_prompt_tokens(qa_chain, user_question, docs):
+    """Count the tokens of the prompt sent for a question and documents."""
+    return count_tokens(build_prompt(qa_chain, user_question, docs))
+
+
+def format_sources(docs):
+    """
+    Summarise retrieved documents for API responses.
+    
+    Args:
+        docs (list): Retrieved LangChain documents
         
     Returns:
-        dict: Response containing answer and source documents
+        list: Dicts with index, metadata (e.g. page numbers) and a text preview
+    """
+    return [
+        {
+            "index": i,
+            "metadata": doc.metadata,
+            "preview": doc.page_content[:200]
+        }
+        for i, doc in enumerate(docs)
+    ]
+
+
+async def astream_response(qa_chain, user_question, question_vector=None):
+    """
+    Stream a response from the QA chain, sources first and then answer tokens.
+    
+    Args:
+        qa_chain: Retrieval QA chain
+        user_question (str): User's question
+        question_vector (list): The question's embedding, if already computed
+        
+    Yields:
+        tuple: ("sources", list of source dicts), ("usage", {"prompt_tokens": int}),
+            then ("token", str) per token
     """
-    # Use 'query' instead of 'question' for RetrievalQA
-    response = qa_chain({"query": user_question})
+    with span("retrieve"):
+        docs = await aretrieve(qa_chain, user_question, question_vector)
+    yield "sources", format_sources(docs)
     
-    # Rename 'result' to 'answer' for consistency with API
-    if 'result' in response:
-        response['answer'] = response.pop('result')
+    # Build the same prompt the "stuff" chain would, then stream the LLM directly
+    prompt = build_prompt(qa_chain, user_question, docs)
+    prompt_tokens = count_tokens(prompt)
+    yield "usage", {"prompt_tokens": prompt_tokens}
     
-    return response
+    answer_parts = []
+    with span("llm"):
+        async for chunk in qa_chain.combine_documents_chain.llm_chain.llm.astream(prompt):
+            if chunk.content:
+                answer_parts.append(chunk.content)
+                yield "token", chunk.content
+    record_tokens(prompt_tokens, count_tokens("".join(answer_parts)))
@@ -0,0 +1,196 @@
+"""Token-budgeted packing of retrieved chunks into the prompt context.
+
+Instead of always stuffing a fixed number of chunks, retrieval fetches up to
+config.CONTEXT_MAX_CHUNKS candidates with relevance scores and the packer
+keeps them in relevance order until config.CONTEXT_TOKEN_BUDGET is spent,
+skipping weak matches and the text adjacent chunks share through
+CHUNK_OVERLAP.
+"""
+
+import threading
+from typing import Any, List
+
+import tiktoken
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from utils.vector_index import search_batch
+import config
+
+# Shortest shared text treated as chunk overlap rather than coincidence
+_MIN_OVERLAP_CHARS = 20
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    """
+    Get the tiktoken encoding for the configured model, loading it on first use.
+    
+    Returns:
+        tiktoken.Encoding or None: None if the encoding could not be loaded
+            (tiktoken downloads it on first use), in which case token counts
+            are estimated from text length
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            model = config.OPENROUTER_MODEL.split("/")[-1]
+            try:
+                try:
+                    _encoding = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding(config.TOKENIZER_ENCODING)
+            except Exception:
+                _encoding = False
+        return _encoding or None
+
+
+def count_tokens(text):
+    """
+    Count the tokens of text for the configured model.
+    
+    Args:
+        text (str): Text to count
+    
+    Returns:
+        int: Token count (about 4 characters per token if no encoding is available)
+    """
+    encoding = get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def relevance_from_distance(distance):
+    """
+    Convert a FAISS squared L2 distance to cosine similarity.
+    
+    Embeddings are normalised, so |a - b|^2 = 2 - 2 cos(a, b).
+    """
+    return 1.0 - float(distance) / 2.0
+
+
+def with_relevance(doc, relevance):
+    """Copy a document with its relevance score in its metadata."""
+    return Document(
+        id=doc.id,
+        page_content=doc.page_content,
+        metadata={**doc.metadata, "relevance": round(relevance, 4)}
+    )
+
+
+def _trim_overlap(text, packed_texts, max_overlap):
+    """Remove text shared with already packed chunks through chunk overlap."""
+    for packed in packed_texts:
+        if text in packed:
+            return ""
+        limit = min(max_overlap, len(text), len(packed))
+        # Longest prefix of text that ends a packed chunk, or suffix that starts one
+        for size in range(limit, _MIN_OVERLAP_CHARS - 1, -1):
+            if packed.endswith(text[:size]):
+                text = text[size:].lstrip()
+                break
+        limit = min(max_overlap, len(text), len(packed))
+        for size in range(limit, _MIN_OVERLAP_CHARS - 1, -1):
+            if packed.startswith(text[-size:]):
+                text = text[:-size].rstrip()
+                break
+    return text
+
+
+def pack_documents(docs, token_budget=None, min_relevance=None, separator="\n\n"):
+    """
+    Select retrieved chunks for the prompt within a token budget.
+    
+    Chunks are taken in the order given (best first). A chunk is skipped if
+    its "relevance" metadata is below min_relevance, except the best one,
+    so a question is never answered from an empty context; chunks without a
+    relevance (lexical-only hybrid matches) are kept. Text a chunk shares
+    with an already packed chunk is trimmed, and chunks that no longer fit
+    the remaining budget are skipped in favour of smaller, later ones.
+    
+    Args:
+        docs (list): Candidate documents, best first
+        token_budget (int): Context tokens allowed, defaults to config.CONTEXT_TOKEN_BUDGET
+        min_relevance (float): Cosine similarity cutoff, defaults to config.CONTEXT_MIN_RELEVANCE
+        separator (str): Text joining chunks in the prompt
+    
+    Returns:
+        tuple: (packed documents, context tokens used)
+    """
+    token_budget = config.CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    min_relevance = config.CONTEXT_MIN_RELEVANCE if min_relevance is None else min_relevance
+    separator_tokens = count_tokens(separator)
+    
+    packed = []
+    used = 0
+    for doc in docs:
+        relevance = doc.metadata.get("relevance")
+        if packed and relevance is not None and relevance < min_relevance:
+            continue
+        text = _trim_overlap(doc.page_content, [d.page_content for d in packed], config.CHUNK_OVERLAP)
+        if not text.strip():
+            continue
+        tokens = count_tokens(text) + (separator_tokens if packed else 0)
+        if used + tokens > token_budget:
+            continue
+        if text != doc.page_content:
+            doc = Document(id=doc.id, page_content=text, metadata=doc.metadata)
+        packed.append(doc)
+        used += tokens
+    return packed, used
+
+
+class ScoredVectorRetriever(BaseRetriever):
+    """Similarity search that records each chunk's relevance in its metadata."""
+
+    vector_store: Any
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.vector_store.embedding_function.embed_query(query)
+        return self.retrieve_batch([query], [query_vector])[0]
+
+    def retrieve_batch(self, queries, query_vectors):
+        """Retrieve for many embedded queries with one index search."""
+        return [
+            [with_relevance(doc, relevance_from_distance(distance)) for doc, distance in results]
+            for results in search_batch(self.vector_store, query_vectors, self.k)
+        ]
+
+
+class PackedRetriever(BaseRetriever):
+    """Retriever packing another retriever's candidates into a token budget."""
+
+    retriever: BaseRetriever
+    token_budget: int = config.CONTEXT_TOKEN_BUDGET
+    min_relevance: float = config.CONTEXT_MIN_RELEVANCE
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        docs, _ = pack_documents(candidates, self.token_budget, self.min_relevance)
+        return docs
+
+    def retrieve_batch(self, queries, query_vectors):
+        """
+        Retrieve and pack for many questions at once.
+        
+        The wrapped retriever must provide retrieve_batch(queries, query_vectors).
+        
+        Args:
+            queries (list): Question texts
+            query_vectors (list): Question embeddings, aligned with queries
+            
+        Returns:
+            list: Packed documents per question
+        """
+        return [
+            pack_documents(candidates, self.token_budget, self.min_relevance)[0]
+            for candidates in self.retriever.retrieve_batch(queries, query_vectors)
+        ]
@@ -0,0 +1,322 @@
+"""Shared corpus index holding many documents in one FAISS store.
+
+Every chunk carries its document's id in its metadata, so sessions can search
+the whole corpus once and filter to the documents they cover, instead of
+searching one index per document. The filter is applied by FAISS, from the
+index positions of each document's chunks.
+
+Saving rewrites the whole index, so changes are written to disk in batches:
+callers flush the corpus every config.CORPUS_SAVE_INTERVAL_SECONDS.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, List
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.bm25 import BM25Index, attach_lexical_index, get_lexical_index, fuse_documents
+from utils.context_packer import relevance_from_distance, with_relevance
+from utils.embeddings import get_embeddings
+from utils.index_store import load_vector_store, save_vector_store
+from utils.metrics import span
+from utils.pdf_processor import ChunkDeduplicator, embed_chunk_batches
+from utils.vector_index import maybe_upgrade_index, describe_index, remove_vectors, search_batch
+import config
+
+
+class CorpusIndex:
+    """
+    One FAISS store plus a registry of the documents it contains.
+    
+    Index mutations and searches are serialised by a lock, since FAISS
+    indexes are not safe to search while they are being modified. Documents
+    can be deleted with every index type, though hnsw indexes are rebuilt to
+    do so (see utils.vector_index.remove_vectors). Changes are only in
+    memory until the next flush.
+    
+    Args:
+        root_dir (str): Directory where the index and registry persist
+    """
+
+    REGISTRY_FILE = "documents.json"
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.documents = {}
+        self.vector_store = None
+        self._positions = {}  # doc_id -> index positions of its chunks
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Load a previously saved corpus, if any."""
+        registry_path = os.path.join(self.root_dir, self.REGISTRY_FILE)
+        if not os.path.isfile(registry_path):
+            return
+        with open(registry_path) as f:
+            documents = json.load(f)
+        # Not memory-mapped: the corpus index is modified in place
+        vector_store = load_vector_store(self.root_dir, mmap=False)
+        with self._lock:
+            self.documents = documents
+            self.vector_store = vector_store
+            self._index_positions()
+
+    def save(self):
+        """Persist the index and document registry."""
+        with self._lock:
+            if self.vector_store is None:
+                return
+            save_vector_store(self.vector_store, self.root_dir)
+            tmp_path = os.path.join(self.root_dir, f"{self.REGISTRY_FILE}.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.documents, f)
+            os.replace(tmp_path, os.path.join(self.root_dir, self.REGISTRY_FILE))
+            self._dirty = False
+
+    def flush(self):
+        """
+        Save the corpus if it changed since it was last saved.
+        
+        Returns:
+            bool: True if the corpus was saved
+        """
+        with self._lock:
+            if not self._dirty:
+                return False
+            with span("index_save"):
+                self.save()
+            return True
+
+    def _changed(self):
+        self._dirty = True
+        # Otherwise saved by the periodic flush
+        if config.CORPUS_SAVE_INTERVAL_SECONDS <= 0:
+            self.flush()
+
+    def _index_positions(self):
+        """Rebuild the index positions of each document's chunks, after positions shifted."""
+        positions = {}
+        # Chunk ids are "<doc_id>:<n>"
+        for position, chunk_id in self.vector_store.index_to_docstore_id.items():
+            positions.setdefault(chunk_id.split(":", 1)[0], []).append(position)
+        self._positions = positions
+
+    def _empty_store(self):
+        embeddings = get_embeddings()
+        dim = len(embeddings.embed_query("dimension probe"))
+        vector_store = FAISS(
+            embedding_function=embeddings,
+            index=faiss.IndexFlatL2(dim),
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+        if config.RETRIEVAL_MODE == "hybrid":
+            attach_lexical_index(vector_store, BM25Index())
+        return vector_store
+
+    def add_document(self, pdf_name, doc_hash, chunks, progress_callback=None):
+        """
+        Embed a document's chunks and add them to the corpus.
+        
+        Args:
+            pdf_name (str): Original file name
+            doc_hash (str): Hash of the PDF content
+            chunks: Iterable of (chunk_text, metadata) tuples
+            progress_callback: Optional callable(chunks_embedded, chunks_per_second)
+            
+        Returns:
+            tuple: (doc_id, stats dict)
+        """
+        doc_id = uuid.uuid4().hex
+        chunk_ids = []
+        start = time.perf_counter()
+        # Only repeats within the document are dropped; other documents keep their copies
+        deduplicator = ChunkDeduplicator() if config.CHUNK_DEDUP_ENABLED else None
+        if deduplicator is not None:
+            chunks = deduplicator.filter(chunks)
+        try:
+            for texts, metadatas, vectors in embed_chunk_batches(chunks):
+                ids = [f"{doc_id}:{len(chunk_ids) + i}" for i in range(len(texts))]
+                for metadata in metadatas:
+                    metadata["doc_id"] = doc_id
+                with self._lock, span("index_build"):
+                    if self.vector_store is None:
+                        self.vector_store = self._empty_store()
+                    start_position = self.vector_store.index.ntotal
+                    self.vector_store.add_embeddings(
+                        list(zip(texts, vectors)), metadatas=metadatas, ids=ids
+                    )
+                    self._positions.setdefault(doc_id, []).extend(
+                        range(start_position, start_position + len(ids))
+                    )
+                    lexical_index = get_lexical_index(self.vector_store)
+                    if lexical_index is not None:
+                        lexical_index.add(ids, texts)
+                    maybe_upgrade_index(self.vector_store)
+                chunk_ids.extend(ids)
+                if progress_callback:
+                    progress_callback(len(chunk_ids), len(chunk_ids) / max(time.perf_counter() - start, 1e-9))
+        except Exception:
+            self._remove_chunks(chunk_ids)
+            raise
+        
+        seconds = time.perf_counter() - start
+        stats = {
+            "chunks": len(chunk_ids),
+            "duplicates": deduplicator.duplicates if deduplicator is not None else 0,
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(len(chunk_ids) / seconds, 1) if seconds > 0 else 0.0,
+        }
+        if not chunk_ids:
+            return doc_id, stats
+        
+        with self._lock:
+            self.documents[doc_id] = {
+                "doc_id": doc_id,
+                "pdf_name": pdf_name,
+                "document_hash": doc_hash,
+                "num_chunks": len(chunk_ids),
+                "chunk_ids": chunk_ids,
+                "created_at": datetime.now().isoformat(),
+            }
+            self._changed()
+        return doc_id, stats
+
+    def delete_document(self, doc_id):
+        """
+        Remove a document's chunks from the index and registry.
+        
+        Returns:
+            bool: False if the document was not in the corpus
+        """
+        with self._lock:
+            document = self.documents.get(doc_id)
+            if document is None:
+                return False
+            # Unregistered only once its chunks are gone, so a failed delete can be retried
+            self._remove_chunks(document["chunk_ids"])
+            del self.documents[doc_id]
+            self._changed()
+        return True
+
+    def _remove_chunks(self, chunk_ids):
+        if not chunk_ids:
+            return
+        with self._lock:
+            try:
+                remove_vectors(self.vector_store, chunk_ids)
+            finally:
+                # Positions after removed vectors shift down
+                self._index_positions()
+            lexical_index = get_lexical_index(self.vector_store)
+            if lexical_index is not None:
+                lexical_index.remove(chunk_ids)
+
+    def list_documents(self):
+        """Registry entries without their chunk ids."""
+        with self._lock:
+            return [
+                {key: value for key, value in document.items() if key != "chunk_ids"}
+                for document in self.documents.values()
+            ]
+
+    def search(self, query, doc_ids, k):
+        """
+        Search the corpus, restricted to some documents.
+        
+        The index is searched once, restricted by FAISS to the chunks of the
+        selected documents, so the cost does not grow with the documents
+        left out. When the corpus has a BM25 index (hybrid retrieval mode),
+        the filtered lexical and similarity results are fused.
+        
+        Args:
+            query (str): Query text
+            doc_ids (list): Documents to retrieve from
+            k (int): Number of chunks to return
+            
+        Returns:
+            list: Matching documents, with the relevance of those found by
+                similarity search in metadata["relevance"]
+        """
+        query_vector = get_embeddings().embed_query(query)
+        return self.search_batch([query], [query_vector], doc_ids, k)[0]
+
+    def search_batch(self, queries, query_vectors, doc_ids, k):
+        """
+        Search the corpus for many embedded queries with one index search.
+        
+        Args:
+            queries (list): Query texts
+            query_vectors (list): Query embeddings, aligned with queries
+            doc_ids (list): Documents to retrieve from
+            k (int): Number of chunks to return per query
+            
+        Returns:
+            list: Matching documents per query, as returned by search
+        """
+        with self._lock:
+            if self.vector_store is None:
+                return [[] for _ in queries]
+            selected = set(doc_ids)
+            positions = [self._positions[doc_id] for doc_id in selected if doc_id in self._positions]
+            if not positions:
+                return [[] for _ in queries]
+            lexical_index = get_lexical_index(self.vector_store)
+            vector_k = k if lexical_index is None else max(k, config.HYBRID_FETCH_K)
+            vector_results = search_batch(
+                self.vector_store, query_vectors, vector_k, ids=np.concatenate(positions)
+            )
+            
+            results = []
+            for query, documents in zip(queries, vector_results):
+                vector_docs = [
+                    with_relevance(doc, relevance_from_distance(distance)) for doc, distance in documents
+                ]
+                if lexical_index is None:
+                    results.append(vector_docs)
+                    continue
+                # Chunk ids are "<doc_id>:<n>"
+                lexical_ids = [
+                    chunk_id for chunk_id, _ in lexical_index.search(
+                        query, vector_k, id_filter=lambda chunk_id: chunk_id.split(":", 1)[0] in selected
+                    )
+                ]
+                results.append(fuse_documents(vector_docs, lexical_ids, self.vector_store.docstore, k))
+            return results
+
+    def stats(self):
+        """Report corpus size and index type."""
+        with self._lock:
+            return {
+                "documents": len(self.documents),
+                "index": describe_index(self.vector_store.index) if self.vector_store is not None else None,
+            }
+
+
+class CorpusRetriever(BaseRetriever):
+    """Retriever over the documents of a corpus selected by a session."""
+
+    corpus: Any
+    doc_ids: List[str]
+    k: int = 4
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.corpus.search(query, self.doc_ids, self.k)
+
+    def retrieve_batch(self, queries, query_vectors):
+        """Retrieve for many embedded queries with one index search."""
+        return self.corpus.search_batch(queries, query_vectors, self.doc_ids, self.k)
@@ -0,0 +1,278 @@
+"""Cache of chunk embeddings keyed by a hash of the chunk text.
+
+Boilerplate such as legal footers, standard sections and running headers
+recurs across documents, and the same chunk text always gets the same
+vector from a given model. Chunks are therefore looked up by a 64-bit hash
+of their text before they are sent to the encoder, and only misses are
+embedded.
+
+Entries are stored per embedding model and backend under
+config.EMBEDDING_CACHE_DIR as immutable segments: a sorted array of keys
+(.keys.npy) and the matching float32 vectors (.vectors.npy), memory-mapped
+on load and searched with a binary search. New entries are buffered and
+written as a new segment when ingestion of a document finishes; once there
+are more than _MAX_SEGMENTS segments, all but the largest are merged. When
+the cache holds more than config.EMBEDDING_CACHE_MAX_ENTRIES vectors the
+oldest segments are dropped. Segments are written to temporary files and
+renamed into place, so worker processes can share the directory.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+import config
+
+# Segments kept before the smaller ones are merged
+_MAX_SEGMENTS = 8
+
+_KEYS_SUFFIX = ".keys.npy"
+_VECTORS_SUFFIX = ".vectors.npy"
+
+
+def text_key(text):
+    """64-bit hash of a chunk's text."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class _Segment:
+    """One immutable pair of sorted keys and their vectors, memory-mapped."""
+
+    __slots__ = ("name", "keys", "vectors")
+
+    def __init__(self, name, keys, vectors):
+        self.name = name
+        self.keys = keys
+        self.vectors = vectors
+
+    def find(self, keys):
+        """Row of each key in this segment, or -1."""
+        positions = np.searchsorted(self.keys, keys)
+        positions[positions >= len(self.keys)] = 0
+        return np.where(self.keys[positions] == keys, positions, -1)
+
+
+class EmbeddingCache:
+    """
+    Chunk embeddings of one model, persisted as memory-mapped segments.
+    
+    Args:
+        cache_dir (str): Directory holding this model's segments
+        max_entries (int): Vectors kept before the oldest segments are dropped
+    """
+
+    def __init__(self, cache_dir, max_entries):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._segments = []
+        self._listed_mtime = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        """
+        Look up vectors by text key.
+        
+        Args:
+            keys (list): Keys from text_key
+        
+        Returns:
+            list: float32 vector per key, or None where it is not cached
+        """
+        if not keys:
+            return []
+        query = np.asarray(keys, dtype=np.uint64)
+        found = [None] * len(keys)
+        with self._lock:
+            self._refresh()
+            for i, key in enumerate(keys):
+                found[i] = self._pending.get(key)
+            # Newest segments first, though a key's vector is the same in every segment
+            for segment in reversed(self._segments):
+                missing = [i for i, vector in enumerate(found) if vector is None]
+                if not missing:
+                    break
+                rows = segment.find(query[missing])
+                for i, row in zip(missing, rows.tolist()):
+                    if row >= 0:
+                        found[i] = np.array(segment.vectors[row])
+            hits = sum(vector is not None for vector in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, keys, vectors):
+        """Buffer new vectors until the next flush."""
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._pending[key] = np.asarray(vector, dtype=np.float32)
+
+    def flush(self):
+        """Write buffered vectors as a new segment, merging and evicting segments as needed."""
+        with self._lock:
+            if not self._pending:
+                return
+            keys = np.fromiter(self._pending, dtype=np.uint64, count=len(self._pending))
+            vectors = np.stack(list(self._pending.values()))
+            self._pending.clear()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write_segment(self._new_name(), keys, vectors)
+            self._listed_mtime = None
+            self._refresh()
+            if len(self._segments) > _MAX_SEGMENTS:
+                self._merge()
+            self._evict()
+
+    def stats(self):
+        """Report entries, size on disk and hit/miss counters."""
+        with self._lock:
+            self._refresh()
+            lookups = self.hits + self.misses
+            return {
+                "entries": sum(len(segment.keys) for segment in self._segments),
+                "max_entries": self.max_entries,
+                "segments": len(self._segments),
+                "bytes": sum(segment.keys.nbytes + segment.vectors.nbytes for segment in self._segments),
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _new_name(self):
+        # Names sort by creation time, which is the eviction order
+        return f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+
+    def _refresh(self):
+        """Pick up segments written or removed by other processes."""
+        try:
+            mtime = os.stat(self.cache_dir).st_mtime_ns
+        except OSError:
+            self._segments = []
+            return
+        if mtime == self._listed_mtime:
+            return
+        self._listed_mtime = mtime
+        loaded = {segment.name: segment for segment in self._segments}
+        segments = []
+        for file_name in sorted(os.listdir(self.cache_dir)):
+            # The keys file is renamed into place last, so its segment is complete
+            if not file_name.endswith(_KEYS_SUFFIX):
+                continue
+            name = file_name[:-len(_KEYS_SUFFIX)]
+            segment = loaded.get(name)
+            if segment is None:
+                try:
+                    segment = _Segment(
+                        name,
+                        np.load(os.path.join(self.cache_dir, file_name), mmap_mode="r"),
+                        np.load(os.path.join(self.cache_dir, name + _VECTORS_SUFFIX), mmap_mode="r")
+                    )
+                except (OSError, ValueError):
+                    # Removed by another process's merge or eviction meanwhile
+                    continue
+            segments.append(segment)
+        self._segments = segments
+
+    def _write_segment(self, name, keys, vectors):
+        order = np.argsort(keys, kind="stable")
+        for suffix, array in ((_VECTORS_SUFFIX, vectors[order]), (_KEYS_SUFFIX, keys[order])):
+            tmp_path = os.path.join(self.cache_dir, f".{name}{suffix}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(self.cache_dir, name + suffix))
+
+    def _remove_segment(self, segment):
+        for suffix in (_KEYS_SUFFIX, _VECTORS_SUFFIX):
+            try:
+                os.remove(os.path.join(self.cache_dir, segment.name + suffix))
+            except OSError:
+                pass
+
+    def _merge(self):
+        """Merge every segment but the largest into one with the oldest one's name."""
+        largest = max(self._segments, key=lambda segment: len(segment.keys))
+        merging = [segment for segment in self._segments if segment is not largest]
+        keys = np.concatenate([segment.keys for segment in merging])
+        vectors = np.concatenate([segment.vectors for segment in merging])
+        keys, first = np.unique(keys, return_index=True)
+        # Written under a new name first, as the oldest name is still in use
+        name = merging[0].name.split("-")[0] + "-" + uuid.uuid4().hex[:8]
+        self._write_segment(name, keys, vectors[first])
+        for segment in merging:
+            self._remove_segment(segment)
+        self._listed_mtime = None
+        self._refresh()
+
+    def _evict(self):
+        """Drop the oldest segments while the cache holds too many vectors."""
+        total = sum(len(segment.keys) for segment in self._segments)
+        evicted = False
+        for segment in self._segments[:-1]:
+            if total <= self.max_entries:
+                break
+            total -= len(segment.keys)
+            self._remove_segment(segment)
+            evicted = True
+        if evicted:
+            self._listed_mtime = None
+            self._refresh()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name=None, backend=None):
+    """
+    Return the shared embedding cache of a model, or None if caching is off.
+    
+    Args:
+        model_name (str): HuggingFace model name, defaults to config.EMBEDDING_MODEL
+        backend (str): Embedding backend, defaults to config.EMBEDDING_BACKEND
+    
+    Returns:
+        EmbeddingCache or None
+    """
+    if not config.EMBEDDING_CACHE_ENABLED:
+        return None
+    model_name = model_name or config.EMBEDDING_MODEL
+    backend = backend or config.EMBEDDING_BACKEND
+    with _caches_lock:
+        cache = _caches.get((model_name, backend))
+        if cache is None:
+            cache_dir = os.path.join(config.EMBEDDING_CACHE_DIR, f"{model_name.replace('/', '__')}__{backend}")
+            cache = EmbeddingCache(cache_dir, config.EMBEDDING_CACHE_MAX_ENTRIES)
+            _caches[(model_name, backend)] = cache
+        return cache
+
+
+def embed_with_cache(embeddings, texts, cache):
+    """
+    Embed texts, taking the vectors of previously seen texts from a cache.
+    
+    Args:
+        embeddings: Embeddings model
+        texts (list): Chunk texts
+        cache (EmbeddingCache): Cache to read and add to, or None
+    
+    Returns:
+        list: One vector per text
+    """
+    if cache is None:
+        return embeddings.embed_documents(texts)
+    keys = [text_key(text) for text in texts]
+    vectors = cache.get_many(keys)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        embedded = embeddings.embed_documents([texts[i] for i in missing])
+        cache.put_many([keys[i] for i in missing], embedded)
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+    return vectors
@@ -0,0 +1,151 @@
+"""Process-wide embedding model registry.
+
+Loading a sentence-transformers model takes seconds and hundreds of MB, so each
+configured model is loaded once per process and shared by every session.
+Models run on PyTorch or, with config.EMBEDDING_BACKEND, on ONNX Runtime
+(see utils.onnx_embeddings).
+"""
+
+import os
+import resource
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+import config
+
+
+# "torch" runs sentence-transformers; the others an ONNX export of the same model
+BACKENDS = ("torch", "onnx", "onnx_int8")
+
+
+class SharedEmbeddings(Embeddings):
+    """Thread-safe wrapper around a loaded embedding model."""
+
+    def __init__(self, model_name, model):
+        self.model_name = model_name
+        self._model = model
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        """Embed a list of texts, serialising access to the underlying model."""
+        with self._lock:
+            return self._model.embed_documents(texts)
+
+    def embed_query(self, text):
+        """Embed a single query text."""
+        with self._lock:
+            return self._model.embed_query(text)
+
+
+_models: dict = {}
+_stats: dict = {}
+_registry_lock = threading.Lock()
+
+
+def _rss_bytes():
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the peak RSS (KB on Linux), the best we can do elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _load_model(model_name, backend):
+    """Load a HuggingFace embedding model on a backend and record its load cost."""
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        model = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': config.EMBEDDING_DEVICE},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+    else:
+        from utils.onnx_embeddings import load_onnx_embeddings
+
+        model = load_onnx_embeddings(model_name, quantized=backend == "onnx_int8")
+    _stats[(model_name, backend)] = {
+        "model_name": model_name,
+        "backend": backend,
+        "load_seconds": round(time.perf_counter() - start, 3),
+        "rss_delta_bytes": max(_rss_bytes() - rss_before, 0),
+        "warmup_seconds": None,
+    }
+    return SharedEmbeddings(model_name, model)
+
+
+def check_backend(backend=None):
+    """
+    Check that an embedding backend exists and its packages are installed.
+    
+    Args:
+        backend (str): Backend name, defaults to config.EMBEDDING_BACKEND
+    
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If packages the backend needs are missing
+    """
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if backend != "torch":
+        from utils.onnx_embeddings import check_dependencies
+        
+        check_dependencies()
+
+
+def get_embeddings(model_name=None, backend=None):
+    """
+    Get the shared embedding model, loading it on first use.
+    
+    Args:
+        model_name (str): HuggingFace model name, defaults to config.EMBEDDING_MODEL
+        backend (str): One of BACKENDS, defaults to config.EMBEDDING_BACKEND
+        
+    Returns:
+        SharedEmbeddings: Thread-safe embeddings shared by all sessions
+    """
+    model_name = model_name or config.EMBEDDING_MODEL
+    backend = backend or config.EMBEDDING_BACKEND
+    check_backend(backend)
+    key = (model_name, backend)
+    embeddings = _models.get(key)
+    if embeddings is None:
+        with _registry_lock:
+            embeddings = _models.get(key)
+            if embeddings is None:
+                embeddings = _load_model(model_name, backend)
+                _models[key] = embeddings
+    return embeddings
+
+
+def warmup_embeddings(model_names=None):
+    """
+    Load and run a first encode on each model so the first upload is not slow.
+    
+    Args:
+        model_names (list): Models to warm up, defaults to config.EMBEDDING_MODEL
+    """
+    for model_name in model_names or [config.EMBEDDING_MODEL]:
+        embeddings = get_embeddings(model_name)
+        start = time.perf_counter()
+        embeddings.embed_query("warmup")
+        _stats[(model_name, config.EMBEDDING_BACKEND)]["warmup_seconds"] = round(time.perf_counter() - start, 3)
+
+
+def get_embedding_stats():
+    """
+    Report load time and memory usage of the loaded embedding models.
+    
+    Returns:
+        dict: Per-model statistics and the current process RSS
+    """
+    return {
+        "models": [dict(stats) for stats in _stats.values()],
+        "process_rss_bytes": _rss_bytes(),
+    }
@@ -0,0 +1,161 @@
+"""Incremental re-ingestion of new versions of a document.
+
+Ingestion records a hash of each page's extracted text. When a new version
+of the document arrives, its pages are hashed and aligned with the stored
+hashes (pages may have been inserted or removed, shifting the ones after
+them). Chunks that touch a page that changed or disappeared are removed from
+the vector store, and only the changed pages, together with the unchanged
+pages those chunks also covered, are chunked and embedded again. Unchanged
+chunks keep their vectors and are renumbered to their new pages.
+
+Chunks may span page boundaries, so a re-chunked page next to an unchanged
+one can share some text with a kept chunk, as overlapping chunks do anyway;
+no text of the new version is left uncovered.
+"""
+
+import hashlib
+import time
+from difflib import SequenceMatcher
+
+from utils.bm25 import get_lexical_index
+from utils.metrics import span
+from utils.pdf_processor import ChunkDeduplicator, embed_chunk_batches, iter_page_chunks
+from utils.vector_index import maybe_upgrade_index, remove_vectors
+import config
+
+
+def page_hash(text):
+    """Short hash of a page's extracted text."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def hash_pages(pages, hashes):
+    """
+    Pass (page_number, text) tuples through, recording each page's hash.
+    
+    Args:
+        pages: Iterable of (page_number, text) tuples in page order
+        hashes (list): Receives page_hash(text) of each page, in order
+    
+    Yields:
+        tuple: The pages, unchanged
+    """
+    for page_number, text in pages:
+        hashes.append(page_hash(text))
+        yield page_number, text
+
+
+def match_pages(old_hashes, new_hashes):
+    """
+    Pair the unchanged pages of two versions of a document.
+    
+    Args:
+        old_hashes (list): Page hashes of the stored version
+        new_hashes (list): Page hashes of the new version
+    
+    Returns:
+        dict: Old page number to new page number of every page whose text
+            is unchanged, both starting at 1
+    """
+    # No autojunk: blank or boilerplate pages repeat and must still match
+    matcher = SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    page_map = {}
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            page_map[old_start + offset + 1] = new_start + offset + 1
+    return page_map
+
+
+def _page_runs(page_numbers):
+    """Group sorted page numbers into (first, last) runs of consecutive pages."""
+    runs = []
+    for page_number in page_numbers:
+        if runs and page_number == runs[-1][1] + 1:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+    return runs
+
+
+def update_vector_store(vector_store, old_hashes, pages, progress_callback=None):
+    """
+    Bring a document's vector store up to date with a new version in place.
+    
+    Args:
+        vector_store (FAISS): Store built from the old version; must not be
+            in use by searches while it is updated
+        old_hashes (list): Page hashes of the old version, or None if unknown,
+            in which case every page is treated as changed
+        pages (list): (page_number, text) tuples of the new version, in order
+        progress_callback: Optional callable(chunks_embedded, chunks_per_second)
+    
+    Returns:
+        tuple: (new page hashes, stats dict with pages, pages_changed (new
+            or edited pages), chunks_removed, chunks_added, chunks and seconds)
+    """
+    start = time.perf_counter()
+    new_hashes = [page_hash(text) for _, text in pages]
+    page_map = match_pages(old_hashes or [], new_hashes)
+    
+    # Chunks touching a changed or removed page are stale; the unchanged
+    # pages they also covered are re-chunked along with the changed ones
+    unchanged = set(page_map.values())
+    rechunk = {page_number for page_number, _ in pages if page_number not in unchanged}
+    stale_ids = []
+    kept = []
+    for chunk_id in vector_store.index_to_docstore_id.values():
+        doc = vector_store.docstore.search(chunk_id)
+        first = doc.metadata.get("page")
+        chunk_pages = range(first, doc.metadata.get("page_end", first) + 1) if first is not None else ()
+        if chunk_pages and all(page_number in page_map for page_number in chunk_pages):
+            kept.append(doc)
+        else:
+            stale_ids.append(chunk_id)
+            rechunk.update(page_map[page_number] for page_number in chunk_pages if page_number in page_map)
+    
+    lexical_index = get_lexical_index(vector_store)
+    if stale_ids:
+        with span("index_build"):
+            remove_vectors(vector_store, stale_ids)
+            if lexical_index is not None:
+                lexical_index.remove(stale_ids)
+    for doc in kept:
+        doc.metadata["page"] = page_map[doc.metadata["page"]]
+        doc.metadata["page_end"] = page_map[doc.metadata.get("page_end", doc.metadata["page"])]
+    
+    # Each run of consecutive pages is split on its own, as a whole document would be
+    by_number = dict(pages)
+    chunks = (
+        chunk
+        for first, last in _page_runs(sorted(rechunk))
+        for chunk in iter_page_chunks((n, by_number[n]) for n in range(first, last + 1))
+    )
+    deduplicator = None
+    if config.CHUNK_DEDUP_ENABLED:
+        deduplicator = ChunkDeduplicator(doc.page_content for doc in kept)
+        chunks = deduplicator.filter(chunks)
+    added = 0
+    embed_start = time.perf_counter()
+    for texts, metadatas, vectors in embed_chunk_batches(chunks):
+        with span("index_build"):
+            ids = vector_store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+            if lexical_index is not None:
+                lexical_index.add(ids, texts)
+            maybe_upgrade_index(vector_store)
+        added += len(texts)
+        if progress_callback:
+            progress_callback(added, added / max(time.perf_counter() - embed_start, 1e-9))
+    if lexical_index is not None:
+        with span("index_build"):
+            lexical_index.flush()
+    
+    stats = {
+        "pages": len(pages),
+        "pages_changed": len(pages) - len(unchanged),
+        "chunks_removed": len(stale_ids),
+        "chunks_added": added,
+        "duplicates": deduplicator.duplicates if deduplicator is not None else 0,
+        "chunks": vector_store.index.ntotal,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return new_hashes, stats
@@ -0,0 +1,286 @@
+"""On-disk storage of session vector stores and metadata.
+
+Each session is saved to its own directory using the LangChain FAISS layout
+(index.faiss + index.pkl), its BM25 index (bm25.npz) plus a session.json with
+its metadata, so sessions survive restarts and their indexes can be loaded
+lazily. Chat history spilled from memory is appended to history.jsonl, and
+the hashes of the document's pages, used to update it incrementally, are
+kept in pages.json.
+
+Loaded indexes may be memory-mapped from their files, by this worker or
+another one, so index files are never rewritten in place. Each save writes a
+new index-* directory and then replaces the index.current file naming the
+current one; older versions are unlinked, which leaves existing mappings
+intact. Sessions saved before indexes were versioned keep their files in the
+session directory until their next save.
+"""
+
+import fcntl
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from utils.bm25 import LEXICAL_INDEX_FILE, BM25Index, attach_lexical_index, get_lexical_index
+from utils.embeddings import get_embeddings
+from utils.vector_index import configure_search
+import config
+
+# Characters of leading document text shown for session debugging output
+SAMPLE_TEXT_LENGTH = 500
+
+
+def save_vector_store(vector_store, folder_path):
+    """
+    Save a FAISS vector store and its BM25 index, if it has one.
+    
+    Args:
+        vector_store (FAISS): Vector store
+        folder_path (str): Directory to write index.faiss, index.pkl and bm25.npz to
+    """
+    vector_store.save_local(folder_path)
+    lexical_index = get_lexical_index(vector_store)
+    if lexical_index is not None:
+        lexical_index.save(folder_path)
+
+
+def load_vector_store(folder_path, embeddings=None, mmap=None):
+    """
+    Load a FAISS vector store saved with save_vector_store.
+    
+    Unlike FAISS.load_local, the index is memory-mapped when FAISS supports it
+    for the index type, so pages are only read in as they are searched. The
+    saved BM25 index is attached; in hybrid retrieval mode stores saved
+    without one get it rebuilt from their docstore.
+    
+    Args:
+        folder_path (str): Directory containing index.faiss and index.pkl
+        embeddings: Embeddings for queries, defaults to the shared model
+        mmap (bool): Memory-map the index, defaults to config.INDEX_MMAP
+    
+    Returns:
+        FAISS: Vector store
+    """
+    if mmap is None:
+        mmap = config.INDEX_MMAP
+    index_path = os.path.join(folder_path, "index.faiss")
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type can be mapped; fall back to a regular read
+            index = None
+    if index is None:
+        index = faiss.read_index(index_path)
+    configure_search(index)
+    
+    # The pickle is only ever written by this application
+    with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    
+    vector_store = FAISS(
+        embedding_function=embeddings or get_embeddings(),
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id
+    )
+    lexical_index = BM25Index.load(folder_path)
+    if lexical_index is None and config.RETRIEVAL_MODE == "hybrid":
+        lexical_index = BM25Index.from_vector_store(vector_store)
+    if lexical_index is not None:
+        attach_lexical_index(vector_store, lexical_index)
+    return vector_store
+
+
+class IndexStore:
+    """Persists one directory per session under a root directory."""
+
+    METADATA_FILE = "session.json"
+    HISTORY_FILE = "history.jsonl"
+    PAGES_FILE = "pages.json"
+    INDEX_POINTER_FILE = "index.current"
+    INDEX_DIR_PREFIX = "index-"
+    LOCK_FILE = "update.lock"
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def session_dir(self, session_id):
+        """Directory holding a session's index and metadata."""
+        return os.path.join(self.root_dir, session_id)
+
+    def index_dir(self, session_id):
+        """Directory holding the current version of a session's index."""
+        path = self.session_dir(session_id)
+        try:
+            with open(os.path.join(path, self.INDEX_POINTER_FILE)) as f:
+                return os.path.join(path, f.read().strip())
+        except OSError:
+            # Saved before indexes were versioned
+            return path
+
+    @contextmanager
+    def update_lock(self, session_id):
+        """
+        Hold a session's exclusive update lock for the enclosed block.
+        
+        The lock is a file lock, so it serialises updates across threads and
+        worker processes sharing the store.
+        """
+        path = self.session_dir(session_id)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, self.LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self, session_id, vector_store, metadata, page_hashes=None):
+        """
+        Save a session's vector store and metadata.
+        
+        Args:
+            session_id (str): Session identifier
+            vector_store (FAISS): Index and docstore to persist
+            metadata (dict): JSON-serialisable session metadata
+            page_hashes (list): Hashes of the document's pages, if known
+        """
+        self.save_vector_store(session_id, vector_store)
+        if page_hashes is not None:
+            self.save_page_hashes(session_id, page_hashes)
+        self.save_metadata(session_id, metadata)
+
+    def save_vector_store(self, session_id, vector_store):
+        """Save a new version of a session's vector store and make it current."""
+        path = self.session_dir(session_id)
+        os.makedirs(path, exist_ok=True)
+        version_dir = tempfile.mkdtemp(dir=path, prefix=self.INDEX_DIR_PREFIX)
+        version = os.path.basename(version_dir)
+        try:
+            save_vector_store(vector_store, version_dir)
+            tmp_path = os.path.join(path, f"{self.INDEX_POINTER_FILE}.tmp-{version}")
+            with open(tmp_path, "w") as f:
+                f.write(version)
+            os.replace(tmp_path, os.path.join(path, self.INDEX_POINTER_FILE))
+        except BaseException:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            raise
+        
+        # Unlinking keeps the files of mapped indexes readable to their mappings
+        for name in os.listdir(path):
+            if name.startswith(self.INDEX_DIR_PREFIX) and name != version:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        for name in ("index.faiss", "index.pkl", LEXICAL_INDEX_FILE):
+            if os.path.isfile(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+
+    def save_page_hashes(self, session_id, page_hashes):
+        """Write the hashes of a session's document pages atomically."""
+        path = self.session_dir(session_id)
+        os.makedirs(path, exist_ok=True)
+        tmp_path = os.path.join(path, f"{self.PAGES_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(page_hashes, f)
+        os.replace(tmp_path, os.path.join(path, self.PAGES_FILE))
+
+    def load_page_hashes(self, session_id):
+        """
+        Read the hashes of a session's document pages.
+        
+        Returns:
+            list or None: Page hashes, or None if they were not recorded
+        """
+        try:
+            with open(os.path.join(self.session_dir(session_id), self.PAGES_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_metadata(self, session_id, metadata):
+        """Write a session's metadata atomically."""
+        path = self.session_dir(session_id)
+        os.makedirs(path, exist_ok=True)
+        tmp_path = os.path.join(path, f"{self.METADATA_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, os.path.join(path, self.METADATA_FILE))
+
+    def load_metadata(self, session_id):
+        """
+        Read a session's metadata.
+        
+        Returns:
+            dict or None: Metadata, or None if the session is not stored
+        """
+        try:
+            with open(os.path.join(self.session_dir(session_id), self.METADATA_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def history_path(self, session_id):
+        """File older chat history entries of a session are appended to."""
+        return os.path.join(self.session_dir(session_id), self.HISTORY_FILE)
+
+    def load_vector_store(self, session_id, mmap=None):
+        """Load a session's vector store, memory-mapped where possible unless mmap is False."""
+        try:
+            return load_vector_store(self.index_dir(session_id), mmap=mmap)
+        except (OSError, RuntimeError):
+            # The version being read was replaced by another worker's save
+            return load_vector_store(self.index_dir(session_id), mmap=mmap)
+
+    def load_sample_text(self, session_id, max_chars=SAMPLE_TEXT_LENGTH):
+        """
+        Read the start of a session's document back from its saved chunks.
+        
+        Only the docstore is read, not the index, so sessions need not keep
+        a copy of the text in memory.
+        
+        Args:
+            session_id (str): Session identifier
+            max_chars (int): Characters returned, before a trailing "..."
+        
+        Returns:
+            str: Leading text of the first chunks, in document order, or ""
+                if the session has no saved chunks
+        """
+        try:
+            with open(os.path.join(self.index_dir(session_id), "index.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+        except OSError:
+            return ""
+        # Updated documents have their re-embedded chunks at the end of the index
+        docs = sorted(
+            (docstore.search(index_to_docstore_id[position]) for position in sorted(index_to_docstore_id)),
+            key=lambda doc: doc.metadata.get("page", 0)
+        )
+        parts = []
+        length = 0
+        for doc in docs:
+            if length >= max_chars:
+                break
+            text = doc.page_content
+            parts.append(text)
+            length += len(text) + 1
+        text = "\n".join(parts)
+        return text[:max_chars] + "..." if len(text) > max_chars else text
+
+    def delete(self, session_id):
+        """Remove a session's files."""
+        shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
+
+    def list_session_ids(self):
+        """Return the ids of all stored sessions."""
+        if not os.path.isdir(self.root_dir):
+            return []
+        return [
+            name for name in os.listdir(self.root_dir)
+            if os.path.isfile(os.path.join(self.root_dir, name, self.METADATA_FILE))
+        ]
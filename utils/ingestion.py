@@ -0,0 +1,313 @@
+"""Bounded worker pool and job tracking for PDF ingestion.
+
+Ingestion (extraction, chunking, embedding and index build) is CPU heavy, so it
+runs off the event loop on a fixed number of workers with a bounded queue.
+"""
+
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+
+from utils.incremental import hash_pages, update_vector_store
+from utils.metrics import StageTimings, collect_timings, span
+from utils.pdf_processor import iter_pdf_pages, iter_page_chunks, stream_vector_store
+import config
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue cannot accept another job."""
+
+
+class IngestionJob:
+    """
+    Status and per-stage progress of a single ingestion.
+    
+    Args:
+        pdf_name (str): Original file name
+        timings (StageTimings): Collects the job's stage spans, e.g. those of
+            the request waiting for it; by default the job collects its own
+            and observes them in the stage histogram when it finishes
+    """
+
+    def __init__(self, pdf_name, timings=None):
+        self.job_id = str(uuid.uuid4())
+        self.pdf_name = pdf_name
+        self.status = "queued"
+        self.stage = None
+        self.progress = {
+            "pages_total": 0,
+            "pages_extracted": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_per_second": 0.0,
+        }
+        self.result = None
+        self.error = None
+        self.timings = timings or StageTimings()
+        self._owns_timings = timings is None
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        self._finished_monotonic = None
+        self._lock = threading.Lock()
+
+    def update(self, stage=None, **progress):
+        """Record the current stage and any progress counters."""
+        with self._lock:
+            if stage is not None:
+                self.stage = stage
+            self.progress.update(progress)
+
+    def finish(self, result=None, error=None):
+        """Mark the job as completed or failed."""
+        with self._lock:
+            self.status = "failed" if error else "completed"
+            self.stage = None
+            self.result = result
+            self.error = error
+            self.finished_at = datetime.now().isoformat()
+            self._finished_monotonic = time.monotonic()
+
+    def to_dict(self):
+        """Serialise the job for the API."""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "pdf_name": self.pdf_name,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def extract_and_split(pdf_path, progress_callback=None, parallel=True):
+    """
+    Extract text from a PDF on disk and split it into page-tagged chunks.
+    
+    Top-level so it can run in a worker process.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        progress_callback: Optional callable(pages_done, pages_total)
+        parallel (bool): Allow fanning pages out to the extraction process pool
+    
+    Returns:
+        tuple: ((chunk_text, metadata) tuples, page hashes)
+    """
+    page_hashes = []
+    pages = hash_pages(iter_pdf_pages(pdf_path, progress_callback, parallel=parallel), page_hashes)
+    return list(iter_page_chunks(pages)), page_hashes
+
+
+def extract_pages(pdf_path, progress_callback=None, parallel=True):
+    """
+    Extract the text of every page of a PDF on disk.
+    
+    Top-level so it can run in a worker process.
+    
+    Returns:
+        list: (page_number, text) tuples
+    """
+    return list(iter_pdf_pages(pdf_path, progress_callback, parallel=parallel))
+
+
+class IngestionPool:
+    """
+    Runs ingestion jobs on a fixed number of workers with a bounded queue.
+    
+    Jobs always run on worker threads. With executor "process", the
+    GIL-bound extraction and chunking step is additionally handed to a
+    process pool; embedding releases the GIL and stays on the thread.
+    """
+
+    def __init__(self, max_workers, max_queue, executor="thread"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest"
+        )
+        self._process_executor = None
+        if executor == "process":
+            # spawn, so workers do not inherit the parent's torch threads
+            self._process_executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        # One slot per running or queued job
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.jobs = {}
+
+    def submit(self, fn, job, *args):
+        """
+        Queue fn(job, *args) for execution.
+        
+        Args:
+            fn: Callable running the ingestion and returning the job result
+            job (IngestionJob): Job to track
+        
+        Returns:
+            concurrent.futures.Future: Future resolving to fn's return value
+        
+        Raises:
+            QueueFullError: If all worker and queue slots are taken
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError(
+                f"Ingestion queue is full ({self.max_workers + self.max_queue} jobs in progress)"
+            )
+        self._prune_jobs()
+        self.jobs[job.job_id] = job
+        with self._pending_lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._run, fn, job, args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def ingest(self, pdf_path, job, build=None, page_hashes=None):
+        """
+        Extract, chunk and embed a PDF.
+        
+        With thread workers the stages are streamed: pages are chunked as
+        they are extracted and embedded in batches as chunks arrive, so
+        memory stays bounded for very large documents. With a process pool
+        extraction and chunking finish in the worker before embedding.
+        
+        Args:
+            pdf_path (str): Path to the PDF file
+            job (IngestionJob): Job receiving stage and progress updates
+            build: Callable(chunks, progress_callback) consuming the
+                (chunk_text, metadata) stream and returning (result, stats);
+                defaults to stream_vector_store, building a new vector store
+            page_hashes (list): If given, receives the hash of each page's
+                text, for later incremental updates (see update)
+        
+        Returns:
+            tuple: (result of build, stats)
+        """
+        build = build or stream_vector_store
+        page_hashes = [] if page_hashes is None else page_hashes
+        job.update(stage="extracting")
+        pages_progress = lambda done, total: job.update(pages_extracted=done, pages_total=total)
+        
+        def embed_progress(done, chunks_per_second):
+            job.update(stage="embedding", chunks_embedded=done, chunks_per_second=round(chunks_per_second, 1))
+        
+        if self._process_executor is None:
+            pages = hash_pages(iter_pdf_pages(pdf_path, pages_progress), page_hashes)
+            result, stats = build(iter_page_chunks(pages), embed_progress)
+        else:
+            # Already in a worker process, so don't fan pages out a second time.
+            # Extraction and chunking both run there, so they share one span.
+            with span("extract"):
+                chunks, hashes = self._process_executor.submit(
+                    extract_and_split, pdf_path, None, False
+                ).result()
+            page_hashes.extend(hashes)
+            job.update(
+                stage="embedding", pages_extracted=len(hashes), pages_total=len(hashes), chunks_total=len(chunks)
+            )
+            result, stats = build(chunks, embed_progress)
+        
+        if stats["chunks"] == 0:
+            raise ValueError("No text could be extracted from the PDF")
+        job.update(chunks_total=stats["chunks"], chunks_per_second=stats["chunks_per_second"])
+        return result, stats
+
+    def update(self, pdf_path, job, vector_store, page_hashes):
+        """
+        Apply a new version of a PDF to the vector store of its previous version.
+        
+        Every page is extracted and hashed, but only pages whose text changed
+        are chunked and embedded again (see utils.incremental). The pages
+        are held in memory until they are compared.
+        
+        Args:
+            pdf_path (str): Path to the new version of the PDF
+            job (IngestionJob): Job receiving stage and progress updates
+            vector_store (FAISS): Store of the previous version, updated in place
+            page_hashes (list): Page hashes of the previous version, or None
+        
+        Returns:
+            tuple: (page hashes of the new version, stats)
+        """
+        job.update(stage="extracting")
+        if self._process_executor is None:
+            pages = extract_pages(
+                pdf_path, lambda done, total: job.update(pages_extracted=done, pages_total=total)
+            )
+        else:
+            with span("extract"):
+                pages = self._process_executor.submit(extract_pages, pdf_path, None, False).result()
+        if not any(text.strip() for _, text in pages):
+            raise ValueError("No text could be extracted from the PDF")
+        job.update(stage="embedding", pages_extracted=len(pages), pages_total=len(pages))
+        
+        def embed_progress(done, chunks_per_second):
+            job.update(chunks_embedded=done, chunks_per_second=round(chunks_per_second, 1))
+        
+        new_hashes, stats = update_vector_store(vector_store, page_hashes, pages, embed_progress)
+        job.update(chunks_total=stats["chunks_added"])
+        return new_hashes, stats
+
+    def get_job(self, job_id):
+        """Return the job with this id, or None."""
+        return self.jobs.get(job_id)
+
+    def queue_depth(self):
+        """Number of jobs currently running or waiting."""
+        return self._pending
+
+    def stats(self):
+        """Report pool configuration and current load."""
+        return {
+            "executor": "process" if self._process_executor else "thread",
+            "workers": self.max_workers,
+            "queue_size": self.max_queue,
+            "queue_depth": self.queue_depth(),
+            "tracked_jobs": len(self.jobs),
+        }
+
+    def shutdown(self):
+        """Stop accepting jobs and release worker resources."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._process_executor is not None:
+            self._process_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, job, args):
+        job.status = "running"
+        with collect_timings(job.timings):
+            try:
+                result = fn(job, *args)
+            except Exception as e:
+                job.finish(error=str(e))
+                raise
+            finally:
+                if job._owns_timings:
+                    job.timings.observe()
+        job.finish(result=result)
+        return result
+
+    def _release(self):
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _prune_jobs(self):
+        """Forget finished jobs older than config.JOB_RETENTION_SECONDS."""
+        cutoff = time.monotonic() - config.JOB_RETENTION_SECONDS
+        for job_id, job in list(self.jobs.items()):
+            if job._finished_monotonic is not None and job._finished_monotonic < cutoff:
+                self.jobs.pop(job_id, None)
@@ -0,0 +1,205 @@
+"""Content-addressed cache of ingestion results.
+
+Uploading the same PDF with the same chunking and embedding settings produces
+the same chunks and index, so results are keyed by a hash of the PDF bytes and
+those settings and reused across sessions.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+from utils.index_store import load_vector_store, save_vector_store
+import config
+
+
+def document_hasher():
+    """Incremental hash object for PDF bytes; hexdigest() equals document_hash."""
+    return hashlib.sha256()
+
+
+def document_hash(pdf_bytes):
+    """
+    Hash the raw bytes of a PDF.
+    
+    Args:
+        pdf_bytes (bytes): PDF file content
+    
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    hasher = document_hasher()
+    hasher.update(pdf_bytes)
+    return hasher.hexdigest()
+
+
+def ingestion_cache_key(doc_hash):
+    """
+    Combine a document hash with the settings that shape the ingestion result.
+    
+    Args:
+        doc_hash (str): Hash returned by document_hash
+    
+    Returns:
+        str: Cache key
+    """
+    settings = "|".join(str(setting) for setting in (
+        config.CHUNK_SIZE,
+        config.CHUNK_OVERLAP,
+        config.EMBEDDING_MODEL,
+        config.EMBEDDING_BACKEND,
+        config.VECTOR_INDEX_TYPE,
+        config.VECTOR_STORAGE,
+        config.VECTOR_PCA_DIM,
+        config.CHUNK_DEDUP_ENABLED,
+    ))
+    return hashlib.sha256(f"{doc_hash}|{settings}".encode()).hexdigest()
+
+
+class CachedIngestion:
+    """Chunk count, FAISS index and page hashes produced for one cache key."""
+
+    __slots__ = ("num_chunks", "vector_store", "page_hashes")
+
+    def __init__(self, num_chunks, vector_store, page_hashes=None):
+        self.num_chunks = num_chunks
+        self.vector_store = vector_store
+        self.page_hashes = page_hashes
+
+
+class IngestionCache:
+    """
+    Two-tier LRU cache: a bounded number of entries in memory, backed by a
+    bounded number of entries on disk.
+    
+    Cached vector stores are shared between sessions and must be treated as
+    read-only.
+    """
+
+    def __init__(self, max_entries, cache_dir=None, max_disk_entries=0):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Look up an ingestion result, promoting disk hits into memory.
+        
+        Args:
+            key (str): Key from ingestion_cache_key
+        
+        Returns:
+            CachedIngestion or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+        
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key, num_chunks, vector_store, page_hashes=None):
+        """
+        Store an ingestion result in memory and on disk.
+        
+        Args:
+            key (str): Key from ingestion_cache_key
+            num_chunks (int): Number of chunks in the document
+            vector_store (FAISS): Index built from the chunks
+            page_hashes (list): Hashes of the document's pages
+        """
+        entry = CachedIngestion(num_chunks, vector_store, page_hashes)
+        with self._lock:
+            self._insert(key, entry)
+        self._save_to_disk(key, entry)
+
+    def stats(self):
+        """Report cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_entries": len(self._disk_keys()),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_keys(self):
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return []
+        return os.listdir(self.cache_dir)
+
+    def _save_to_disk(self, key, entry):
+        if not self.cache_dir or self.max_disk_entries <= 0:
+            return
+        path = os.path.join(self.cache_dir, key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Unique across the worker processes sharing the cache directory
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix=f"{key}.tmp-")
+        try:
+            save_vector_store(entry.vector_store, tmp_path)
+            with open(os.path.join(tmp_path, "ingestion.json"), "w") as f:
+                json.dump({"num_chunks": entry.num_chunks, "page_hashes": entry.page_hashes}, f)
+            # Rename last so readers never see a partially written entry
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Most likely another worker stored the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        self._evict_disk()
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            with open(os.path.join(path, "ingestion.json")) as f:
+                data = json.load(f)
+            vector_store = load_vector_store(path)
+        except (OSError, ValueError, KeyError, RuntimeError):
+            return None
+        os.utime(path)  # Disk tier is LRU by modification time
+        return CachedIngestion(data["num_chunks"], vector_store, data.get("page_hashes"))
+
+    def _evict_disk(self):
+        paths = [
+            os.path.join(self.cache_dir, name)
+            for name in self._disk_keys()
+            if ".tmp-" not in name
+        ]
+        if len(paths) <= self.max_disk_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_disk_entries]:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,335 @@
+"""Stage timing spans and Prometheus metrics.
+
+Work is wrapped in span(stage) blocks. Spans add their duration to the
+StageTimings of the current request or ingestion job (a context variable, so
+it follows asyncio.to_thread and copied contexts into worker threads), and
+each request's or job's per-stage totals are observed into the
+pdf_chat_stage_duration_seconds histogram when it finishes. Metrics are
+rendered in the Prometheus text format for /metrics without a client library.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Media type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from a cached retrieval up to a very large ingestion
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Base for metrics with optional labels."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        """(suffix, label values, extra labels, value) tuples."""
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, dict):
+                values = {(): values}
+            return [("", key, None, value) for key, value in values.items()]
+        with self._lock:
+            return [("", key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        """Lines of the Prometheus text format for this metric."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, key, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonic counter.
+    
+    Args:
+        name (str): Metric name
+        documentation (str): Help text
+        labelnames (tuple): Label names
+        callback: Optional callable returning the value (or a dict of label
+            value tuples to values) at scrape time, for counts kept elsewhere
+    """
+
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the counter for these labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down; see Counter for the arguments."""
+
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        """Set the gauge for these labels."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values in cumulative buckets.
+    
+    Args:
+        name (str): Metric name
+        documentation (str): Help text
+        labelnames (tuple): Label names
+        buckets (tuple): Upper bounds of the buckets, ascending
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        """Record one observation for these labels."""
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append(("_bucket", key, [("le", _format_value(bound))], cumulative))
+            samples.append(("_sum", key, None, total))
+            samples.append(("_count", key, None, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Metrics rendered together on /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, replacing any registered under the same name."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "pdf_chat_stage_duration_seconds",
+    "Time spent per request or ingestion job in each pipeline stage",
+    ("stage",)
+))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "pdf_chat_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status")
+))
+LLM_TOKENS = REGISTRY.register(Histogram(
+    "pdf_chat_llm_tokens",
+    "Tokens per LLM call",
+    ("direction",),
+    buckets=TOKEN_BUCKETS
+))
+
+
+class StageTimings:
+    """Seconds spent in each stage by one request or ingestion job."""
+
+    def __init__(self):
+        self._seconds = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        """Add seconds to a stage."""
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def merge(self, other):
+        """Add another StageTimings' stages to this one."""
+        for stage, seconds in other.items():
+            self.add(stage, seconds)
+
+    def items(self):
+        """(stage, seconds) pairs in the order stages first ran."""
+        with self._lock:
+            return list(self._seconds.items())
+
+    def observe(self):
+        """Record every stage's total in the stage duration histogram."""
+        for stage, seconds in self.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def server_timing(self):
+        """Value for a Server-Timing header, durations in milliseconds."""
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.items())
+
+
+_current_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def current_timings():
+    """The StageTimings being collected in this context, or None."""
+    return _current_timings.get()
+
+
+@contextmanager
+def collect_timings(timings=None):
+    """
+    Collect the spans run in this block (and contexts copied from it).
+    
+    Args:
+        timings (StageTimings): Add to these timings instead of new ones
+    
+    Yields:
+        StageTimings: Filled in as spans finish; observe() it when done
+    """
+    timings = timings if timings is not None else StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+def record_stage(stage, seconds):
+    """
+    Record time spent in a stage.
+    
+    Added to the current StageTimings if one is being collected, otherwise
+    observed in the histogram directly.
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+    else:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as part of a stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def record_tokens(prompt_tokens=None, completion_tokens=None):
+    """Record the token counts of one LLM call."""
+    if prompt_tokens is not None:
+        LLM_TOKENS.observe(prompt_tokens, direction="prompt")
+    if completion_tokens is not None:
+        LLM_TOKENS.observe(completion_tokens, direction="completion")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request.
+    
+    Spans run while handling a request, including while a streamed body is
+    sent, are collected per request and observed once the response is
+    complete, together with the request latency by route template. With
+    server_timing, the stages finished before the response headers were sent
+    are reported in a Server-Timing header.
+    
+    Args:
+        app: ASGI application
+        server_timing (bool): Add the Server-Timing header
+    """
+
+    def __init__(self, app, server_timing=False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status = 500
+        with collect_timings() as timings:
+            async def send_with_timing(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if self.server_timing:
+                        value = timings.server_timing()
+                        total = f"total;dur={(time.perf_counter() - start) * 1000:.1f}"
+                        value = f"{value}, {total}" if value else total
+                        headers = list(message.get("headers", [])) + [(b"server-timing", value.encode("latin-1"))]
+                        message = {**message, "headers": headers}
+                await send(message)
+            
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                # The route template, not the path, so IDs don't each get a series
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - start, method=scope["method"], route=route, status=status
+                )
+                timings.observe()
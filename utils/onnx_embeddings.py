@@ -0,0 +1,274 @@
+"""Embedding models run with ONNX Runtime instead of PyTorch.
+
+A sentence-transformers model is exported to ONNX once (into
+config.EMBEDDING_ONNX_DIR, one directory per model) together with its
+tokenizer and pooling settings, and optionally quantized to int8 weights with
+ONNX Runtime's dynamic quantization. At run time only onnxruntime and the
+tokenizers package are needed.
+
+Texts are batched by token count rather than by number: they are tokenized
+up front, sorted by length, and grouped so that each batch, padded to its own
+longest text, stays within config.EMBEDDING_MAX_BATCH_TOKENS. Short chunks
+then share large batches and long ones small batches, with little padding
+either way.
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import config
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+EXPORT_SETTINGS_FILE = "export.json"
+
+# Pooling modes that can be applied to the exported token embeddings
+POOLING_MODES = ("mean", "cls")
+
+# Packages needed to run an exported model (see requirements-onnx.txt)
+RUNTIME_PACKAGES = ("onnxruntime", "tokenizers")
+
+
+def check_dependencies():
+    """
+    Check that the packages needed to run ONNX models are installed.
+    
+    Raises:
+        ImportError: If any of RUNTIME_PACKAGES is missing
+    """
+    missing = [name for name in RUNTIME_PACKAGES if importlib.util.find_spec(name) is None]
+    if missing:
+        raise ImportError(
+            f"The ONNX embedding backend needs {' and '.join(missing)}. "
+            "Please install them with `pip install -r requirements-onnx.txt`."
+        )
+
+
+def _export_dir(model_name):
+    return os.path.join(config.EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+
+
+def export_onnx_model(model_name, quantize=False):
+    """
+    Export a sentence-transformers model to ONNX, unless already exported.
+    
+    Exporting needs sentence-transformers (and so PyTorch); the result is
+    written to a temporary directory and moved into place, so concurrent
+    workers never load a partial export.
+    
+    Args:
+        model_name (str): HuggingFace model name
+        quantize (bool): Also write an int8 dynamically quantized copy
+    
+    Returns:
+        str: Directory holding the model, tokenizer.json and export.json
+    """
+    output_dir = _export_dir(model_name)
+    if not os.path.exists(os.path.join(output_dir, EXPORT_SETTINGS_FILE)):
+        _export(model_name, output_dir)
+    if quantize and not os.path.exists(os.path.join(output_dir, QUANTIZED_MODEL_FILE)):
+        _quantize(output_dir)
+    return output_dir
+
+
+def _export(model_name, output_dir):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling = model[1].get_pooling_mode_str()
+    if pooling not in POOLING_MODES:
+        raise ValueError(f"Cannot export {model_name}: unsupported pooling mode {pooling!r}")
+    transformer = model[0].auto_model.eval()
+    
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+        
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+    
+    os.makedirs(os.path.dirname(os.path.abspath(output_dir)), exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_dir)))
+    try:
+        sample = model.tokenizer(["export"], return_tensors="pt", return_token_type_ids=True)
+        dynamic_axes = {"batch": 0, "sequence": 1}
+        torch.onnx.export(
+            TokenEmbeddings(),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            os.path.join(work_dir, MODEL_FILE),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                "input_ids": dynamic_axes,
+                "attention_mask": dynamic_axes,
+                "token_type_ids": dynamic_axes,
+                "token_embeddings": dynamic_axes,
+            },
+            opset_version=14
+        )
+        model.tokenizer.save_pretrained(work_dir)
+        with open(os.path.join(work_dir, EXPORT_SETTINGS_FILE), "w") as f:
+            json.dump({
+                "model_name": model_name,
+                "pooling": pooling,
+                "max_seq_length": model.max_seq_length,
+            }, f)
+        try:
+            os.rename(work_dir, output_dir)
+        except OSError:
+            # Another worker finished the same export first
+            shutil.rmtree(work_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+
+def _quantize(output_dir):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, suffix=".onnx")
+    os.close(fd)
+    try:
+        quantize_dynamic(
+            os.path.join(output_dir, MODEL_FILE), temp_path, weight_type=QuantType.QInt8
+        )
+        os.replace(temp_path, os.path.join(output_dir, QUANTIZED_MODEL_FILE))
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def length_batches(lengths, max_batch_tokens, max_batch_size):
+    """
+    Group texts into batches of similar length.
+    
+    Args:
+        lengths (list): Token count of each text
+        max_batch_tokens (int): Largest batch size times padded length
+        max_batch_size (int): Most texts per batch
+    
+    Returns:
+        list: Batches of indexes into lengths, shortest texts first; a text
+            longer than max_batch_tokens gets a batch of its own
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    batch = []
+    for i in order:
+        # Sorted ascending, so this text sets the batch's padded length
+        if batch and ((len(batch) + 1) * lengths[i] > max_batch_tokens or len(batch) == max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an exported model, computed with ONNX Runtime.
+    
+    Embeddings are pooled as the original model pools them and L2
+    normalised, like the PyTorch backend.
+    
+    Args:
+        model_dir (str): Directory written by export_onnx_model
+        quantized (bool): Use the int8 quantized model
+        max_batch_tokens (int): Padded tokens per batch, defaults to
+            config.EMBEDDING_MAX_BATCH_TOKENS
+        num_threads (int): ONNX Runtime intra-op threads, 0 for its default
+    """
+
+    def __init__(self, model_dir, quantized=False, max_batch_tokens=None, num_threads=None):
+        check_dependencies()
+        import onnxruntime
+        from tokenizers import Tokenizer
+        
+        with open(os.path.join(model_dir, EXPORT_SETTINGS_FILE)) as f:
+            settings = json.load(f)
+        self.pooling = settings["pooling"]
+        self.max_batch_tokens = max_batch_tokens or config.EMBEDDING_MAX_BATCH_TOKENS
+        
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(settings["max_seq_length"])
+        self.tokenizer.no_padding()
+        
+        options = onnxruntime.SessionOptions()
+        num_threads = config.EMBEDDING_ONNX_THREADS if num_threads is None else num_threads
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantized else MODEL_FILE),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _encode_batch(self, encodings):
+        """Run one batch of tokenized texts and pool them into unit vectors."""
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        
+        token_embeddings = self.session.run(None, inputs)[0]
+        if self.pooling == "cls":
+            vectors = token_embeddings[:, 0]
+        else:
+            mask = attention_mask[:, :, np.newaxis].astype(np.float32)
+            vectors = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts):
+        """Embed a list of texts, batched by token count."""
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(list(texts))
+        lengths = [len(encoding.ids) for encoding in encodings]
+        order = []
+        batch_vectors = []
+        for batch in length_batches(lengths, self.max_batch_tokens, config.EMBEDDING_BATCH_SIZE):
+            order.extend(batch)
+            batch_vectors.append(self._encode_batch([encodings[i] for i in batch]))
+        
+        # Back to the order the texts were given in
+        sorted_vectors = np.concatenate(batch_vectors)
+        vectors = np.empty_like(sorted_vectors)
+        vectors[order] = sorted_vectors
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        """Embed a single query text."""
+        return self.embed_documents([text])[0]
+
+
+def load_onnx_embeddings(model_name, quantized=False):
+    """
+    Load a model's ONNX export, exporting (and quantizing) it on first use.
+    
+    Args:
+        model_name (str): HuggingFace model name
+        quantized (bool): Use int8 quantized weights
+    
+    Returns:
+        OnnxEmbeddings
+    """
+    # Before the export, which takes a while and doesn't need them
+    check_dependencies()
+    return OnnxEmbeddings(export_onnx_model(model_name, quantize=quantized), quantized=quantized)
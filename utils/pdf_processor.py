@@ -1,26 +1,162 @@
 """PDF processing utilities for extracting and chunking text from PDF documents."""
 
+import contextvars
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+
 from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
+from utils.bm25 import BM25Index, attach_lexical_index
+from utils.embedding_cache import embed_with_cache, get_embedding_cache, text_key
+from utils.embeddings import get_embeddings
+from utils.metrics import span
+from utils.vector_index import maybe_upgrade_index
 import config
 
 
-def load_pdf(pdf_file):
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+
+def _get_page_executor():
+    """Create the shared page extraction process pool on first use."""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is None:
+            # spawn, so workers do not inherit the parent's torch threads
+            _page_executor = ProcessPoolExecutor(
+                max_workers=config.PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _page_executor
+
+
+def shutdown_page_executor():
+    """Stop the page extraction process pool if it was started."""
+    global _page_executor
+    with _page_executor_lock:
+        if _page_executor is not None:
+            _page_executor.shutdown(wait=False, cancel_futures=True)
+            _page_executor = None
+
+
+@contextmanager
+def open_pdf(pdf_file):
+    """
+    Open a PDF for reading, memory-mapping it when given a path.
+    
+    PdfReader reads a file path into memory in full before parsing; reading
+    from a memory map instead parses straight from the page cache, which
+    the workers extracting page ranges of the same file also share.
+    
+    Args:
+        pdf_file: Path or file object of the PDF
+        
+    Yields:
+        PdfReader: Reader over the PDF, valid until the block exits
+    """
+    if not isinstance(pdf_file, str):
+        yield PdfReader(pdf_file)
+        return
+    with open(pdf_file, "rb") as f:
+        # Empty files can't be mapped; let PdfReader report them
+        if os.fstat(f.fileno()).st_size == 0:
+            yield PdfReader(f)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PdfReader(mapped)
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Extract pages [start, stop) in a worker process; returns (page_number, text) tuples."""
+    with open_pdf(pdf_path) as pdf_reader:
+        return [
+            (page_index + 1, pdf_reader.pages[page_index].extract_text())
+            for page_index in range(start, stop)
+        ]
+
+
+def iter_pdf_pages(pdf_file, progress_callback=None, parallel=True):
+    """
+    Extract text from a PDF page by page.
+    
+    Documents with at least config.PDF_PARALLEL_PAGE_THRESHOLD pages are split
+    into page ranges extracted on a process pool; smaller documents, and file
+    objects without a path on disk, are extracted serially.
+    
+    Args:
+        pdf_file: Path or file object of the PDF
+        progress_callback: Optional callable(pages_done, pages_total)
+        parallel (bool): Allow fanning out to the process pool
+        
+    Yields:
+        tuple: (page_number, text), page numbers starting at 1, in order
+    """
+    pdf_path = pdf_file if isinstance(pdf_file, str) else getattr(pdf_file, "name", None)
+    with open_pdf(pdf_file) as pdf_reader:
+        num_pages = len(pdf_reader.pages)
+        if (
+            not parallel
+            or num_pages < config.PDF_PARALLEL_PAGE_THRESHOLD
+            or not isinstance(pdf_path, str)
+            or not os.path.isfile(pdf_path)
+        ):
+            for page_index, page in enumerate(pdf_reader.pages):
+                with span("extract"):
+                    text = page.extract_text()
+                yield page_index + 1, text
+                if progress_callback:
+                    progress_callback(page_index + 1, num_pages)
+            return
+    
+    # A few ranges per worker balances load without re-parsing the PDF per page
+    num_ranges = config.PDF_EXTRACT_WORKERS * 4
+    range_size = max(1, -(-num_pages // num_ranges))
+    executor = _get_page_executor()
+    futures = [
+        executor.submit(_extract_page_range, pdf_path, start, min(start + range_size, num_pages))
+        for start in range(0, num_pages, range_size)
+    ]
+    for future in futures:
+        with span("extract"):
+            pages = future.result()
+        for page_number, text in pages:
+            yield page_number, text
+            if progress_callback:
+                progress_callback(page_number, num_pages)
+
+
+def load_pdf(pdf_file, progress_callback=None):
     """
     Load and extract text from a PDF file.
     
     Args:
         pdf_file: Uploaded PDF file object
+        progress_callback: Optional callable(pages_done, pages_total)
         
     Returns:
         str: Extracted text from the PDF
     """
-    pdf_reader = PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+    return "".join(text for _, text in iter_pdf_pages(pdf_file, progress_callback))
+
+
+def _make_text_splitter(add_start_index=False):
+    """Text splitter with the configured chunk size and overlap."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE,
+        chunk_overlap=config.CHUNK_OVERLAP,
+        length_function=len,
+        add_start_index=add_start_index
+    )
 
 
 def get_text_chunks(text):
@@ -33,33 +169,265 @@ def get_text_chunks(text):
     Returns:
         list: List of text chunks
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=config.CHUNK_SIZE,
-        chunk_overlap=config.CHUNK_OVERLAP,
-        length_function=len
-    )
+    text_splitter = _make_text_splitter()
     chunks = text_splitter.split_text(text)
     return chunks
 
 
-def create_vector_store(text_chunks):
+def iter_page_chunks(pages, window=None):
+    """
+    Split a stream of pages into chunks tagged with the pages they came from.
+    
+    Text is buffered only up to a window of a few chunks: when the buffer is
+    full it is split, every chunk but the last is emitted, and splitting
+    resumes from the start of the last chunk. Chunks may span page
+    boundaries; each records its first and last page.
+    
+    Args:
+        pages: Iterable of (page_number, text) tuples in page order
+        window (int): Buffered characters before splitting, defaults to
+            config.CHUNK_STREAM_WINDOW_CHUNKS chunks
+        
+    Yields:
+        tuple: (chunk_text, {"page", "page_end"})
+    """
+    window = window or config.CHUNK_SIZE * config.CHUNK_STREAM_WINDOW_CHUNKS
+    text_splitter = _make_text_splitter(add_start_index=True)
+    buffer = ""
+    buffer_offset = 0  # Position of buffer[0] in the whole document
+    page_starts = []
+    page_numbers = []
+    
+    def tagged(doc):
+        start = buffer_offset + max(doc.metadata["start_index"], 0)
+        end = start + max(len(doc.page_content) - 1, 0)
+        return doc.page_content, {
+            "page": page_numbers[bisect_right(page_starts, start) - 1],
+            "page_end": page_numbers[bisect_right(page_starts, end) - 1],
+        }
+    
+    for page_number, page_text in pages:
+        page_starts.append(buffer_offset + len(buffer))
+        page_numbers.append(page_number)
+        buffer += page_text
+        if len(buffer) < window:
+            continue
+        
+        with span("split"):
+            docs = text_splitter.create_documents([buffer])
+        if len(docs) < 2:
+            continue
+        for doc in docs[:-1]:
+            yield tagged(doc)
+        
+        # The last chunk may still grow with the next page, so resplit from it
+        keep_from = max(docs[-1].metadata["start_index"], 0)
+        buffer = buffer[keep_from:]
+        buffer_offset += keep_from
+        # Forget pages that end before the buffer
+        first_page = max(bisect_right(page_starts, buffer_offset) - 1, 0)
+        del page_starts[:first_page]
+        del page_numbers[:first_page]
+    
+    if buffer:
+        with span("split"):
+            docs = text_splitter.create_documents([buffer])
+        for doc in docs:
+            yield tagged(doc)
+
+
+def get_page_chunks(pages):
+    """
+    Split page texts into chunks tagged with the pages they came from.
+    
+    Args:
+        pages (list): (page_number, text) tuples in page order
+        
+    Returns:
+        tuple: (text_chunks, metadatas) with {"page", "page_end"} per chunk
+    """
+    text_chunks = []
+    metadatas = []
+    for chunk, metadata in iter_page_chunks(pages):
+        text_chunks.append(chunk)
+        metadatas.append(metadata)
+    return text_chunks, metadatas
+
+
+class ChunkDeduplicator:
+    """
+    Drop chunks whose text was already seen, keeping the first occurrence.
+    
+    Repeated boilerplate (running headers, disclaimers, blank-page filler)
+    otherwise takes several slots of the top-k results with the same text.
+    
+    Args:
+        texts: Chunk texts already in the store, which are dropped too
+    """
+
+    def __init__(self, texts=()):
+        self._seen = {text_key(text) for text in texts}
+        self.duplicates = 0
+
+    def filter(self, chunks):
+        """
+        Pass (chunk_text, metadata) tuples through, skipping repeated texts.
+        
+        Args:
+            chunks: Iterable of (chunk_text, metadata) tuples
+        
+        Yields:
+            tuple: The first chunk with each text
+        """
+        for text, metadata in chunks:
+            key = text_key(text)
+            if key in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(key)
+            yield text, metadata
+
+
+def embed_chunk_batches(chunks, batch_size=None, max_in_flight=None):
+    """
+    Embed a stream of chunks in fixed-size batches.
+    
+    Chunks are pulled lazily and embedded on a background thread while the
+    caller consumes earlier batches, so at most max_in_flight batches of text
+    and vectors are held in memory at once. Chunks whose text is in the
+    embedding cache (see utils.embedding_cache) are not sent to the encoder,
+    and the vectors of new texts are added to it once the stream is done.
+    
+    Args:
+        chunks: Iterable of (chunk_text, metadata) tuples
+        batch_size (int): Chunks per encoder call, defaults to config.EMBEDDING_BATCH_SIZE
+        max_in_flight (int): Batches embedded ahead of the consumer, defaults to
+            config.EMBEDDING_MAX_IN_FLIGHT
+        
+    Yields:
+        tuple: (texts, metadatas, vectors) per batch, in input order
+    """
+    # Use HuggingFace embeddings instead of OpenAI
+    # OpenRouter doesn't support the embeddings API endpoint.
+    # The model is loaded once per process and shared across sessions.
+    embeddings = get_embeddings()
+    cache = get_embedding_cache()
+    batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+    max_in_flight = max_in_flight or config.EMBEDDING_MAX_IN_FLIGHT
+    
+    chunks = iter(chunks)
+    in_flight = deque()
+    
+    def embed(texts):
+        with span("embed"):
+            return embed_with_cache(embeddings, texts, cache)
+    
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed") as executor:
+        while True:
+            batch = list(islice(chunks, batch_size))
+            if batch:
+                texts = [text for text, _ in batch]
+                metadatas = [metadata for _, metadata in batch]
+                # Run in a copy of this context so the embed span reaches the caller's timings
+                in_flight.append((
+                    texts, metadatas, executor.submit(contextvars.copy_context().run, embed, texts)
+                ))
+            # Drain when the window is full or the input is exhausted
+            while in_flight and (len(in_flight) >= max_in_flight or not batch):
+                texts, metadatas, future = in_flight.popleft()
+                yield texts, metadatas, future.result()
+            if not batch:
+                break
+    
+    if cache is not None:
+        with span("embed"):
+            cache.flush()
+
+
+def stream_vector_store(chunks, progress_callback=None, batch_size=None, max_in_flight=None):
+    """
+    Build a FAISS vector store from a stream of chunks in fixed-size batches.
+    
+    Each batch is added to the index as soon as it is embedded (see
+    embed_chunk_batches), so memory stays bounded besides the index itself.
+    The index starts flat and is rebuilt as config.VECTOR_INDEX_TYPE when it
+    reaches config.VECTOR_INDEX_MIN_VECTORS vectors. In hybrid retrieval mode
+    a BM25 index of the same chunks is built alongside it. With
+    config.CHUNK_DEDUP_ENABLED, chunks repeating an earlier chunk's text are
+    dropped.
+    
+    Args:
+        chunks: Iterable of (chunk_text, metadata) tuples
+        progress_callback: Optional callable(chunks_embedded, chunks_per_second)
+        batch_size (int): Chunks per encoder call, defaults to config.EMBEDDING_BATCH_SIZE
+        max_in_flight (int): Batches embedded ahead of the index, defaults to
+            config.EMBEDDING_MAX_IN_FLIGHT
+        
+    Returns:
+        tuple: (FAISS vector store or None if there were no chunks, stats dict)
+    """
+    vector_store = None
+    lexical_index = BM25Index() if config.RETRIEVAL_MODE == "hybrid" else None
+    deduplicator = ChunkDeduplicator() if config.CHUNK_DEDUP_ENABLED else None
+    if deduplicator is not None:
+        chunks = deduplicator.filter(chunks)
+    num_chunks = 0
+    num_batches = 0
+    start = time.perf_counter()
+    
+    for texts, metadatas, vectors in embed_chunk_batches(chunks, batch_size, max_in_flight):
+        with span("index_build"):
+            text_embeddings = list(zip(texts, vectors))
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(
+                    text_embeddings=text_embeddings, embedding=get_embeddings(), metadatas=metadatas
+                )
+                ids = list(vector_store.index_to_docstore_id.values())
+            else:
+                ids = vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+            if lexical_index is not None:
+                lexical_index.add(ids, texts)
+            # Switch to the configured ANN index once there are enough vectors
+            maybe_upgrade_index(vector_store)
+        num_chunks += len(texts)
+        num_batches += 1
+        if progress_callback:
+            progress_callback(num_chunks, num_chunks / max(time.perf_counter() - start, 1e-9))
+    
+    if vector_store is not None and lexical_index is not None:
+        with span("index_build"):
+            lexical_index.flush()
+        attach_lexical_index(vector_store, lexical_index)
+    
+    seconds = time.perf_counter() - start
+    stats = {
+        "chunks": num_chunks,
+        "batches": num_batches,
+        "duplicates": deduplicator.duplicates if deduplicator is not None else 0,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(num_chunks / seconds, 1) if seconds > 0 else 0.0,
+    }
+    return vector_store, stats
+
+
+def create_vector_store(text_chunks, progress_callback=None, metadatas=None):
     """
     Create a FAISS vector store from text chunks.
     
     Args:
         text_chunks (list): List of text chunks
+        progress_callback: Optional callable(chunks_embedded, chunks_total)
+        metadatas (list): Optional metadata dict per chunk, kept in the docstore
         
     Returns:
         FAISS: Vector store with embeddings
     """
-    # Use HuggingFace embeddings instead of OpenAI
-    # OpenRouter doesn't support the embeddings API endpoint
-    from langchain_community.embeddings import HuggingFaceEmbeddings
+    if metadatas is None:
+        metadatas = [{} for _ in text_chunks]
     
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': 'cpu'},
-        encode_kwargs={'normalize_embeddings': True}
-    )
-    vector_store = FAISS.from_texts(texts=text_chunks, embedding=embeddings)
+    callback = None
+    if progress_callback:
+        callback = lambda done, _: progress_callback(done, len(text_chunks))
+    
+    vector_store, _ = stream_vector_store(zip(text_chunks, metadatas), callback)
     return vector_store
@@ -0,0 +1,461 @@
+"""Session records shared between API worker processes.
+
+A session record is the session's metadata (document, chunk count, creation
+time), its chat history and its last access time. Conversation chains and
+loaded indexes stay in each process's SessionManager; the backend is where
+every worker looks sessions up, so any worker can serve any session id.
+
+"memory" keeps records in this process, for a single worker, and persists
+them to each session's session.json in the IndexStore on spill and shutdown;
+chat history beyond the most recent entries is spilled to the session's
+history file as it grows (see utils.session_record).
+"sqlite" keeps them in one SQLite database opened by every worker; the
+workers must then also share INDEX_STORE_DIR, so each can load any session's
+index on demand. It also records which worker has each session's index
+loaded and at which URL that worker can be reached, so requests can be
+forwarded to it instead of loading the index a second time.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from utils.session_record import ChatHistory, SessionRecord
+
+
+class MemorySessionBackend:
+    """
+    Session records in this process's memory.
+    
+    Records are the SessionManager's own SessionRecords, so chat history and
+    access times need no copying. Sessions unknown in memory are read from
+    the IndexStore, e.g. after a restart.
+    
+    Args:
+        index_store (IndexStore): Where session metadata persists
+        history_max_entries (int): Chat history entries kept in memory per session
+        spill_history (bool): Append older entries to the session's history
+            file instead of dropping them
+    """
+
+    shared = False
+
+    def __init__(self, index_store, history_max_entries=None, spill_history=None):
+        self.index_store = index_store
+        self.history_max_entries = history_max_entries or config.SESSION_HISTORY_MAX_ENTRIES
+        self.spill_history = config.SESSION_HISTORY_SPILL if spill_history is None else spill_history
+        self._records = {}
+        self._lock = threading.RLock()
+
+    def create(self, session_id, record, history=()):
+        """
+        Register a session unless it already exists.
+        
+        Args:
+            session_id (str): Session identifier
+            record (SessionRecord): New session's record
+            history (list): Chat history entries to start with
+        
+        Returns:
+            SessionRecord: The stored record
+        """
+        with self._lock:
+            existing = self._records.get(session_id)
+            if existing is not None:
+                return existing
+            if record.last_accessed is None:
+                record.last_accessed = time.time()
+            spill_path = self.index_store.history_path(session_id) if self.spill_history else None
+            record.history = ChatHistory(self.history_max_entries, spill_path, history)
+            self._records[session_id] = record
+            return record
+
+    def get(self, session_id):
+        """
+        Get a session's record.
+        
+        Returns:
+            SessionRecord or None: Record (including its history), or None
+                if the session doesn't exist
+        """
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is None:
+                metadata = self.index_store.load_metadata(session_id)
+                if metadata is None:
+                    return None
+                record = self.create(
+                    session_id, SessionRecord.from_metadata(metadata), metadata.get("chat_history", [])
+                )
+            return record
+
+    def update(self, session_id, record):
+        """Replace a session's metadata with a record's; returns whether it exists."""
+        with self._lock:
+            existing = self._records.get(session_id)
+            if existing is None:
+                return False
+            existing.copy_metadata(record)
+            return True
+
+    def touch(self, session_id):
+        """Mark a session as just used."""
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is not None:
+                record.last_accessed = time.time()
+
+    def append_history(self, session_id, entries):
+        """Append chat history entries to a session."""
+        with self._lock:
+            record = self._records.get(session_id)
+            if record is not None:
+                record.history.extend(entries)
+
+    def history(self, session_id):
+        """A session's chat history, oldest first."""
+        with self._lock:
+            record = self._records.get(session_id)
+            return record.history.entries() if record is not None else []
+
+    def delete(self, session_id):
+        """Remove a session's record; returns whether it existed."""
+        with self._lock:
+            return self._records.pop(session_id, None) is not None
+
+    def exists(self, session_ids):
+        """The subset of session_ids that still exist."""
+        with self._lock:
+            return {session_id for session_id in session_ids if session_id in self._records}
+
+    def items(self):
+        """(session_id, record) pairs of every session."""
+        with self._lock:
+            return list(self._records.items())
+
+    def claim_expired(self, ttl_seconds):
+        """Remove sessions idle for longer than ttl_seconds and return their ids."""
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            expired = [
+                session_id for session_id, record in self._records.items()
+                if record.last_accessed < cutoff
+            ]
+            for session_id in expired:
+                del self._records[session_id]
+        return expired
+
+    def persist(self, session_id, record):
+        """Write a session's metadata and in-memory chat history to its session.json."""
+        self.index_store.save_metadata(session_id, {**record.metadata(), "chat_history": record.history.recent()})
+
+    def count(self):
+        """Number of sessions."""
+        return len(self._records)
+
+    # A single process has no other workers to route to
+    def mark_loaded(self, session_id, worker_id):
+        pass
+
+    def mark_unloaded(self, session_id, worker_id):
+        pass
+
+    def warm_worker_url(self, session_id, max_age_seconds):
+        return None
+
+    def heartbeat(self, worker_id, url):
+        pass
+
+    def remove_worker(self, worker_id):
+        pass
+
+    def save_job(self, job_id, worker_id, state):
+        pass
+
+    def get_job(self, job_id, max_age_seconds):
+        return None
+
+
+class SQLiteSessionBackend:
+    """
+    Session records in a SQLite database shared by all workers.
+    
+    Each thread uses its own connection; the database runs in WAL mode so
+    readers never wait for the one writer.
+    
+    Args:
+        path (str): Database file, on a disk every worker can open
+    """
+
+    shared = True
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL,
+            last_accessed REAL NOT NULL,
+            warm_worker TEXT
+        );
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            entry TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_session ON history (session_id, id);
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            url TEXT,
+            heartbeat REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(self._SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Run the enclosed statements atomically, taking the write lock up front."""
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def create(self, session_id, record, history=()):
+        """
+        Register a session unless it already exists.
+        
+        Args:
+            session_id (str): Session identifier
+            record (SessionRecord): New session's record
+            history (list): Chat history entries to start with
+        
+        Returns:
+            SessionRecord: The stored record
+        """
+        last_accessed = record.last_accessed if record.last_accessed is not None else time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO sessions (session_id, metadata, last_accessed) VALUES (?, ?, ?)",
+                (session_id, json.dumps(record.metadata()), last_accessed)
+            )
+            if cursor.rowcount:
+                db.executemany(
+                    "INSERT INTO history (session_id, entry) VALUES (?, ?)",
+                    [(session_id, json.dumps(entry)) for entry in history]
+                )
+        return self.get(session_id)
+
+    def get(self, session_id):
+        """
+        Get a session's record.
+        
+        Returns:
+            SessionRecord or None: Record without history (which is read
+                with history()), or None if the session doesn't exist
+        """
+        row = self._connect().execute(
+            "SELECT metadata, last_accessed FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return SessionRecord.from_metadata(json.loads(row["metadata"]), row["last_accessed"])
+
+    def update(self, session_id, record):
+        """Replace a session's metadata with a record's; returns whether it exists."""
+        cursor = self._connect().execute(
+            "UPDATE sessions SET metadata = ? WHERE session_id = ?", (json.dumps(record.metadata()), session_id)
+        )
+        return bool(cursor.rowcount)
+
+    def touch(self, session_id):
+        """Mark a session as just used."""
+        self._connect().execute(
+            "UPDATE sessions SET last_accessed = ? WHERE session_id = ?", (time.time(), session_id)
+        )
+
+    def append_history(self, session_id, entries):
+        """Append chat history entries to a session."""
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT INTO history (session_id, entry) VALUES (?, ?)",
+                [(session_id, json.dumps(entry)) for entry in entries]
+            )
+
+    def history(self, session_id):
+        """A session's chat history, oldest first."""
+        rows = self._connect().execute(
+            "SELECT entry FROM history WHERE session_id = ? ORDER BY id", (session_id,)
+        ).fetchall()
+        return [json.loads(row["entry"]) for row in rows]
+
+    def delete(self, session_id):
+        """Remove a session's record; returns whether it existed."""
+        with self._transaction() as db:
+            deleted = db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            db.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+        return bool(deleted)
+
+    def exists(self, session_ids):
+        """The subset of session_ids that still exist."""
+        session_ids = list(session_ids)
+        found = set()
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(session_ids), 500):
+            batch = session_ids[start:start + 500]
+            rows = self._connect().execute(
+                f"SELECT session_id FROM sessions WHERE session_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            found.update(row["session_id"] for row in rows)
+        return found
+
+    def items(self):
+        """(session_id, record) pairs of every session."""
+        rows = self._connect().execute("SELECT session_id, metadata, last_accessed FROM sessions").fetchall()
+        return [
+            (row["session_id"], SessionRecord.from_metadata(json.loads(row["metadata"]), row["last_accessed"]))
+            for row in rows
+        ]
+
+    def claim_expired(self, ttl_seconds):
+        """
+        Remove sessions idle for longer than ttl_seconds and return their ids.
+        
+        Claiming is atomic, so of several workers sweeping at once only one
+        gets each expired session (and deletes its files).
+        """
+        cutoff = time.time() - ttl_seconds
+        with self._transaction() as db:
+            expired = [
+                row["session_id"] for row in
+                db.execute("SELECT session_id FROM sessions WHERE last_accessed < ?", (cutoff,))
+            ]
+            db.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in expired])
+            db.executemany("DELETE FROM history WHERE session_id = ?", [(s,) for s in expired])
+        return expired
+
+    def persist(self, session_id, record):
+        """Records are always persisted; nothing to do."""
+
+    def count(self):
+        """Number of sessions."""
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def mark_loaded(self, session_id, worker_id):
+        """Record that a worker now has the session's index loaded."""
+        self._connect().execute(
+            "UPDATE sessions SET warm_worker = ? WHERE session_id = ?", (worker_id, session_id)
+        )
+
+    def mark_unloaded(self, session_id, worker_id):
+        """Record that a worker dropped the session's index, if it was the warm one."""
+        self._connect().execute(
+            "UPDATE sessions SET warm_worker = NULL WHERE session_id = ? AND warm_worker = ?",
+            (session_id, worker_id)
+        )
+
+    def warm_worker_url(self, session_id, max_age_seconds):
+        """
+        URL of the live worker with the session's index loaded.
+        
+        Args:
+            session_id (str): Session identifier
+            max_age_seconds (float): Workers that haven't sent a heartbeat
+                for this long are considered gone
+        
+        Returns:
+            str or None: Base URL, or None if no reachable worker has it loaded
+        """
+        row = self._connect().execute(
+            "SELECT workers.url FROM sessions JOIN workers ON workers.worker_id = sessions.warm_worker "
+            "WHERE sessions.session_id = ? AND workers.heartbeat >= ?",
+            (session_id, time.time() - max_age_seconds)
+        ).fetchone()
+        return row["url"] if row is not None else None
+
+    def heartbeat(self, worker_id, url):
+        """Record that a worker is alive and reachable at url (None if not addressable)."""
+        self._connect().execute(
+            "INSERT INTO workers (worker_id, url, heartbeat) VALUES (?, ?, ?) "
+            "ON CONFLICT (worker_id) DO UPDATE SET url = excluded.url, heartbeat = excluded.heartbeat",
+            (worker_id, url, time.time())
+        )
+
+    def remove_worker(self, worker_id):
+        """Forget a stopping worker and the sessions it had loaded."""
+        with self._transaction() as db:
+            db.execute("UPDATE sessions SET warm_worker = NULL WHERE warm_worker = ?", (worker_id,))
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def save_job(self, job_id, worker_id, state):
+        """Store a snapshot of an ingestion job for workers other than its own."""
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, worker_id, state, updated) VALUES (?, ?, ?, ?)",
+                (job_id, worker_id, json.dumps(state), time.time())
+            )
+            db.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - config.JOB_RETENTION_SECONDS,))
+
+    def get_job(self, job_id, max_age_seconds):
+        """
+        Latest snapshot of a job run by any worker.
+        
+        Returns:
+            tuple or None: (state dict, URL of the worker running it if that
+                worker is live and addressable), or None for unknown jobs
+        """
+        row = self._connect().execute(
+            "SELECT jobs.state, workers.url, workers.heartbeat FROM jobs "
+            "LEFT JOIN workers ON workers.worker_id = jobs.worker_id WHERE jobs.job_id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        live = row["heartbeat"] is not None and row["heartbeat"] >= time.time() - max_age_seconds
+        return json.loads(row["state"]), row["url"] if live else None
+
+
+def create_session_backend(index_store, backend=None):
+    """
+    Create the configured session backend.
+    
+    Args:
+        index_store (IndexStore): Where session indexes and metadata persist
+        backend (str): "memory" or "sqlite", defaults to config.SESSION_BACKEND
+    
+    Returns:
+        MemorySessionBackend or SQLiteSessionBackend
+    """
+    backend = backend or config.SESSION_BACKEND
+    if backend == "memory":
+        return MemorySessionBackend(index_store)
+    if backend == "sqlite":
+        return SQLiteSessionBackend(config.SESSION_DB_PATH)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,301 @@
+"""Session registry with idle TTL, LRU eviction and an approximate memory budget.
+
+Sessions are either loaded (conversation chain and index in memory) or spilled
+(metadata only; the index stays on disk in the IndexStore and is reloaded on
+next use). Idle sessions past the TTL are removed entirely. Session records
+live in a session backend, which several worker processes can share.
+"""
+
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from utils.bm25 import get_lexical_index
+from utils.session_backend import MemorySessionBackend
+from utils.session_record import ENTRY_OVERHEAD_BYTES, SessionRecord
+
+
+def estimate_vector_store_bytes(vector_store):
+    """
+    Approximate the memory held by a FAISS vector store.
+    
+    Args:
+        vector_store (FAISS): Vector store
+    
+    Returns:
+        int: Estimated bytes for vectors, docstore text and BM25 postings
+    """
+    index = vector_store.index
+    try:
+        code_size = index.sa_code_size()
+    except RuntimeError:
+        code_size = index.d * 4  # float32 vectors
+    total = index.ntotal * code_size
+    for doc in vector_store.docstore._dict.values():
+        total += len(doc.page_content) + ENTRY_OVERHEAD_BYTES
+    lexical_index = get_lexical_index(vector_store)
+    if lexical_index is not None:
+        total += lexical_index.memory_bytes()
+    return total
+
+
+def estimate_session_bytes(session):
+    """
+    Approximate the memory held by a session.
+    
+    Args:
+        session (SessionRecord): Session
+    
+    Returns:
+        int: Estimated bytes
+    """
+    return session.memory_bytes()
+
+
+class SessionManager:
+    """
+    Sessions loaded in this process, in least-recently-used order, over a
+    session backend holding every session's record.
+    
+    Sessions are SessionRecords holding metadata plus, while loaded, the
+    conversation chain and index size. With a shared backend several worker
+    processes serve the same sessions: each loads indexes on demand, and
+    the backend tracks which worker has a session loaded so requests can be
+    sent there (see utils.session_backend).
+    
+    Args:
+        index_store (IndexStore): Where session indexes and metadata persist
+        ttl_seconds (int): Idle time after which a session is removed
+        max_loaded (int): Maximum sessions kept loaded in memory
+        memory_budget_bytes (int): Approximate memory allowed for loaded sessions
+        backend: Session backend, defaults to a MemorySessionBackend
+    """
+
+    def __init__(self, index_store, ttl_seconds, max_loaded, memory_budget_bytes, backend=None):
+        self.index_store = index_store
+        self.ttl_seconds = ttl_seconds
+        self.max_loaded = max_loaded
+        self.memory_budget_bytes = memory_budget_bytes
+        self.backend = backend or MemorySessionBackend(index_store)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        self.expired = 0
+        self.spilled = 0
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, session_id, metadata, conversation_chain=None, index_bytes=0):
+        """
+        Register a new session, loaded in this process if given its chain.
+        
+        Args:
+            session_id (str): Session identifier
+            metadata (dict): Session metadata (see SessionRecord)
+            conversation_chain: Chain over the session's index, if already built
+            index_bytes (int): Estimated memory of the session's index
+        
+        Returns:
+            SessionRecord: Session
+        """
+        record = self.backend.create(session_id, SessionRecord.from_metadata(metadata, time.time()))
+        with self._lock:
+            session = self._sessions.setdefault(session_id, record)
+            session.conversation_chain = conversation_chain
+            session.index_bytes = index_bytes
+            self._sessions.move_to_end(session_id)
+        if conversation_chain is not None:
+            self.backend.mark_loaded(session_id, self.worker_id)
+        return session
+
+    def register(self, session_id, metadata):
+        """Add a session stored on disk, with any chat history saved in its metadata, without loading it."""
+        self.backend.create(
+            session_id, SessionRecord.from_metadata(metadata, time.time()), metadata.get("chat_history", [])
+        )
+
+    def get(self, session_id):
+        """
+        Return a session without updating its recency.
+        
+        Returns:
+            SessionRecord or None: Session, or None if it doesn't exist (for
+                example because another worker deleted or expired it)
+        """
+        record = self.backend.get(session_id)
+        with self._lock:
+            if record is None:
+                self._sessions.pop(session_id, None)
+                return None
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = record
+                self._sessions[session_id] = session
+                self._sessions.move_to_end(session_id, last=False)
+            elif session.document_hash != record.document_hash:
+                # Another worker updated the document; load the new index on next use
+                session.copy_metadata(record)
+                if session.loaded:
+                    self._unload(session_id, session)
+            return session
+
+    def update(self, session_id, metadata, conversation_chain, index_bytes):
+        """
+        Replace a session's metadata and chain after its document was updated.
+        
+        Workers that still have the previous version loaded drop it the next
+        time they look the session up, as its document hash changed.
+        
+        Args:
+            session_id (str): Session identifier
+            metadata (dict): New session metadata
+            conversation_chain: Chain over the updated index
+            index_bytes (int): Estimated memory of the updated index
+        
+        Returns:
+            SessionRecord or None: Session, or None if it no longer exists
+        """
+        if not self.backend.update(session_id, SessionRecord.from_metadata(metadata)):
+            return None
+        session = self.get(session_id)
+        if session is None:
+            return None
+        with self._lock:
+            session.copy_metadata(SessionRecord.from_metadata(metadata))
+        self.set_loaded(session_id, conversation_chain, index_bytes)
+        # Keeps chat history in session.json for backends that write it there
+        self.backend.persist(session_id, session)
+        return session
+
+    def set_loaded(self, session_id, conversation_chain, index_bytes):
+        """Attach a conversation chain built in this process to a session."""
+        with self._lock:
+            session = self._sessions[session_id]
+            session.conversation_chain = conversation_chain
+            session.index_bytes = index_bytes
+        self.backend.mark_loaded(session_id, self.worker_id)
+
+    def is_loaded(self, session_id):
+        """Whether this process has the session's chain loaded."""
+        session = self._sessions.get(session_id)
+        return session is not None and session.loaded
+
+    def items(self):
+        """
+        Snapshot of (session_id, session) pairs of every session, with this
+        process's loaded state where it has one.
+        """
+        with self._lock:
+            local = dict(self._sessions)
+        return [(session_id, local.get(session_id, record)) for session_id, record in self.backend.items()]
+
+    def touch(self, session_id):
+        """Mark a session as just used."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_accessed = time.time()
+                self._sessions.move_to_end(session_id)
+        self.backend.touch(session_id)
+
+    def append_history(self, session_id, entries):
+        """Append question/answer entries to a session's chat history."""
+        self.backend.append_history(session_id, entries)
+
+    def history(self, session_id):
+        """A session's chat history, oldest first."""
+        return self.backend.history(session_id)
+
+    def delete(self, session_id):
+        """
+        Remove a session from the backend and this process.
+        
+        Returns:
+            bool: Whether the session existed; the caller deletes its files
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        return self.backend.delete(session_id)
+
+    def warm_worker_url(self, session_id, max_age_seconds):
+        """URL of another live worker with the session loaded, or None."""
+        if self.is_loaded(session_id):
+            return None
+        return self.backend.warm_worker_url(session_id, max_age_seconds)
+
+    def heartbeat(self, url):
+        """Announce this worker, reachable at url if not None, to the backend."""
+        self.backend.heartbeat(self.worker_id, url)
+
+    def sweep(self):
+        """
+        Remove expired sessions, then spill least recently used sessions
+        until the count and memory limits hold.
+        
+        Returns:
+            dict: Number of sessions expired and spilled by this sweep
+        """
+        spilled = 0
+        # Claimed atomically, so only one worker deletes each expired session
+        expired = self.backend.claim_expired(self.ttl_seconds)
+        for session_id in expired:
+            self.index_store.delete(session_id)
+        with self._lock:
+            # Also forget sessions other workers deleted or expired
+            existing = self.backend.exists(self._sessions)
+            for session_id in list(self._sessions):
+                if session_id not in existing:
+                    del self._sessions[session_id]
+            
+            loaded = [(session_id, session) for session_id, session in self._sessions.items() if session.loaded]
+            loaded_bytes = sum(estimate_session_bytes(session) for _, session in loaded)
+            # The most recently used session always stays loaded
+            for session_id, session in loaded[:-1]:
+                if len(loaded) - spilled <= self.max_loaded and loaded_bytes <= self.memory_budget_bytes:
+                    break
+                loaded_bytes -= estimate_session_bytes(session)
+                self._spill(session_id, session)
+                spilled += 1
+            
+            self.expired += len(expired)
+            self.spilled += spilled
+        return {"expired": len(expired), "spilled": spilled}
+
+    def stats(self):
+        """Report counts, estimated memory and eviction totals."""
+        with self._lock:
+            loaded = [s for s in self._sessions.values() if s.loaded]
+            return {
+                "backend": "shared" if self.backend.shared else "memory",
+                "worker_id": self.worker_id,
+                "sessions": self.backend.count(),
+                "loaded_sessions": len(loaded),
+                "max_loaded": self.max_loaded,
+                "estimated_bytes": sum(estimate_session_bytes(s) for s in loaded),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "expired_total": self.expired,
+                "spilled_total": self.spilled,
+            }
+
+    def persist_all(self):
+        """Write every session's metadata and chat history to disk."""
+        with self._lock:
+            for session_id, session in self._sessions.items():
+                self.backend.persist(session_id, session)
+        self.backend.remove_worker(self.worker_id)
+
+    def _spill(self, session_id, session):
+        """Persist chat history and drop the in-memory chain and index."""
+        self.backend.persist(session_id, session)
+        self._unload(session_id, session)
+
+    def _unload(self, session_id, session):
+        session.conversation_chain = None
+        session.index_bytes = 0
+        self.backend.mark_unloaded(session_id, self.worker_id)
@@ -0,0 +1,149 @@
+"""Compact per-session state.
+
+A SessionRecord holds a session's metadata, last access time and, while
+loaded in this process, its conversation chain and index size, in slots
+rather than a dict. Chat history is a ChatHistory ring buffer: the most
+recent entries stay in memory as tuples and older ones are appended to a
+JSON-lines file next to the session's index, or dropped if spilling is off.
+"""
+
+import json
+import os
+from collections import deque
+
+# Rough per-entry overhead of Python objects around stored text
+ENTRY_OVERHEAD_BYTES = 64
+
+# Base size of a SessionRecord and its metadata strings, beyond history and index
+RECORD_OVERHEAD_BYTES = 512
+
+
+class ChatHistory:
+    """
+    The most recent question/answer entries of a session.
+    
+    Args:
+        max_entries (int): Entries kept in memory
+        spill_path (str): JSON-lines file older entries are appended to, or
+            None to drop them
+        entries (list): Initial entries, oldest first
+    """
+
+    __slots__ = ("max_entries", "spill_path", "_recent")
+
+    def __init__(self, max_entries, spill_path=None, entries=()):
+        self.max_entries = max_entries
+        self.spill_path = spill_path
+        self._recent = deque()
+        self.extend(entries)
+
+    def extend(self, entries):
+        """Append entries (dicts with question, answer and timestamp), spilling the oldest."""
+        self._recent.extend((entry["question"], entry["answer"], entry["timestamp"]) for entry in entries)
+        overflow = []
+        while len(self._recent) > self.max_entries:
+            overflow.append(self._recent.popleft())
+        if overflow and self.spill_path:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            with open(self.spill_path, "a") as f:
+                f.writelines(json.dumps(_entry_dict(entry)) + "\n" for entry in overflow)
+
+    def recent(self):
+        """Entries held in memory, oldest first."""
+        return [_entry_dict(entry) for entry in self._recent]
+
+    def entries(self):
+        """Every entry still available, spilled ones included, oldest first."""
+        spilled = []
+        if self.spill_path:
+            try:
+                with open(self.spill_path) as f:
+                    spilled = [json.loads(line) for line in f if line.strip()]
+            except OSError:
+                pass
+        return spilled + self.recent()
+
+    def memory_bytes(self):
+        """Approximate memory held by the in-memory entries."""
+        return sum(len(question) + len(answer) + ENTRY_OVERHEAD_BYTES for question, answer, _ in self._recent)
+
+    def __len__(self):
+        return len(self._recent)
+
+
+def _entry_dict(entry):
+    question, answer, timestamp = entry
+    return {"question": question, "answer": answer, "timestamp": timestamp}
+
+
+class SessionRecord:
+    """
+    One session's metadata and, while loaded, its conversation chain.
+    
+    Document sessions have a document_hash; corpus sessions instead have
+    the doc_ids of the corpus documents they search.
+    
+    Args:
+        pdf_name (str): Original file name (or names, for corpus sessions)
+        num_chunks (int): Number of chunks searched
+        created_at (str): ISO creation time
+        document_hash (str): Hash of the PDF content
+        doc_ids (list): Corpus document ids
+        last_accessed (float): Unix time of last use
+        history (ChatHistory): Chat history, for backends that keep it in memory
+    """
+
+    __slots__ = (
+        "pdf_name", "num_chunks", "created_at", "document_hash", "doc_ids",
+        "last_accessed", "history", "conversation_chain", "index_bytes",
+    )
+
+    # Fields written to session.json (and the shared session backend)
+    METADATA_FIELDS = ("pdf_name", "num_chunks", "created_at", "document_hash", "doc_ids")
+
+    def __init__(self, pdf_name, num_chunks, created_at, document_hash=None, doc_ids=None,
+                 last_accessed=None, history=None):
+        self.pdf_name = pdf_name
+        self.num_chunks = num_chunks
+        self.created_at = created_at
+        self.document_hash = document_hash
+        self.doc_ids = doc_ids
+        self.last_accessed = last_accessed
+        self.history = history
+        self.conversation_chain = None
+        self.index_bytes = 0
+
+    @classmethod
+    def from_metadata(cls, metadata, last_accessed=None, history=None):
+        """Build a record from stored metadata, ignoring keys it doesn't keep."""
+        return cls(
+            **{field: metadata.get(field) for field in cls.METADATA_FIELDS},
+            last_accessed=last_accessed,
+            history=history
+        )
+
+    def copy_metadata(self, record):
+        """Take over another record's metadata fields, e.g. after a document update."""
+        for field in self.METADATA_FIELDS:
+            setattr(self, field, getattr(record, field))
+
+    def metadata(self):
+        """JSON-serialisable metadata, without unset fields."""
+        return {
+            field: getattr(self, field) for field in self.METADATA_FIELDS
+            if getattr(self, field) is not None
+        }
+
+    @property
+    def loaded(self):
+        """Whether the session's chain is loaded in this process."""
+        return self.conversation_chain is not None
+
+    def memory_bytes(self):
+        """Approximate memory held by the session, its index included while loaded."""
+        total = RECORD_OVERHEAD_BYTES
+        if self.loaded:
+            total += self.index_bytes
+        if self.history is not None:
+            total += self.history.memory_bytes()
+        return total
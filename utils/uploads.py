@@ -0,0 +1,172 @@
+"""Streaming PDF uploads to disk.
+
+The multipart request body is parsed as it arrives and the file part is
+written to a temporary file in chunks of config.UPLOAD_CHUNK_BYTES, hashing
+it on the way, so an upload never has to fit in memory. Uploads larger than
+config.UPLOAD_MAX_MB are rejected from their Content-Length before any of the
+body is read, or as soon as the file part grows past the limit.
+"""
+
+import asyncio
+import os
+import tempfile
+
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from utils.ingestion_cache import document_hasher
+import config
+
+# Allowance for the multipart boundaries and part headers around the file
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+
+class InvalidUploadError(Exception):
+    """Raised when a request does not carry a PDF file upload."""
+
+
+class _SpoolWriter:
+    """Writes file data to a temporary file and hashes it, in chunks."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hasher = document_hasher()
+        self._pending = []
+        self._pending_bytes = 0
+        self._file = tempfile.NamedTemporaryFile(
+            delete=False, suffix=".pdf", dir=config.UPLOAD_DIR or None
+        )
+        self.path = self._file.name
+
+    def add(self, data):
+        """Queue file data, failing as soon as the file is too large."""
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(
+                f"File exceeds the maximum upload size of {self.max_bytes // (1024 * 1024)} MB"
+            )
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+
+    def ready(self):
+        """Whether a full chunk is waiting to be written."""
+        return self._pending_bytes >= config.UPLOAD_CHUNK_BYTES
+
+    def flush(self):
+        """Write and hash the queued data; blocking, so run it off the event loop."""
+        chunk = b"".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        self.hasher.update(chunk)
+        self._file.write(chunk)
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def spool_pdf_upload(request, field_name="file", max_bytes=None):
+    """
+    Stream the PDF in a multipart/form-data request to a temporary file.
+    
+    Args:
+        request: Starlette request whose body has not been read yet
+        field_name (str): Form field holding the file
+        max_bytes (int): Largest file accepted, defaults to config.UPLOAD_MAX_MB
+    
+    Returns:
+        tuple: (file name, temporary file path, document hash); the caller
+            removes the file
+    
+    Raises:
+        UploadTooLargeError: If the file is larger than max_bytes
+        InvalidUploadError: If the body has no PDF file in field_name
+    """
+    max_bytes = max_bytes or config.UPLOAD_MAX_MB * 1024 * 1024
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + _MULTIPART_OVERHEAD_BYTES:
+        raise UploadTooLargeError(
+            f"File exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB"
+        )
+    
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise InvalidUploadError("Expected a multipart/form-data upload")
+    
+    part = {"headers": [], "header_name": b"", "header_value": b""}
+    state = {"writer": None, "filename": None, "done": False}
+    
+    def on_part_begin():
+        part.update(headers=[], header_name=b"", header_value=b"", is_file=False)
+    
+    def on_header_field(data, start, end):
+        part["header_name"] += data[start:end]
+    
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+    
+    def on_header_end():
+        part["headers"].append((part["header_name"].lower(), part["header_value"]))
+        part["header_name"] = part["header_value"] = b""
+    
+    def on_headers_finished():
+        disposition = dict(part["headers"]).get(b"content-disposition", b"")
+        _, options = parse_options_header(disposition)
+        if options.get(b"name", b"").decode("utf-8", "replace") != field_name or state["writer"] is not None:
+            return
+        filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        # Reject before any file data is stored
+        if not filename.endswith(".pdf"):
+            raise InvalidUploadError("Only PDF files are supported")
+        state["filename"] = filename
+        state["writer"] = _SpoolWriter(max_bytes)
+        part["is_file"] = True
+    
+    def on_part_data(data, start, end):
+        if part.get("is_file"):
+            state["writer"].add(data[start:end])
+    
+    def on_part_end():
+        if part.get("is_file"):
+            state["done"] = True
+    
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    
+    try:
+        async for body_chunk in request.stream():
+            try:
+                parser.write(body_chunk)
+            except MultipartParseError as e:
+                raise InvalidUploadError(f"Malformed multipart body: {e}") from e
+            writer = state["writer"]
+            if writer is not None and (writer.ready() or state["done"]):
+                await asyncio.to_thread(writer.flush)
+        parser.finalize()
+        writer = state["writer"]
+        if writer is None or not state["done"]:
+            raise InvalidUploadError(f"No file was uploaded in the '{field_name}' field")
+        await asyncio.to_thread(writer.flush)
+        writer.close()
+    except Exception:
+        if state["writer"] is not None:
+            state["writer"].discard()
+        raise
+    
+    return state["filename"], writer.path, writer.hasher.hexdigest()
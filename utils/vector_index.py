@@ -0,0 +1,404 @@
+"""FAISS index types for large vector stores.
+
+LangChain's FAISS store defaults to an exact flat index. Stores that grow past
+config.VECTOR_INDEX_MIN_VECTORS are rebuilt as the configured approximate
+index type, trained on the vectors already added, and IVF indexes are trained
+again as the store outgrows their lists.
+
+LangChain maps index positions to docstore ids and expects removing vectors
+to shift the ones after them down, as flat indexes do. IVF indexes keep each
+vector's original id instead and HNSW indexes can't remove vectors at all,
+so vectors are removed through remove_vectors, which handles both.
+
+Vectors can also be stored compressed (config.VECTOR_STORAGE): as float16 or
+int8 scalar-quantized codes instead of float32, optionally after a PCA
+reduction to config.VECTOR_PCA_DIM dimensions. Flat stores are rebuilt in the
+configured storage once there are enough vectors to train it; the quantizer
+and PCA matrix are part of the FAISS index, so they are saved and loaded with
+it and queries are projected automatically.
+"""
+
+import faiss
+import numpy as np
+import config
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# How vectors are stored; ivf_pq indexes always store PQ codes
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+_SCALAR_QUANTIZERS = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Each 8-bit PQ codebook has 256 centroids and needs at least that many points;
+# int8 codes need enough points for representative per-dimension ranges
+_MIN_TRAINING_VECTORS = {"ivf_pq": 256, "int8": 256}
+
+# Indexes that search every stored vector and can be rebuilt from them
+_FLAT_TYPES = (faiss.IndexFlat, faiss.IndexFlatL2, faiss.IndexScalarQuantizer)
+
+
+def build_index(vectors, index_type=None, storage=None, pca_dim=None):
+    """
+    Build an index of the given type containing vectors, training it if needed.
+    
+    All types use L2 distance, like LangChain's default flat index, so
+    relevance scores stay comparable. With PCA the index is wrapped in an
+    IndexPreTransform, so it is still added to and searched with
+    full-dimension vectors.
+    
+    Args:
+        vectors (np.ndarray): float32 array of shape (n, dim)
+        index_type (str): One of INDEX_TYPES, defaults to config.VECTOR_INDEX_TYPE
+        storage (str): One of STORAGE_TYPES, defaults to config.VECTOR_STORAGE
+        pca_dim (int): Dimensions kept by PCA, 0 for none; defaults to
+            config.VECTOR_PCA_DIM
+    
+    Returns:
+        faiss.Index: Populated index with search parameters applied
+    """
+    index_type = index_type or config.VECTOR_INDEX_TYPE
+    storage = storage or config.VECTOR_STORAGE
+    pca_dim = config.VECTOR_PCA_DIM if pca_dim is None else pca_dim
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown vector storage: {storage} (expected one of {STORAGE_TYPES})")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    
+    transform = None
+    if 0 < pca_dim < vectors.shape[1]:
+        transform = faiss.PCAMatrix(vectors.shape[1], pca_dim)
+        transform.train(vectors)
+        vectors = transform.apply(vectors)
+    dim = vectors.shape[1]
+    qtype = _SCALAR_QUANTIZERS.get(storage)
+    
+    if index_type == "flat":
+        if qtype is None:
+            index = faiss.IndexFlatL2(dim)
+        else:
+            index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+    elif index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dim, config.VECTOR_INDEX_HNSW_M)
+        else:
+            index = faiss.IndexHNSWSQ(dim, qtype, config.VECTOR_INDEX_HNSW_M)
+        index.hnsw.efConstruction = config.VECTOR_INDEX_EF_CONSTRUCTION
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        # Faiss wants roughly 39 training points per list
+        nlist = max(1, min(config.VECTOR_INDEX_NLIST, len(vectors) // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), 8)
+        elif qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype, faiss.METRIC_L2)
+    else:
+        raise ValueError(f"Unknown vector index type: {index_type} (expected one of {INDEX_TYPES})")
+    
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    if transform is not None:
+        index = faiss.IndexPreTransform(transform, index)
+    configure_search(index)
+    return index
+
+
+def pq_subquantizers(dim, m=None):
+    """
+    Number of PQ sub-quantizers for vectors of a dimension.
+    
+    FAISS needs the dimension to be a multiple of it, so this is the largest
+    divisor of dim not above the configured number.
+    
+    Args:
+        dim (int): Dimension of the stored vectors, after any PCA
+        m (int): Sub-quantizers wanted, defaults to config.VECTOR_INDEX_PQ_M
+    
+    Returns:
+        int: Sub-quantizers to use
+    """
+    m = config.VECTOR_INDEX_PQ_M if m is None else m
+    m = max(1, min(m, dim))
+    while dim % m:
+        m -= 1
+    return m
+
+
+def min_training_vectors(index_type, storage, pca_dim, dim):
+    """Vectors needed before an index of the given kind can be built."""
+    count = max(_MIN_TRAINING_VECTORS.get(index_type, 1), _MIN_TRAINING_VECTORS.get(storage, 1))
+    if 0 < pca_dim < dim:
+        # A full-rank covariance matrix needs at least dim points
+        count = max(count, dim)
+    return count
+
+
+def _base_index(index):
+    """The index holding the vectors, below any PCA transform."""
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def configure_search(index):
+    """
+    Apply the configured nprobe/efSearch to an index.
+    
+    Parameters that don't apply to the index type are ignored.
+    """
+    parameter_space = faiss.ParameterSpace()
+    for name, value in (
+        ("nprobe", config.VECTOR_INDEX_NPROBE),
+        ("efSearch", config.VECTOR_INDEX_EF_SEARCH),
+    ):
+        try:
+            parameter_space.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+
+
+def maybe_upgrade_index(vector_store, index_type=None):
+    """
+    Rebuild a flat store index in the configured storage and ANN type.
+    
+    An uncompressed flat index is rebuilt in config.VECTOR_STORAGE (and
+    PCA-reduced) as soon as it has enough vectors to train on, and any flat
+    index as the configured ANN type once it reaches
+    config.VECTOR_INDEX_MIN_VECTORS. Vectors keep their positions, so the
+    store's docstore mapping stays valid. IVF indexes are retrained as the
+    store grows (see maybe_retrain_index).
+    
+    Args:
+        vector_store (FAISS): Vector store to upgrade in place
+        index_type (str): Target type, defaults to config.VECTOR_INDEX_TYPE
+    
+    Returns:
+        bool: True if the index was rebuilt
+    """
+    index_type = index_type or config.VECTOR_INDEX_TYPE
+    index = vector_store.index
+    base = _base_index(index)
+    if type(base) not in _FLAT_TYPES:
+        return maybe_retrain_index(vector_store)
+    
+    storage = config.VECTOR_STORAGE
+    pca_dim = config.VECTOR_PCA_DIM
+    uncompressed = base is index and type(base) is not faiss.IndexScalarQuantizer
+    if index_type != "flat" and index.ntotal >= max(
+        config.VECTOR_INDEX_MIN_VECTORS, min_training_vectors(index_type, storage, pca_dim, index.d)
+    ):
+        target = index_type
+    elif (
+        uncompressed
+        and (storage != "float32" or 0 < pca_dim < index.d)
+        and index.ntotal >= min_training_vectors("flat", storage, pca_dim, index.d)
+    ):
+        target = "flat"
+    else:
+        return False
+    # Compressed indexes decode (and project back) their vectors, which PCA
+    # then finds the same subspace in
+    vector_store.index = build_index(index.reconstruct_n(0, index.ntotal), target)
+    return True
+
+
+def _index_kind(index):
+    """(index_type, storage, pca_dim) that build_index would rebuild an index with."""
+    base = _base_index(index)
+    pca_dim = base.d if base is not index else 0
+    storage = index_storage(index)
+    if isinstance(base, faiss.IndexHNSW):
+        index_type = "hnsw"
+    elif isinstance(base, faiss.IndexIVF):
+        index_type = "ivf_pq" if storage == "pq" else "ivf_flat"
+    else:
+        index_type = "flat"
+    return index_type, "float32" if storage == "pq" else storage, pca_dim
+
+
+def _rebuild(index, vectors):
+    """Index of the same kind as index holding vectors, or a flat one if too few to train it."""
+    index_type, storage, pca_dim = _index_kind(index)
+    if len(vectors) < min_training_vectors(index_type, storage, pca_dim, index.d):
+        flat = faiss.IndexFlatL2(index.d)
+        flat.add(vectors)
+        return flat
+    return build_index(vectors, index_type, storage, pca_dim)
+
+
+def maybe_retrain_index(vector_store):
+    """
+    Rebuild an IVF index whose store has outgrown the lists it was trained with.
+    
+    IVF indexes are trained with about one list per 39 vectors, up to
+    config.VECTOR_INDEX_NLIST, when they are built. Once the store could use
+    config.VECTOR_INDEX_RETRAIN_GROWTH times as many lists, the index is
+    trained again on its (decoded) vectors, which also retrains ivf_pq
+    codebooks on the larger sample.
+    
+    Args:
+        vector_store (FAISS): Vector store to retrain in place
+    
+    Returns:
+        bool: True if the index was rebuilt
+    """
+    index = vector_store.index
+    base = _base_index(index)
+    if not isinstance(base, faiss.IndexIVF):
+        return False
+    nlist = max(1, min(config.VECTOR_INDEX_NLIST, index.ntotal // 39))
+    if nlist < base.nlist * config.VECTOR_INDEX_RETRAIN_GROWTH:
+        return False
+    # Ids are kept equal to positions (see remove_vectors), so they can be read back in order
+    base.make_direct_map()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    base.set_direct_map_type(faiss.DirectMap.NoMap)
+    vector_store.index = _rebuild(index, vectors)
+    return True
+
+
+def _compact_ivf_ids(base, removed):
+    """Renumber the ids left in an IVF index to their positions after removing the sorted ids in removed."""
+    invlists = base.invlists
+    for list_no in range(base.nlist):
+        size = invlists.list_size(list_no)
+        if size == 0:
+            continue
+        ids = faiss.rev_swig_ptr(invlists.get_ids(list_no), size)
+        new_ids = ids - np.searchsorted(removed, ids)
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size).copy()
+        invlists.update_entries(list_no, 0, size, faiss.swig_ptr(new_ids), faiss.swig_ptr(codes))
+
+
+def remove_vectors(vector_store, ids):
+    """
+    Remove documents and their vectors from a FAISS vector store.
+    
+    Works like FAISS.delete, shifting the positions of later vectors down,
+    but also for IVF indexes (whose remaining ids are renumbered to match)
+    and HNSW indexes (which are rebuilt from the remaining vectors).
+    
+    Args:
+        vector_store (FAISS): Vector store to remove from in place
+        ids (list): Docstore ids of the documents
+    
+    Raises:
+        ValueError: If an id is not in the store
+    """
+    position_of = {docstore_id: i for i, docstore_id in vector_store.index_to_docstore_id.items()}
+    missing = set(ids).difference(position_of)
+    if missing:
+        raise ValueError(f"Some specified ids do not exist in the current store. Ids not found: {missing}")
+    removed = np.array(sorted({position_of[docstore_id] for docstore_id in ids}), dtype=np.int64)
+    if len(removed) == 0:
+        return
+    
+    index = vector_store.index
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        keep = np.setdiff1d(np.arange(index.ntotal, dtype=np.int64), removed)
+        vector_store.index = _rebuild(index, index.reconstruct_n(0, index.ntotal)[keep])
+    else:
+        index.remove_ids(removed)
+        if isinstance(base, faiss.IndexIVF):
+            _compact_ivf_ids(base, removed)
+    
+    vector_store.docstore.delete(list(ids))
+    removed_set = set(removed.tolist())
+    remaining = [
+        docstore_id for i, docstore_id in sorted(vector_store.index_to_docstore_id.items())
+        if i not in removed_set
+    ]
+    vector_store.index_to_docstore_id = dict(enumerate(remaining))
+
+
+def _search_parameters(index, selector):
+    """Search parameters restricting a search to selected ids, keeping the index's nprobe/efSearch."""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    if base is not index:
+        params = faiss.SearchParametersPreTransform(index_params=params)
+    return params
+
+
+def search_batch(vector_store, query_vectors, k, fetch_k=None, filter_fn=None, ids=None):
+    """
+    Search a FAISS vector store for many queries with a single index search.
+    
+    Args:
+        vector_store (FAISS): Vector store
+        query_vectors: Query embeddings, one per query
+        k (int): Results per query
+        fetch_k (int): Neighbours searched per query before filtering
+        filter_fn: Optional callable(document) -> bool restricting results
+        ids: Optional index positions to search among; the restriction is
+            applied by FAISS during the search, so it keeps the cost of ANN
+            indexes independent of how many vectors are excluded
+    
+    Returns:
+        list: Per query, up to k (document, squared L2 distance) tuples, nearest first
+    """
+    vectors = np.array(query_vectors, dtype=np.float32).reshape(-1, vector_store.index.d)
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(vectors)
+    n = min(k if filter_fn is None else max(k, fetch_k or k), vector_store.index.ntotal)
+    if ids is not None:
+        n = min(n, len(ids))
+    if n == 0:
+        return [[] for _ in vectors]
+    if ids is None:
+        distances, indices = vector_store.index.search(vectors, n)
+    else:
+        # The selector must outlive the search, as the parameters don't own it
+        selector = faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64))
+        distances, indices = vector_store.index.search(
+            vectors, n, params=_search_parameters(vector_store.index, selector)
+        )
+    
+    results = []
+    for row_distances, row_indices in zip(distances, indices):
+        docs = []
+        for distance, i in zip(row_distances, row_indices):
+            if i == -1:
+                continue
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            if filter_fn is not None and not filter_fn(doc):
+                continue
+            docs.append((doc, float(distance)))
+            if len(docs) == k:
+                break
+        results.append(docs)
+    return results
+
+
+def index_storage(index):
+    """Name of the format an index stores its vectors in (see STORAGE_TYPES)."""
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base = faiss.downcast_index(base.storage)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "pq"
+    if isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return {qtype: name for name, qtype in _SCALAR_QUANTIZERS.items()}.get(base.sq.qtype, "sq")
+    return "float32"
+
+
+def describe_index(index):
+    """Short description of an index for stats output."""
+    base = _base_index(index)
+    return {
+        "type": type(base).__name__,
+        "vectors": index.ntotal,
+        "dimension": index.d,
+        "stored_dimension": base.d,
+        "storage": index_storage(index),
+    }